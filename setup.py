@@ -33,23 +33,43 @@ setup(
 
         'License :: OSI Approved :: Apache Software License',
 
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
     ],
 
+    python_requires='>=3.6',
+
     keywords='mysql mariadb database backup percona xtrabackup',
 
     packages=find_packages(exclude=['contrib', 'docs', 'tests*', 'sql']),
 
     install_requires=['docopt', 'requests'],
 
+    extras_require={
+        's3': ['boto3'],
+        'sftp': ['paramiko'],
+        'zstd': ['zstandard'],
+        'lz4': ['lz4'],
+        'xxhash': ['xxhash'],
+    },
+
     entry_points={
         'console_scripts': [
             'pyxtrabackup=xtrabackup.full_backup:main',
             'pyxtrabackup-inc=xtrabackup.incremental_backup:main',
-            'pyxtrabackup-restore=xtrabackup.restoration:main'
+            'pyxtrabackup-restore=xtrabackup.restoration:main',
+            'pyxtrabackup-gc=xtrabackup.garbage_collection:main',
+            'pyxtrabackup-orchestrator=xtrabackup.orchestrator:main',
+            'pyxtrabackup-verify=xtrabackup.verification:main',
+            'pyxtrabackup-prune=xtrabackup.pruning:main',
+            'pyxtrabackup-daemon=xtrabackup.daemon:main'
         ],
     },
 )
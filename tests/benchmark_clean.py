@@ -0,0 +1,79 @@
+"""Benchmark of the MySQL data directory clean-up.
+
+Usage:
+    python tests/benchmark_clean.py [<directory>] [<schemas>] [<tables>]
+
+Builds a synthetic data directory of <schemas> directories of <tables>
+small .ibd and .frm files in <directory> (a temporary directory by
+default), then times each way of emptying it.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from xtrabackup.cleanup import (BackgroundCleaner, delete_contents,
+                                move_contents_aside)
+
+
+def build_tree(path, schemas, tables):
+    for schema in range(schemas):
+        schema_path = os.path.join(path, 'schema_%d' % schema)
+        os.mkdir(schema_path)
+        for table in range(tables):
+            for extension in ['.ibd', '.frm']:
+                with open(os.path.join(schema_path, 'table_%d%s' % (
+                        table, extension)), 'wb') as table_file:
+                    table_file.write(b'\0' * 512)
+    with open(os.path.join(path, 'ibdata1'), 'wb') as system_file:
+        system_file.write(b'\0' * 4096)
+
+
+def sequential_clean(path):
+    for name in os.listdir(path):
+        entry_path = os.path.join(path, name)
+        if os.path.islink(entry_path) or os.path.isfile(entry_path):
+            os.unlink(entry_path)
+        else:
+            shutil.rmtree(entry_path)
+
+
+def rename_clean(path):
+    cleaner = BackgroundCleaner(move_contents_aside(path))
+    cleaner.start()
+    return cleaner
+
+
+def run(directory, schemas, tables):
+    data_dir = os.path.join(directory, 'datadir')
+    methods = [
+        ('sequential', sequential_clean),
+        ('threads=1', lambda path: delete_contents(path, 1)),
+        ('threads=8', lambda path: delete_contents(path, 8)),
+        ('threads=16', lambda path: delete_contents(path, 16)),
+        ('rename', rename_clean),
+    ]
+    print('%d schemas - %d files' % (schemas, schemas * tables * 2 + 1))
+    for name, method in methods:
+        os.mkdir(data_dir)
+        build_tree(data_dir, schemas, tables)
+        start = time.time()
+        cleaner = method(data_dir)
+        duration = time.time() - start
+        line = '%-12s %8.3fs' % (name, duration)
+        if cleaner is not None:
+            cleaner.wait()
+            line += ' (background deletion: %.3fs)' % (time.time() - start)
+        print(line)
+        os.rmdir(data_dir)
+
+
+def main():
+    directory = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    schemas = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    tables = int(sys.argv[3]) if len(sys.argv) > 3 else 250
+    run(directory, schemas, tables)
+
+
+if __name__ == '__main__':
+    main()
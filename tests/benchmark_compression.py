@@ -0,0 +1,96 @@
+"""Benchmark of the block-parallel archive compression.
+
+Usage:
+    python tests/benchmark_compression.py [<size>] [<threads>]
+
+Builds <size> MB (64 by default) of synthetic InnoDB-like pages, mixing
+repeated rows and random bytes, then compresses them with each available
+codec for 1, 2, 4... up to <threads> threads (the CPU count by default).
+The throughput of each run is compared to a single-threaded gzip stream,
+which is what "tar czf" produces.
+"""
+import gzip
+import io
+import multiprocessing
+import os
+import sys
+import time
+from xtrabackup.compression import BLOCK_SIZE, CODECS, Compressor
+
+PAGE_SIZE = 16 * 1024
+
+
+class CountingStream:
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+    def flush(self):
+        pass
+
+
+def build_data(size):
+    row = b'%08d|customer-name|2020-01-01 00:00:00|active|'
+    pages = []
+    for page in range(size // PAGE_SIZE):
+        rows = b''.join(row % (page * 100 + index) for index in range(200))
+        pages.append((rows + os.urandom(PAGE_SIZE))[:PAGE_SIZE])
+    return b''.join(pages)
+
+
+def gzip_stream(data):
+    output = CountingStream()
+    with gzip.GzipFile(fileobj=output, mode='wb', compresslevel=6) as \
+            gzip_file:
+        gzip_file.write(data)
+    return output.size
+
+
+def compressor_stream(codec_name, threads):
+    def compress(data):
+        output = CountingStream()
+        Compressor(codec_name, threads=threads).compress_stream(
+            io.BytesIO(data), output)
+        return output.size
+    return compress
+
+
+def run(size, max_threads):
+    data = build_data(size * 1024 * 1024)
+    thread_counts = [1]
+    while thread_counts[-1] * 2 <= max_threads:
+        thread_counts.append(thread_counts[-1] * 2)
+    methods = [('gzip stream', gzip_stream)]
+    for name in sorted(CODECS):
+        if not CODECS[name].available:
+            print('%s: Python module not installed, skipped' % name)
+            continue
+        for threads in thread_counts:
+            methods.append(('%s threads=%d' % (name, threads),
+                            compressor_stream(name, threads)))
+    print('%d MB - block size %d MB' % (size, BLOCK_SIZE // 1048576))
+    baseline = None
+    for name, method in methods:
+        start = time.time()
+        compressed_size = method(data)
+        duration = time.time() - start
+        throughput = len(data) / 1048576.0 / duration
+        if baseline is None:
+            baseline = throughput
+        print('%-18s %8.3fs %8.1f MB/s  x%-5.2f ratio %.2f' % (
+            name, duration, throughput, throughput / baseline,
+            float(len(data)) / compressed_size))
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else \
+        multiprocessing.cpu_count()
+    run(size, threads)
+
+
+if __name__ == '__main__':
+    main()
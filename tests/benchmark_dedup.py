@@ -0,0 +1,121 @@
+"""Benchmark of the deduplicated chunk store against full tarballs.
+
+Usage:
+    python tests/benchmark_dedup.py [<directory>] [<backups>] [<changed>]
+
+Builds the tar stream of a synthetic data directory of 8 tablespaces of
+32 MB and backs it up <backups> times (5 by default), changing the last
+<changed> percent of the 16 KB pages of each tablespace (10 by default)
+between two backups. Each backup is written as a gzip tarball and in a
+chunk store of <directory> (a temporary directory by default). The time,
+the bytes written and the repository size are printed for both.
+"""
+import io
+import os
+import random
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+from xtrabackup.chunk_store import ChunkStore
+from xtrabackup.compression import Compressor
+
+PAGE_SIZE = 16 * 1024
+TABLESPACE_SIZE = 32 * 1024 * 1024
+TABLESPACES = 8
+
+
+class CountingStream:
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+    def flush(self):
+        pass
+
+
+def build_tablespaces():
+    row = b'%08d|customer-name|2020-01-01 00:00:00|active|'
+    tablespaces = []
+    for tablespace in range(TABLESPACES):
+        pages = []
+        for page in range(TABLESPACE_SIZE // PAGE_SIZE):
+            rows = b''.join(row % (page * 100 + index)
+                            for index in range(200))
+            pages.append((rows + os.urandom(PAGE_SIZE))[:PAGE_SIZE])
+        tablespaces.append(bytearray(b''.join(pages)))
+    return tablespaces
+
+
+def change_pages(tablespaces, changed):
+    # Most of the writes of an insert-mostly table land in its last pages.
+    for tablespace in tablespaces:
+        pages = len(tablespace) // PAGE_SIZE
+        hot_pages = range(pages - pages * changed // 100, pages)
+        for page in hot_pages:
+            offset = page * PAGE_SIZE + random.randrange(PAGE_SIZE - 64)
+            tablespace[offset:offset + 64] = os.urandom(64)
+
+
+def build_tar(tablespaces):
+    output = io.BytesIO()
+    with tarfile.open(fileobj=output, mode='w') as archive:
+        for index, tablespace in enumerate(tablespaces):
+            info = tarfile.TarInfo('schema/table_%d.ibd' % index)
+            info.size = len(tablespace)
+            archive.addfile(info, io.BytesIO(bytes(tablespace)))
+    return output.getvalue()
+
+
+def get_directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, directories, files in os.walk(path)
+               for name in files)
+
+
+def run(directory, backups, changed):
+    store_path = os.path.join(directory, 'chunks')
+    os.mkdir(store_path)
+    tablespaces = build_tablespaces()
+    print('%d backups of %d MB - last %d%% of the pages changed' % (
+        backups, TABLESPACES * TABLESPACE_SIZE // 1048576, changed))
+    tarball_total = 0
+    for backup in range(backups):
+        if backup:
+            change_pages(tablespaces, changed)
+        data = build_tar(tablespaces)
+        start = time.time()
+        tarball = CountingStream()
+        Compressor('gzip').compress_stream(io.BytesIO(data), tarball)
+        tarball_duration = time.time() - start
+        tarball_total += tarball.size
+        start = time.time()
+        store = ChunkStore(store_path, 'gzip')
+        manifest = CountingStream()
+        store.compress_stream(io.BytesIO(data), manifest)
+        dedup_duration = time.time() - start
+        print('#%d tarball %7.3fs %6.1f MB/s %6.1f MB written'
+              ' - dedup %7.3fs %6.1f MB/s %6.1f MB written' % (
+                  backup,
+                  tarball_duration, len(data) / 1048576.0 / tarball_duration,
+                  tarball.size / 1048576.0,
+                  dedup_duration, len(data) / 1048576.0 / dedup_duration,
+                  (store.written_bytes + manifest.size) / 1048576.0))
+    print('Repository size: tarballs %.1f MB - chunk store %.1f MB' % (
+        tarball_total / 1048576.0, get_directory_size(store_path) / 1048576.0))
+    shutil.rmtree(store_path)
+
+
+def main():
+    directory = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    backups = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    changed = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    run(directory, backups, changed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import unittest
+from xtrabackup.backup_daemon import (BackupRun, DaemonInstance,
+                                      get_process_context)
+from xtrabackup.exception import ProgramError
+import xtrabackup.filesystem_utils as filesystem_utils
+
+
+def run(arguments, log_name):
+    # Any search of the PATH fails in the backup process.
+    filesystem_utils.which = None
+    filesystem_utils.check_required_binaries(arguments['binaries'])
+
+
+class BackupProcessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.instance = DaemonInstance.__new__(DaemonInstance)
+        self.instance.name = 'db1'
+        self.instance.context = get_process_context()
+        self.located_binaries = set(filesystem_utils.located_binaries)
+        filesystem_utils.located_binaries.update(['innobackupex', 'tar'])
+
+    def tearDown(self):
+        filesystem_utils.located_binaries.clear()
+        filesystem_utils.located_binaries.update(self.located_binaries)
+
+    def run_process(self, binaries):
+        backup_run = BackupRun('full', 'api')
+        self.instance.run_process(backup_run, __name__,
+                                  {'binaries': binaries})
+        return backup_run
+
+    def test_located_binaries_are_not_searched_again(self):
+        backup_run = self.run_process(['innobackupex', 'tar'])
+        self.assertIsNotNone(backup_run.pid)
+
+    def test_process_error(self):
+        with self.assertRaises(ProgramError):
+            self.run_process(['mysql'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from xtrabackup.backup_scheduler import (BackupJob, BackupScheduler,
+                                         get_disk, get_repository_device)
+from xtrabackup.exception import ProgramError
+
+
+class BackupSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lock = threading.Lock()
+        self.running = []
+        self.started = []
+        self.max_running = {}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_instance(self, name, **options):
+        instance = {'name': name, 'user': 'backup', 'disk': 'sda',
+                    'repository': os.path.join(self.directory, 'repository')}
+        instance.update(options)
+        return instance
+
+    def create_scheduler(self, instances, concurrency=4, disk_slots=1,
+                         repository_slots=4, **rates):
+        return BackupScheduler(instances, self.directory, self.directory,
+                               concurrency, disk_slots, repository_slots,
+                               **rates)
+
+    def get_io_rate(self, job):
+        options = [argument for argument in job.prepare_arguments()
+                   if argument.startswith('--io-rate=')]
+        return options[0].split('=')[1] if options else None
+
+    def test_rate_budgets(self):
+        scheduler = self.create_scheduler(
+            [self.get_instance('db1'), self.get_instance('db2', io_rate=10),
+             self.get_instance('db3', io_rate='50')],
+            disk_slots=4, repository_slots=2, disk_rate=100,
+            repository_rate='60')
+        self.assertEqual([self.get_io_rate(job) for job in scheduler.jobs],
+                         ['25.0', '10.0', '25.0'])
+
+    def test_no_budget(self):
+        scheduler = self.create_scheduler(
+            [self.get_instance('db1'), self.get_instance('db2', io_rate=10)])
+        self.assertEqual([self.get_io_rate(job) for job in scheduler.jobs],
+                         [None, '10.0'])
+
+    def test_invalid_jobs(self):
+        with self.assertRaises(ProgramError):
+            BackupJob(self.get_instance('db1', options=['--io-rate=10']),
+                      self.directory, self.directory)
+        with self.assertRaises(ProgramError):
+            BackupJob(self.get_instance('db1', mode='weekly'),
+                      self.directory, self.directory)
+
+    def test_devices(self):
+        self.assertEqual(get_disk(self.get_instance('db1')), 'sda')
+        instance = self.get_instance('db1', disk=None,
+                                     data_dir=self.directory)
+        self.assertEqual(get_disk(instance), os.stat(self.directory).st_dev)
+        for data_dir in [None, os.path.join(self.directory, 'missing')]:
+            with self.assertRaises(ProgramError):
+                get_disk(self.get_instance('db1', disk=None,
+                                           data_dir=data_dir))
+        self.assertEqual(
+            get_repository_device(os.path.join(self.directory, 'a', 'b')),
+            os.stat(self.directory).st_dev)
+
+    def run_job(self, job):
+        with self.lock:
+            self.started.append(job.name)
+            self.running.append(job)
+            for attribute in ['disk', 'repository_device']:
+                count = len([running for running in self.running
+                             if getattr(running, attribute) ==
+                             getattr(job, attribute)])
+                self.max_running[attribute] = max(
+                    self.max_running.get(attribute, 0), count)
+            self.max_running['total'] = max(
+                self.max_running.get('total', 0), len(self.running))
+        time.sleep(0.05)
+        with self.lock:
+            self.running.remove(job)
+        job.status = 'success'
+
+    def run_scheduler(self, scheduler):
+        for job in scheduler.jobs:
+            job.run = lambda job=job: self.run_job(job)
+        return scheduler.run()
+
+    def test_slots(self):
+        instances = [self.get_instance('db%d' % index,
+                                       disk='sd' + 'ab'[index % 2],
+                                       priority=index)
+                     for index in range(6)]
+        jobs = self.run_scheduler(self.create_scheduler(
+            instances, concurrency=3, disk_slots=1, repository_slots=2))
+        self.assertEqual([job.status for job in jobs], ['success'] * 6)
+        self.assertEqual(self.started[:2], ['db5', 'db4'])
+        self.assertEqual(self.max_running,
+                         {'disk': 1, 'repository_device': 2, 'total': 2})
+
+    def test_concurrency(self):
+        instances = [self.get_instance('db%d' % index, disk='sd%d' % index)
+                     for index in range(6)]
+        self.run_scheduler(self.create_scheduler(
+            instances, concurrency=3, disk_slots=1, repository_slots=6))
+        self.assertEqual(self.max_running['total'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
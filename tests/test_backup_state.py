@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from xtrabackup.backup_state import BackupState, get_state_path
+
+
+class BackupStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = get_state_path(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stages_survive_a_new_run(self):
+        state = BackupState(self.path)
+        state.start({'repository': '/repo', 'archive_size': None})
+        state.complete('copy', {'last_lsn': 100})
+        state.complete('archive', {'archive_size': 42})
+        loaded = BackupState(self.path)
+        self.assertTrue(loaded.load())
+        self.assertEqual(loaded.completed, ['copy', 'archive'])
+        self.assertTrue(loaded.is_completed('copy'))
+        self.assertFalse(loaded.is_completed('transfer'))
+        self.assertEqual(loaded.values, {
+            'repository': '/repo', 'archive_size': 42, 'last_lsn': 100})
+        self.assertLess(loaded.get_age(), 60)
+
+    def test_start_resets_the_stages(self):
+        state = BackupState(self.path)
+        state.start({'repository': '/repo'})
+        state.complete('copy', {})
+        state.start({'repository': '/other'})
+        loaded = BackupState(self.path)
+        loaded.load()
+        self.assertEqual(loaded.completed, [])
+        self.assertEqual(loaded.values, {'repository': '/other'})
+
+    def test_matches(self):
+        state = BackupState(self.path)
+        state.start({'repository': '/repo', 'chain': 'db1', 'size': 1})
+        self.assertTrue(state.matches({'repository': '/repo',
+                                       'chain': 'db1'}))
+        self.assertFalse(state.matches({'repository': '/repo',
+                                        'chain': 'db2'}))
+        self.assertFalse(state.matches({'storage': 's3://bucket'}))
+
+    def test_missing_or_invalid_state(self):
+        state = BackupState(self.path)
+        self.assertFalse(state.load())
+        with open(self.path, 'w') as state_file:
+            state_file.write('{"version"')
+        self.assertFalse(state.load())
+        with open(self.path, 'w') as state_file:
+            json.dump({'version': 0, 'values': {}, 'completed': ['copy'],
+                       'started_at': 0}, state_file)
+        self.assertFalse(state.load())
+        self.assertEqual(state.completed, [])
+
+    def test_remove(self):
+        state = BackupState(self.path)
+        state.start({'repository': '/repo'})
+        state.complete('copy', {})
+        state.remove()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(state.completed, [])
+        self.assertFalse(BackupState(self.path).load())
+        state.remove()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from xtrabackup.catalog import (Catalog, find_catalog, parse_policy,
+                                parse_restore_time)
+from xtrabackup.exception import ProgramError
+
+DAY = 86400
+
+
+class CatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repository = tempfile.mkdtemp()
+        self.catalog = Catalog(self.repository)
+        self.base_id = None
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.repository)
+
+    def add_backup(self, kind, level, age, chain='db1'):
+        backup_id = self.catalog.add_backup(
+            chain, kind, level, 0, self.base_id, 0, 100,
+            os.path.join(self.repository, '%s_%s_%s.tar.gz' % (
+                chain, kind, age)), 10, 1.0, None)
+        if kind == 'base':
+            self.base_id = backup_id
+        with self.catalog.connection:
+            self.catalog.connection.execute(
+                'UPDATE backups SET created_at = ? WHERE id = ?',
+                (time.time() - age, backup_id))
+        return backup_id
+
+    def test_parse_policy(self):
+        self.assertEqual(parse_policy('7d, 1d,12h'),
+                         [7 * DAY, DAY, 12 * 3600])
+        self.assertEqual(parse_policy('1w,3600'), [7 * DAY, 3600])
+        for policy in ['7x', 'daily', '1d,,2h']:
+            with self.assertRaises(ProgramError):
+                parse_policy(policy)
+
+    def test_parse_restore_time(self):
+        self.assertIsNone(parse_restore_time(None))
+        self.assertEqual(
+            parse_restore_time('2024-01-02 03:04'),
+            time.mktime(datetime.datetime(2024, 1, 2, 3, 4).timetuple()))
+        with self.assertRaises(ProgramError):
+            parse_restore_time('yesterday')
+
+    def test_policy_level(self):
+        policy = parse_policy('7d,1d')
+        self.assertEqual(self.catalog.get_policy_level('db1', policy), 0)
+        self.add_backup('base', 0, 3 * DAY)
+        self.assertEqual(self.catalog.get_policy_level('db1', policy), 1)
+        self.add_backup('differential', 1, DAY / 2)
+        self.assertEqual(self.catalog.get_policy_level('db1', policy), 2)
+        self.add_backup('incremental', 2, 60)
+        self.assertEqual(self.catalog.get_policy_level('db1', policy), 2)
+        # Another chain and full backups do not count.
+        self.add_backup('base', 0, 60, chain='db2')
+        self.add_backup('full', 0, 60)
+        self.assertEqual(self.catalog.get_policy_level('db1', policy), 2)
+
+    def test_policy_tolerance(self):
+        policy = parse_policy('1d,1h')
+        # A daily backup taken a few minutes early starts a new cycle.
+        self.add_backup('base', 0, DAY - 600)
+        self.assertEqual(self.catalog.get_policy_level('db1', policy), 0)
+        self.add_backup('base', 0, DAY / 2)
+        self.assertEqual(self.catalog.get_policy_level('db1', policy), 1)
+
+    def test_last_backup(self):
+        with self.assertRaises(ProgramError):
+            self.catalog.get_last_backup('db1')
+        base_id = self.add_backup('base', 0, 3 * DAY)
+        differential_id = self.add_backup('differential', 1, 2 * DAY)
+        incremental_id = self.add_backup('incremental', 2, DAY)
+        self.assertEqual(self.catalog.get_last_backup('db1').id,
+                         incremental_id)
+        self.assertEqual(self.catalog.get_last_backup('db1', 2).id,
+                         differential_id)
+        backup = self.catalog.get_last_backup('db1', 1)
+        self.assertEqual((backup.id, backup.base_id), (base_id, base_id))
+
+    def test_find_catalog(self):
+        directory = os.path.join(self.repository, '20240101_base')
+        os.mkdir(directory)
+        catalog = find_catalog(os.path.join(directory, 'backup.tar.gz'))
+        self.assertEqual(catalog.repository, self.repository)
+        catalog.close()
+        os.unlink(os.path.join(self.repository, 'catalog.sqlite'))
+        self.assertIsNone(find_catalog(os.path.join(directory, 'a.tar.gz')))
+
+
+if __name__ == '__main__':
+    unittest.main()
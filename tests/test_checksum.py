@@ -0,0 +1,132 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from xtrabackup.checksum import (ArchiveChecksums, extract_members,
+                                 hash_data, read_checksums, verify_archives,
+                                 verify_file)
+from xtrabackup.compression import Compressor
+from xtrabackup.exception import ProgramError
+import xtrabackup.filesystem_utils as filesystem_utils
+
+LONG_NAME = 'schema/' + 'a' * 120 + '.ibd'
+MEMBERS = {
+    'xtrabackup_checkpoints': b'backup_type = full-backuped\n',
+    'schema/table.ibd': os.urandom(150000),
+    'schema/empty.ibd': b'',
+    LONG_NAME: b'long name ' * 5000,
+}
+
+
+def build_tar():
+    output = io.BytesIO()
+    with tarfile.open(fileobj=output, mode='w',
+                      format=tarfile.GNU_FORMAT) as archive:
+        for name in sorted(MEMBERS):
+            info = tarfile.TarInfo(name)
+            info.size = len(MEMBERS[name])
+            archive.addfile(info, io.BytesIO(MEMBERS[name]))
+    return output.getvalue()
+
+
+class ArchiveChecksumsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_archive(self, compression):
+        if compression:
+            compressor = Compressor(compression)
+            compressor.block_size = 32 * 1024
+            path = os.path.join(self.directory, 'backup.tar.gz')
+        else:
+            compressor = None
+            path = os.path.join(self.directory, 'backup.tar')
+        checksums = ArchiveChecksums(compressor, 'sha256')
+        if not compressor:
+            checksums.block_size = 32 * 1024
+        with open(path, 'wb') as archive:
+            if compressor:
+                checksums.compress_stream(io.BytesIO(build_tar()), archive)
+            else:
+                checksums.index_stream(io.BytesIO(build_tar()), archive)
+        checksums.write(filesystem_utils.get_checksum_path(path))
+        return path
+
+    def corrupt(self, path, offset):
+        with open(path, 'r+b') as archive:
+            archive.seek(offset)
+            data = archive.read(1)
+            archive.seek(offset)
+            archive.write(bytes([data[0] ^ 0xff]))
+
+    def test_member_index(self):
+        for compression in [None, 'gzip']:
+            path = self.write_archive(compression)
+            checksums = read_checksums(path)
+            files = dict((name, (size, digest))
+                         for name, offset, size, digest in checksums['files'])
+            self.assertEqual(sorted(files), sorted(MEMBERS))
+            for name, data in MEMBERS.items():
+                self.assertEqual(files[name],
+                                 (len(data), hash_data('sha256', data)))
+            self.assertEqual(checksums['size'], os.path.getsize(path))
+            self.assertGreater(len(checksums['blocks']), 1)
+
+    def test_uncompressed_offsets(self):
+        path = self.write_archive(None)
+        with open(path, 'rb') as archive:
+            data = archive.read()
+        for name, offset, size, digest in read_checksums(path)['files']:
+            self.assertEqual(data[offset:offset + size], MEMBERS[name])
+
+    def test_verify_archives(self):
+        path = self.write_archive('gzip')
+        result = verify_archives(self.directory)
+        self.assertEqual((result.archives, result.failures), (1, []))
+        self.assertEqual(result.bytes, os.path.getsize(path))
+        block_offset, block_size, digest = read_checksums(path)['blocks'][1]
+        self.corrupt(path, block_offset + 100)
+        result = verify_archives(path)
+        self.assertEqual(result.failures, [(path, block_offset)])
+
+    def test_archive_without_checksums(self):
+        path = self.write_archive('gzip')
+        os.unlink(filesystem_utils.get_checksum_path(path))
+        result = verify_archives(self.directory)
+        self.assertEqual(result.unverified, [path])
+
+    def test_verify_file(self):
+        path = self.write_archive('gzip')
+        self.assertTrue(verify_file(path, 'schema/table.ibd'))
+        self.assertTrue(verify_file(path, './' + LONG_NAME))
+        with self.assertRaises(ProgramError):
+            verify_file(path, 'schema/missing.ibd')
+        checksums = read_checksums(path)
+        self.corrupt(path, checksums['blocks'][0][0] + 100)
+        self.assertTrue(verify_file(path, 'xtrabackup_checkpoints'))
+        self.assertFalse(verify_file(path, LONG_NAME))
+
+    def test_extract_members(self):
+        for compression in [None, 'gzip']:
+            path = self.write_archive(compression)
+            destination = os.path.join(self.directory, 'extract')
+            extracted = extract_members(
+                path, destination, lambda name: name.startswith('schema/'))
+            self.assertEqual(sorted(extracted), sorted(
+                name for name in MEMBERS if name.startswith('schema/')))
+            for name in extracted:
+                with open(os.path.join(destination, name), 'rb') as member:
+                    self.assertEqual(member.read(), MEMBERS[name])
+            self.assertFalse(os.path.exists(
+                os.path.join(destination, 'xtrabackup_checkpoints')))
+            shutil.rmtree(destination)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import unittest
+from xtrabackup.chunk_store import (CHUNK_DIRECTORY, CHUNK_SIZE, ChunkStore,
+                                    collect_garbage, find_store_path,
+                                    get_chunk_path, read_manifest,
+                                    store_chunk)
+from xtrabackup.exception import ProgramError
+
+PAGE_SIZE = 16384
+
+
+def build_tablespace(pages):
+    return bytearray(b''.join((b'page %08d ' % page) * (PAGE_SIZE // 14) +
+                              b'\0' * (PAGE_SIZE % 14)
+                              for page in range(pages)))
+
+
+def build_tar(files):
+    output = io.BytesIO()
+    with tarfile.open(fileobj=output, mode='w',
+                      format=tarfile.GNU_FORMAT) as archive:
+        for name in sorted(files):
+            info = tarfile.TarInfo(name)
+            info.size = len(files[name])
+            archive.addfile(info, io.BytesIO(bytes(files[name])))
+    return output.getvalue()
+
+
+class ChunkStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repository = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.repository, CHUNK_DIRECTORY)
+        os.mkdir(self.store_path)
+        self.files = {
+            'xtrabackup_checkpoints': b'backup_type = full-backuped\n',
+            'shop/orders.ibd': build_tablespace(2 * CHUNK_SIZE //
+                                                PAGE_SIZE + 10),
+            'shop/customers.ibd': build_tablespace(8),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.repository)
+
+    def backup(self, name, compression='gzip', threads=1):
+        store = ChunkStore(self.store_path, compression, threads=threads)
+        data = build_tar(self.files)
+        path = os.path.join(self.repository, name + '.tar.manifest')
+        with open(path, 'wb') as manifest:
+            store.compress_stream(io.BytesIO(data), manifest)
+        return store, path, data
+
+    def restore(self, path, threads=1):
+        output = io.BytesIO()
+        with open(path, 'rb') as manifest:
+            ChunkStore(self.store_path, threads=threads).decompress_stream(
+                manifest, output)
+        return output.getvalue()
+
+    def test_round_trip(self):
+        for compression in [None, 'gzip']:
+            for threads in [1, 2]:
+                store, path, data = self.backup('backup', compression,
+                                                threads)
+                self.assertEqual(self.restore(path, threads), data)
+                manifest = read_manifest(path)
+                self.assertEqual(manifest['size'], len(data))
+                self.assertEqual(manifest['compression'], compression)
+                shutil.rmtree(self.store_path)
+                os.mkdir(self.store_path)
+
+    def test_tablespace_chunks(self):
+        store, path, data = self.backup('backup')
+        sizes = [size for digest, size in read_manifest(path)['chunks']]
+        # The tablespace data is cut at fixed offsets of the file.
+        self.assertEqual(sizes.count(CHUNK_SIZE), 2)
+        self.assertEqual(sum(sizes), len(data))
+
+    def test_deduplication(self):
+        first_store, first_path, first_data = self.backup('first')
+        self.files['shop/orders.ibd'][-PAGE_SIZE:] = os.urandom(PAGE_SIZE)
+        second_store, second_path, second_data = self.backup('second')
+        first_chunks = read_manifest(first_path)['chunks']
+        second_chunks = read_manifest(second_path)['chunks']
+        self.assertEqual(len(first_chunks), len(second_chunks))
+        self.assertEqual(
+            len([chunk for chunk in second_chunks
+                 if chunk not in first_chunks]), 1)
+        self.assertLess(second_store.written_bytes,
+                        first_store.written_bytes)
+        self.assertEqual(self.restore(first_path), first_data)
+        self.assertEqual(self.restore(second_path), second_data)
+
+    def test_corrupted_chunk(self):
+        store, path, data = self.backup('backup', None)
+        digest = read_manifest(path)['chunks'][0][0]
+        with open(get_chunk_path(self.store_path, digest), 'r+b') as chunk:
+            chunk.write(b'X')
+        with self.assertRaises(ProgramError):
+            self.restore(path)
+
+    def test_find_store_path(self):
+        directory = os.path.join(self.repository, '20240101_base')
+        os.mkdir(directory)
+        self.assertEqual(
+            find_store_path(os.path.join(directory, 'a.tar.manifest')),
+            self.store_path)
+        shutil.rmtree(self.store_path)
+        with self.assertRaises(ProgramError):
+            find_store_path(os.path.join(directory, 'a.tar.manifest'))
+
+    def test_collect_garbage(self):
+        store, path, data = self.backup('backup')
+        stored_chunks = len(set(digest for digest, size in
+                                read_manifest(path)['chunks']))
+        old_chunk = 'a' * 64
+        recent_chunk = 'b' * 64
+        size = store_chunk(self.store_path, old_chunk, None, None, b'old')
+        store_chunk(self.store_path, recent_chunk, None, None, b'recent')
+        past = time.time() - 2 * 86400
+        for digest in [old_chunk] + [digest for digest, size in
+                                     read_manifest(path)['chunks']]:
+            os.utime(get_chunk_path(self.store_path, digest), (past, past))
+        self.assertEqual(collect_garbage(self.repository, dry_run=True),
+                         (1, size))
+        self.assertTrue(os.path.exists(
+            get_chunk_path(self.store_path, old_chunk)))
+        self.assertEqual(collect_garbage(self.repository), (1, size))
+        self.assertFalse(os.path.exists(
+            get_chunk_path(self.store_path, old_chunk)))
+        self.assertEqual(collect_garbage(self.repository, grace_period=0),
+                         (1, len(b'recent')))
+        self.assertEqual(self.restore(path), data)
+        self.assertEqual(sum(len(files) for root, directories, files
+                             in os.walk(self.store_path)), stored_chunks)
+
+    def test_collect_garbage_without_chunks(self):
+        shutil.rmtree(self.store_path)
+        self.assertEqual(collect_garbage(self.repository), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+from xtrabackup.cleanup import (BackgroundCleaner, TRASH_PREFIX,
+                                delete_contents, list_directory,
+                                move_contents_aside, walk_directories)
+
+
+def create_tree(path):
+    for directory in ['db1', 'db1/sub', 'db2']:
+        os.mkdir(os.path.join(path, directory))
+    for name in ['ibdata1', 'db1/t1.ibd', 'db1/sub/t2.ibd', 'db2/t3.ibd']:
+        with open(os.path.join(path, name), 'wb') as data:
+            data.write(b'\0' * 100)
+    os.symlink(os.path.join(path, 'db2'), os.path.join(path, 'link'))
+
+
+class CleanupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        create_tree(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_list_directory(self):
+        files, directories = list_directory(self.directory)
+        self.assertEqual(sorted(os.path.basename(path) for path in files),
+                         ['ibdata1', 'link'])
+        self.assertEqual(sorted(os.path.basename(path)
+                                for path in directories), ['db1', 'db2'])
+
+    def test_walk_directories(self):
+        visited = []
+
+        def visit(path):
+            visited.append(os.path.relpath(path, self.directory))
+            return list_directory(path)[1]
+
+        directories = walk_directories(self.directory, visit, 3)
+        self.assertEqual(sorted(visited), ['.', 'db1', 'db1/sub', 'db2'])
+        relative = [os.path.relpath(path, self.directory)
+                    for path in directories]
+        self.assertEqual(sorted(relative), ['db1', 'db1/sub', 'db2'])
+        self.assertLess(relative.index('db1'), relative.index('db1/sub'))
+
+    def test_delete_contents(self):
+        delete_contents(self.directory, 4)
+        self.assertTrue(os.path.isdir(self.directory))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_move_contents_aside(self):
+        trash_path = move_contents_aside(self.directory)
+        self.assertTrue(os.path.basename(trash_path).startswith(
+            TRASH_PREFIX + os.path.basename(self.directory)))
+        self.assertEqual(sorted(os.listdir(trash_path)),
+                         ['db1', 'db2', 'ibdata1', 'link'])
+        cleaner = BackgroundCleaner(trash_path, 2)
+        cleaner.start()
+        self.assertIsNone(cleaner.wait())
+        self.assertFalse(os.path.exists(trash_path))
+        if cleaner.is_nested(self.directory):
+            self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
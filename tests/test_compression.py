@@ -0,0 +1,97 @@
+import gzip
+import io
+import os
+import struct
+import unittest
+from xtrabackup.compression import CODECS, Compressor, get_codec
+from xtrabackup.exception import ProgramError
+
+
+def sample_data(size):
+    return (b'innodb page ' * (size // 24) + os.urandom(size))[:size]
+
+
+class BlockFramingTest(unittest.TestCase):
+
+    def check_round_trip(self, codec_name):
+        codec = get_codec(codec_name)
+        data = sample_data(100000)
+        block = codec.compress_block(data, codec.default_level)
+        self.assertEqual(codec.block_size(block[:codec.header_size]),
+                         len(block))
+        self.assertEqual(codec.decompress_block(block), data)
+
+    def check_stream(self, codec_name, data):
+        compressor = Compressor(codec_name)
+        compressor.block_size = 64 * 1024
+        compressed = io.BytesIO()
+        compressor.compress_stream(io.BytesIO(data), compressed)
+        output = io.BytesIO()
+        compressor.decompress_stream(io.BytesIO(compressed.getvalue()),
+                                     output)
+        self.assertEqual(output.getvalue(), data)
+        return compressed.getvalue()
+
+    def test_gzip_block(self):
+        self.check_round_trip('gzip')
+
+    def test_gzip_extra_field(self):
+        codec = get_codec('gzip')
+        block = codec.compress_block(b'data', 6)
+        self.assertEqual(block[3], 4)
+        xlen, subfield, slen, member_size = struct.unpack(
+            '<H2sHI', block[10:20])
+        self.assertEqual((xlen, subfield, slen), (8, b'XB', 4))
+        self.assertEqual(member_size, len(block))
+
+    def test_gzip_stream_is_standard_gzip(self):
+        data = sample_data(300000)
+        compressed = self.check_stream('gzip', data)
+        self.assertEqual(gzip.decompress(compressed), data)
+
+    def test_gzip_without_block_size(self):
+        data = sample_data(200000)
+        output = io.BytesIO()
+        Compressor('gzip').decompress_stream(io.BytesIO(gzip.compress(data)),
+                                             output)
+        self.assertEqual(output.getvalue(), data)
+
+    def test_truncated_block(self):
+        compressed = self.check_stream('gzip', sample_data(300000))
+        with self.assertRaises(ProgramError):
+            Compressor('gzip').decompress_stream(
+                io.BytesIO(compressed[:-10]), io.BytesIO())
+
+    @unittest.skipUnless(CODECS['zstd'].available, 'zstandard missing')
+    def test_zstd_skippable_frames(self):
+        self.check_round_trip('zstd')
+        data = sample_data(300000)
+        compressed = self.check_stream('zstd', data)
+        magic, size = struct.unpack('<II', compressed[:8])
+        self.assertEqual((magic, size), (0x184D2A5B, 4))
+        output = io.BytesIO()
+        get_codec('zstd').decompress_serial(b'', io.BytesIO(compressed),
+                                            output)
+        self.assertEqual(output.getvalue(), data)
+
+    @unittest.skipUnless(CODECS['lz4'].available, 'lz4 missing')
+    def test_lz4_skippable_frames(self):
+        self.check_round_trip('lz4')
+        compressed = self.check_stream('lz4', sample_data(300000))
+        magic, size = struct.unpack('<II', compressed[:8])
+        self.assertEqual((magic, size), (0x184D2A5B, 4))
+
+    def test_threads(self):
+        data = sample_data(300000)
+        outputs = []
+        for threads in [1, 2]:
+            compressor = Compressor('gzip', threads=threads)
+            compressor.block_size = 64 * 1024
+            output = io.BytesIO()
+            compressor.compress_stream(io.BytesIO(data), output)
+            outputs.append(output.getvalue())
+        self.assertEqual(outputs[0], outputs[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import datetime
+import unittest
+from xtrabackup.cron import CronSchedule, parse_field
+from xtrabackup.exception import ProgramError
+
+
+class CronScheduleTest(unittest.TestCase):
+
+    def get_next(self, expression, *after):
+        return CronSchedule(expression).get_next(datetime.datetime(*after))
+
+    def test_parse_field(self):
+        self.assertEqual(parse_field('*/15', 0, 59), set([0, 15, 30, 45]))
+        self.assertEqual(parse_field('1-3,10', 0, 59), set([1, 2, 3, 10]))
+        self.assertEqual(parse_field('50/5', 0, 59), set([50, 55]))
+        self.assertEqual(parse_field('1-10/4', 0, 59), set([1, 5, 9]))
+
+    def test_invalid_schedules(self):
+        for expression in ['* * * *', '60 * * * *', '* 24 * * *',
+                           '* * 0 * *', '*/0 * * * *', '5-1 * * * *',
+                           'a * * * *', '@yearly']:
+            with self.assertRaises(ProgramError):
+                CronSchedule(expression)
+
+    def test_every_quarter(self):
+        self.assertEqual(self.get_next('*/15 * * * *', 2024, 1, 1, 10, 7, 30),
+                         datetime.datetime(2024, 1, 1, 10, 15))
+        self.assertEqual(self.get_next('*/15 * * * *', 2024, 1, 1, 10, 15),
+                         datetime.datetime(2024, 1, 1, 10, 30))
+
+    def test_daily_alias(self):
+        self.assertEqual(self.get_next('@daily', 2024, 12, 31, 23, 59),
+                         datetime.datetime(2025, 1, 1, 0, 0))
+
+    def test_weekday(self):
+        # 2024-01-03 is a Wednesday.
+        self.assertEqual(self.get_next('30 2 * * 1', 2024, 1, 3),
+                         datetime.datetime(2024, 1, 8, 2, 30))
+
+    def test_sunday_is_zero_or_seven(self):
+        for expression in ['0 3 * * 0', '0 3 * * 7']:
+            self.assertEqual(self.get_next(expression, 2024, 1, 3),
+                             datetime.datetime(2024, 1, 7, 3, 0))
+
+    def test_day_or_weekday(self):
+        # Both restricted: the 15th or any Monday, whichever comes first.
+        self.assertEqual(self.get_next('0 0 15 * 1', 2024, 1, 9),
+                         datetime.datetime(2024, 1, 15, 0, 0))
+        self.assertEqual(self.get_next('0 0 10 * 1', 2024, 1, 9),
+                         datetime.datetime(2024, 1, 10, 0, 0))
+
+    def test_month(self):
+        self.assertEqual(self.get_next('0 1 1 */3 *', 2024, 2, 10),
+                         datetime.datetime(2024, 4, 1, 1, 0))
+
+    def test_leap_day(self):
+        self.assertEqual(self.get_next('0 0 29 2 *', 2024, 3, 1),
+                         datetime.datetime(2028, 2, 29, 0, 0))
+
+    def test_impossible_date(self):
+        self.assertIsNone(self.get_next('0 0 31 2 *', 2024, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
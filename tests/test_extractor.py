@@ -0,0 +1,132 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from xtrabackup.exception import ProgramError
+from xtrabackup.extractor import ArchiveExtractor
+
+
+def add_file(archive, name, data, mode=0o640):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    info.mtime = 1700000000
+    archive.addfile(info, io.BytesIO(data))
+
+
+def add_entry(archive, name, entry_type, linkname=''):
+    info = tarfile.TarInfo(name)
+    info.type = entry_type
+    info.linkname = linkname
+    info.mode = 0o750 if entry_type == tarfile.DIRTYPE else 0o777
+    archive.addfile(info)
+
+
+class ArchiveExtractorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.destination = os.path.join(self.directory, 'datadir')
+        os.mkdir(self.destination)
+        self.outside = os.path.join(self.directory, 'outside')
+        with open(self.outside, 'wb') as outside_file:
+            outside_file.write(b'outside')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def extract(self, build, io_mode='buffered'):
+        stream = io.BytesIO()
+        with tarfile.open(fileobj=stream, mode='w') as archive:
+            build(archive)
+        stream.seek(0)
+        ArchiveExtractor(self.destination, io_mode).extract_stream(
+            stream, None)
+
+    def read(self, path):
+        with open(os.path.join(self.destination, path), 'rb') as data_file:
+            return data_file.read()
+
+    def assertOutsideUnchanged(self):
+        with open(self.outside, 'rb') as outside_file:
+            self.assertEqual(outside_file.read(), b'outside')
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['datadir', 'outside'])
+
+    def test_extract(self):
+        data = os.urandom(100000)
+
+        def build(archive):
+            add_entry(archive, 'shop', tarfile.DIRTYPE)
+            add_file(archive, 'shop/orders.ibd', data)
+            add_file(archive, 'shop/empty.ibd', b'')
+            add_file(archive, 'xtrabackup_checkpoints', b'to_lsn = 10\n',
+                     0o600)
+            add_entry(archive, 'shop/orders.link', tarfile.SYMTYPE,
+                      'orders.ibd')
+            add_entry(archive, 'orders.hard', tarfile.LNKTYPE,
+                      'shop/orders.ibd')
+
+        for io_mode in ['buffered', 'direct', 'dontneed']:
+            self.extract(build, io_mode)
+            self.assertEqual(self.read('shop/orders.ibd'), data)
+            self.assertEqual(self.read('shop/empty.ibd'), b'')
+            self.assertEqual(self.read('shop/orders.link'), data)
+            self.assertEqual(self.read('orders.hard'), data)
+            path = os.path.join(self.destination, 'xtrabackup_checkpoints')
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+            self.assertEqual(os.stat(path).st_mtime, 1700000000)
+            path = os.path.join(self.destination, 'shop')
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o750)
+            shutil.rmtree(self.destination)
+            os.mkdir(self.destination)
+
+    def test_unsupported_io_mode(self):
+        with self.assertRaises(ProgramError):
+            ArchiveExtractor(self.destination, 'mmap')
+
+    def test_member_outside_of_the_destination(self):
+        for name in ['../outside', 'shop/../../outside',
+                     self.outside]:
+            with self.assertRaises(ProgramError):
+                self.extract(lambda archive: add_file(archive, name, b'x'))
+            self.assertOutsideUnchanged()
+
+    def test_links_outside_of_the_destination(self):
+        for entry_type, linkname in [(tarfile.SYMTYPE, '../outside'),
+                                     (tarfile.SYMTYPE, self.outside),
+                                     (tarfile.SYMTYPE, 'shop/../..'),
+                                     (tarfile.LNKTYPE, '../outside')]:
+            with self.assertRaises(ProgramError):
+                self.extract(lambda archive: add_entry(
+                    archive, 'link', entry_type, linkname))
+            self.assertFalse(os.path.lexists(
+                os.path.join(self.destination, 'link')))
+            self.assertOutsideUnchanged()
+
+    def test_devices_are_refused(self):
+        with self.assertRaises(ProgramError):
+            self.extract(lambda archive: add_entry(
+                archive, 'null', tarfile.CHRTYPE))
+
+    def test_members_below_an_outside_link(self):
+        # A link left in the destination must not lead the members of the
+        # archive out of it.
+        os.symlink(self.directory, os.path.join(self.destination, 'shop'))
+        with self.assertRaises(ProgramError):
+            self.extract(lambda archive: add_file(
+                archive, 'shop/outside', b'overwritten'))
+        self.assertOutsideUnchanged()
+
+    def test_files_are_not_written_through_links(self):
+        os.symlink(self.outside, os.path.join(self.destination, 'table.ibd'))
+        with self.assertRaises(OSError):
+            self.extract(lambda archive: add_file(
+                archive, 'table.ibd', b'overwritten'))
+        self.assertOutsideUnchanged()
+
+
+if __name__ == '__main__':
+    unittest.main()
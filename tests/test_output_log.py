@@ -0,0 +1,97 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from xtrabackup.output_log import (FailureBuffer, OutputLog, RotatingFile,
+                                   get_job_path, get_rotated_path)
+
+
+class OutputLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'xtrabackup.out')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as output_file:
+            return output_file.read()
+
+    def write_lines(self, output_file, count, start=0):
+        for index in range(start, start + count):
+            output_file.write(b'line %03d\n' % index)
+
+    def test_rotation(self):
+        output_file = RotatingFile(self.path, 45, files=2)
+        # 9 bytes per line, 5 lines per file.
+        self.write_lines(output_file, 17)
+        output_file.close()
+        self.assertEqual(self.read(self.path),
+                         b'line 015\nline 016\n')
+        self.assertEqual(self.read(get_rotated_path(self.path, 1)),
+                         b''.join(b'line %03d\n' % index
+                                  for index in range(10, 15)))
+        self.assertEqual(self.read(get_rotated_path(self.path, 2)),
+                         b''.join(b'line %03d\n' % index
+                                  for index in range(5, 10)))
+        self.assertFalse(os.path.exists(get_rotated_path(self.path, 3)))
+
+    def test_append_to_an_existing_file(self):
+        with open(self.path, 'wb') as output_file:
+            output_file.write(b'x' * 40)
+        output_file = RotatingFile(self.path, 45, files=1)
+        self.write_lines(output_file, 1)
+        output_file.close()
+        self.assertEqual(self.read(self.path), b'line 000\n')
+        self.assertEqual(self.read(get_rotated_path(self.path, 1)),
+                         b'x' * 40)
+
+    def test_no_rotated_files(self):
+        output_file = RotatingFile(self.path, 45, files=0)
+        self.write_lines(output_file, 12)
+        output_file.close()
+        self.assertEqual(self.read(self.path), b'line 010\nline 011\n')
+        self.assertEqual(os.listdir(self.directory), ['xtrabackup.out'])
+
+    def test_unlimited_size(self):
+        output_file = OutputLog(self.path, max_size=None).open()
+        self.write_lines(output_file, 100)
+        output_file.close()
+        self.assertEqual(len(self.read(self.path)), 900)
+
+    def test_failure_buffer(self):
+        output_log = OutputLog(self.path, on_failure=True)
+        output_file = output_log.open('copy')
+        self.write_lines(output_file, 2)
+        output_file.close(failed=False)
+        self.assertEqual(self.read(self.path), b'')
+        output_file = FailureBuffer(RotatingFile(self.path), 'copy', 3)
+        self.write_lines(output_file, 5)
+        output_file.close(failed=True)
+        self.assertEqual(self.read(self.path),
+                         b'--- Failed copy: 2 earlier lines dropped ---\n'
+                         b'line 002\nline 003\nline 004\n')
+
+    def test_job_files(self):
+        self.assertEqual(get_job_path('/var/log/xtrabackup.out', 'prepare'),
+                         '/var/log/xtrabackup.prepare.out')
+        output_log = OutputLog(self.path, per_job=True)
+        output_log.check()
+        self.assertEqual(output_log.get_path(), self.path)
+        for job in ['prepare', 'extract']:
+            output_file = output_log.open(job)
+            output_file.write(job.encode())
+            output_file.close()
+        self.assertEqual(self.read(get_job_path(self.path, 'extract')),
+                         b'extract')
+        self.assertEqual(sorted(os.listdir(self.directory)), [
+            'xtrabackup.extract.out', 'xtrabackup.out',
+            'xtrabackup.prepare.out'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from xtrabackup.exception import ProgramError
+from xtrabackup.ownership import TreeOwner, get_owner, set_owner
+
+
+class TreeOwnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, 'db1', 'sub'))
+        for name in ['ibdata1', 'db1/t1.ibd', 'db1/sub/t2.ibd']:
+            with open(os.path.join(self.directory, name), 'wb'):
+                pass
+        self.uid = os.getuid()
+        self.gid = os.getgid()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unknown_owner(self):
+        with self.assertRaises(ProgramError):
+            get_owner('no-such-user-pyxtrabackup', 'no-such-group')
+
+    def test_set_owner(self):
+        path = os.path.join(self.directory, 'ibdata1')
+        with mock.patch.object(os, 'lchown') as lchown:
+            self.assertFalse(set_owner(path, self.uid, self.gid))
+            self.assertTrue(set_owner(path, self.uid + 1, self.gid))
+            lchown.assert_called_once_with(path, self.uid + 1, self.gid)
+
+    def test_owned_tree(self):
+        owner = TreeOwner(self.uid, self.gid, 2)
+        with mock.patch.object(os, 'lchown') as lchown:
+            owner.apply(self.directory)
+            self.assertFalse(lchown.called)
+        self.assertEqual((owner.checked, owner.changed), (6, 0))
+
+    def test_changed_tree(self):
+        owner = TreeOwner(self.uid + 1, self.gid, 2)
+        with mock.patch.object(os, 'lchown') as lchown:
+            owner.apply(self.directory)
+            self.assertEqual(sorted(
+                os.path.relpath(call[0][0], self.directory)
+                for call in lchown.call_args_list),
+                ['.', 'db1', 'db1/sub', 'db1/sub/t2.ibd', 'db1/t1.ibd',
+                 'ibdata1'])
+        self.assertEqual((owner.checked, owner.changed), (6, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+from xtrabackup.page_tracking import (PageScan, count_delta_pages,
+                                      get_tablespace_pages, is_local_host)
+
+
+class PageTrackingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.datadir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.datadir)
+
+    def create_file(self, path, pages):
+        path = os.path.join(self.datadir, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as data_file:
+            data_file.write(b'\0' * pages * 1024)
+
+    def test_tablespace_pages(self):
+        self.create_file('ibdata1', 4)
+        self.create_file('undo_001', 2)
+        self.create_file('ib_logfile0', 8)
+        self.create_file('shop/orders.ibd', 3)
+        self.create_file('shop/orders.frm', 1)
+        self.create_file('#innodb_temp/temp_1.ibt', 5)
+        self.create_file('shop/archive/old.ibd', 7)
+        self.assertEqual(get_tablespace_pages(self.datadir, 1024), 9)
+        self.assertIsNone(get_tablespace_pages(
+            os.path.join(self.datadir, 'missing'), 1024))
+
+    def test_local_host(self):
+        for host in [None, '', 'localhost', '127.0.0.1', '::1']:
+            self.assertTrue(is_local_host(host))
+        self.assertFalse(is_local_host('db1.example.com'))
+
+    def test_page_scan(self):
+        # One group of 3 pages: a header page and two changed pages.
+        self.assertEqual(count_delta_pages(3 * 16384, 16384), 2)
+        scan = PageScan('bitmap', [3 * 16384], 16384, 100)
+        self.assertEqual((scan.changed_pages, scan.scanned_pages,
+                          scan.skipped_pages), (2, 2, 98))
+        scan = PageScan('full', [3 * 16384], 16384, None)
+        self.assertEqual((scan.scanned_pages, scan.skipped_pages),
+                         (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from xtrabackup.progress import OutputReader, ProgressMonitor
+
+COPY_OUTPUT = """\
+xtrabackup: cd to /var/lib/mysql
+>> log scanned up to (1626007)
+[01] Copying ./ibdata1 to /backup/ibdata1
+[02] Copying ./shop/orders.ibd to /backup/shop/orders.ibd
+[01]        ...done
+>> log scanned up to (1626107)
+[02] 2024-01-01T03:00:02.001 [Note] Done: Copying ./shop/orders.ibd to \
+/backup/shop/orders.ibd
+[01] Streaming ./shop/customers.ibd
+[01]        ...done
+[01] Copying ./shop/missing.ibd to /backup/shop/missing.ibd
+"""
+
+
+class ProgressMonitorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.datadir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.datadir, 'shop'))
+        for name, size in [('ibdata1', 1000), ('shop/orders.ibd', 300),
+                           ('shop/customers.ibd', 200)]:
+            with open(os.path.join(self.datadir, name), 'wb') as data_file:
+                data_file.write(b'\0' * size)
+        self.status_file = os.path.join(self.datadir, 'progress.json')
+        self.monitor = ProgressMonitor(logging.getLogger(__name__),
+                                       self.status_file, interval=3600)
+
+    def tearDown(self):
+        self.monitor.stop()
+        shutil.rmtree(self.datadir)
+
+    def parse(self, output):
+        for line in output.splitlines():
+            self.monitor.parse_line(line.strip())
+
+    def test_copy(self):
+        self.monitor.start('copy', self.datadir, total_bytes=3000)
+        self.parse(COPY_OUTPUT)
+        status = self.monitor.get_status()
+        self.assertEqual(status['files'], 3)
+        self.assertEqual(status['bytes'], 1500)
+        self.assertEqual(status['lsn'], 1626107)
+        self.assertEqual(status['progress'], 0.5)
+        self.assertIsNotNone(status['eta_seconds'])
+        self.assertEqual(self.monitor.current_files['01'],
+                         './shop/missing.ibd')
+
+    def test_base_directory_from_output(self):
+        self.monitor.start('copy')
+        self.parse(COPY_OUTPUT.replace('/var/lib/mysql', self.datadir))
+        status = self.monitor.get_status()
+        self.assertEqual((status['files'], status['bytes']), (3, 1500))
+        self.assertEqual(status['total_bytes'], 1500)
+
+    def test_scan_mode(self):
+        for line, mode in [
+                ('xtrabackup: using the changed page bitmap', 'bitmap'),
+                ('xtrabackup: using the full scan for incremental backup',
+                 'full')]:
+            self.monitor.start('copy', self.datadir)
+            self.monitor.parse_line(line)
+            self.assertEqual(self.monitor.scan_mode, mode)
+            self.monitor.stop()
+
+    def test_tar_bytes(self):
+        self.monitor.start('archive', self.datadir)
+        self.monitor.parse_line('tar: 1234567 (1.2MiB, 10MiB/s)')
+        self.assertEqual(self.monitor.get_status()['bytes'], 1234567)
+
+    def test_lines_before_start(self):
+        self.parse(COPY_OUTPUT)
+        self.monitor.start('copy', self.datadir)
+        self.assertEqual(self.monitor.get_status()['files'], 0)
+
+    def test_publish(self):
+        self.monitor.start('copy', self.datadir)
+        self.parse(COPY_OUTPUT)
+        self.monitor.stop('failed')
+        with open(self.status_file) as status_file:
+            status = json.load(status_file)
+        self.assertEqual((status['stage'], status['state'], status['files']),
+                         ('copy', 'failed', 3))
+
+
+class OutputReaderTest(unittest.TestCase):
+
+    def test_lines_are_written_and_parsed(self):
+        lines = []
+
+        class Monitor:
+            def parse_line(self, line):
+                lines.append(line)
+
+        output = io.BytesIO()
+        reader = OutputReader(output, Monitor())
+        reader.writer.write(b'[01] Copying ./ibdata1\n\xff done\n')
+        reader.close()
+        self.assertEqual(output.getvalue(),
+                         b'[01] Copying ./ibdata1\n\xff done\n')
+        self.assertEqual(lines, ['[01] Copying ./ibdata1', '\ufffd done'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+import unittest
+from xtrabackup.catalog import Catalog
+from xtrabackup.exception import ProgramError
+from xtrabackup.restore_planner import RestorePlanner
+
+
+class RestorePlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repository = tempfile.mkdtemp()
+        self.catalog = Catalog(self.repository)
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.repository)
+
+    def add_backup(self, kind, level, base_id, from_lsn, to_lsn, size,
+                   chain='db1'):
+        return self.catalog.add_backup(
+            chain, kind, level, 0, base_id, from_lsn, to_lsn,
+            '%s/%s_%s.tar.gz' % (self.repository, kind, to_lsn), size, 1.0,
+            None)
+
+    def get_plan(self, **target):
+        plan = RestorePlanner(self.catalog).plan('db1', **target)
+        return [(backup.kind, backup.to_lsn) for backup in plan.backups]
+
+    def test_incremental_chain(self):
+        base_id = self.add_backup('base', 0, None, 0, 100, 1000)
+        self.add_backup('incremental', 2, base_id, 100, 200, 10)
+        self.add_backup('incremental', 2, base_id, 200, 300, 10)
+        self.assertEqual(self.get_plan(), [
+            ('base', 100), ('incremental', 200), ('incremental', 300)])
+
+    def test_differential_shortcut(self):
+        base_id = self.add_backup('base', 0, None, 0, 100, 1000)
+        self.add_backup('incremental', 2, base_id, 100, 200, 10)
+        self.add_backup('incremental', 2, base_id, 200, 300, 10)
+        self.add_backup('differential', 1, base_id, 100, 300, 20)
+        self.assertEqual(self.get_plan(), [
+            ('base', 100), ('differential', 300)])
+
+    def test_restore_lsn(self):
+        base_id = self.add_backup('base', 0, None, 0, 100, 1000)
+        self.add_backup('incremental', 2, base_id, 100, 200, 10)
+        self.add_backup('incremental', 2, base_id, 200, 300, 10)
+        self.assertEqual(self.get_plan(restore_lsn=250), [
+            ('base', 100), ('incremental', 200)])
+
+    def test_cheaper_full_backup(self):
+        base_id = self.add_backup('base', 0, None, 0, 100, 1000)
+        for lsn in range(100, 1000, 100):
+            self.add_backup('incremental', 2, base_id, lsn, lsn + 100,
+                            10 ** 9)
+        self.add_backup('full', 0, None, 0, 1000, 1000)
+        self.assertEqual(self.get_plan(), [('full', 1000)])
+
+    def test_full_backup_is_not_extended(self):
+        self.add_backup('full', 0, None, 0, 100, 1000)
+        base_id = self.add_backup('base', 0, None, 0, 50, 1000)
+        self.add_backup('incremental', 2, base_id, 50, 100, 10)
+        self.add_backup('incremental', 2, base_id, 100, 200, 10)
+        self.assertEqual(self.get_plan(), [
+            ('base', 50), ('incremental', 100), ('incremental', 200)])
+
+    def test_missing_link(self):
+        base_id = self.add_backup('base', 0, None, 0, 100, 1000)
+        self.add_backup('incremental', 2, base_id, 200, 300, 10)
+        with self.assertRaises(ProgramError):
+            self.get_plan()
+
+    def test_no_backup_before_target(self):
+        self.add_backup('base', 0, None, 0, 100, 1000)
+        with self.assertRaises(ProgramError):
+            self.get_plan(restore_lsn=50)
+
+    def test_measured_speeds(self):
+        self.catalog.add_restore('base', 100 * 1024 * 1024, 10.0)
+        planner = RestorePlanner(self.catalog)
+        self.assertEqual(planner.speeds['base'], 10 * 1024 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from xtrabackup.restore_scheduler import IncrementalPrefetcher
+
+
+class IncrementalPrefetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archives = []
+        for step in range(1, 6):
+            path = os.path.join(self.directory, 'inc_%d.tar' % step)
+            with open(path, 'wb') as archive:
+                archive.write(b'\0' * 1000)
+            self.archives.append((step, path))
+        self.lock = threading.Lock()
+        self.extracted = []
+        self.pending = []
+        self.max_pending = 0
+        self.failed_step = None
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def extract(self, step, archive_path):
+        if step == self.failed_step:
+            raise IOError('Truncated archive')
+        path = os.path.join(self.directory, 'extract_%d' % step)
+        os.mkdir(path)
+        with open(os.path.join(path, 'data'), 'wb') as data_file:
+            data_file.write(b'\0' * 1500)
+        with self.lock:
+            self.extracted.append(step)
+            self.pending.append(step)
+            self.max_pending = max(self.max_pending, len(self.pending))
+        return path
+
+    def apply(self, prefetcher):
+        prefetcher.start(self.archives)
+        try:
+            for step, archive_path in self.archives:
+                archive = prefetcher.get()
+                self.assertEqual(archive.step, step)
+                self.assertTrue(os.path.isdir(archive.extracted_path))
+                with self.lock:
+                    self.pending.remove(step)
+                prefetcher.release(archive)
+                self.assertFalse(os.path.exists(archive.extracted_path))
+        finally:
+            prefetcher.stop()
+
+    def test_lookahead(self):
+        for lookahead in [0, 1, 3]:
+            self.extracted = []
+            self.max_pending = 0
+            self.apply(IncrementalPrefetcher(self.extract, lookahead))
+            self.assertEqual(self.extracted, [1, 2, 3, 4, 5])
+            self.assertLessEqual(self.max_pending, lookahead + 1)
+
+    def test_disk_budget(self):
+        prefetcher = IncrementalPrefetcher(self.extract, 4, 2000)
+        self.apply(prefetcher)
+        self.assertEqual(self.extracted, [1, 2, 3, 4, 5])
+        # One extracted archive of 1500 bytes fits in the budget.
+        self.assertEqual(self.max_pending, 1)
+        self.assertEqual(prefetcher.used_space, 0)
+
+    def test_first_archive_ignores_the_budget(self):
+        self.archives = self.archives[:1]
+        self.apply(IncrementalPrefetcher(self.extract, 1, 10))
+        self.assertEqual(self.extracted, [1])
+
+    def test_extraction_error(self):
+        self.failed_step = 2
+        prefetcher = IncrementalPrefetcher(self.extract, 2)
+        prefetcher.start(self.archives)
+        try:
+            prefetcher.release(prefetcher.get())
+            with self.assertRaises(IOError):
+                prefetcher.get()
+        finally:
+            prefetcher.stop()
+        self.assertEqual(self.extracted, [1])
+
+    def test_stop(self):
+        prefetcher = IncrementalPrefetcher(self.extract, 0)
+        prefetcher.start(self.archives)
+        prefetcher.get()
+        prefetcher.stop()
+        self.assertFalse(prefetcher.thread.is_alive())
+        self.assertEqual(self.extracted, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from xtrabackup.retention import (RepositoryBackup, RetentionPolicy,
+                                  delete_backup, scan_repository)
+import xtrabackup.filesystem_utils as filesystem_utils
+
+
+def timestamp(*date):
+    return time.mktime(datetime.datetime(*date).timetuple())
+
+
+def full_backup(name, *date):
+    return RepositoryBackup('db1', 'full', 0, timestamp(*date), name, 100)
+
+
+class RetentionPolicyTest(unittest.TestCase):
+
+    def select(self, policy, backups):
+        return sorted(backup.archive_path
+                      for backup in policy.select(backups))
+
+    def test_last(self):
+        backups = [full_backup('day_%d' % day, 2024, 1, day, 3)
+                   for day in range(1, 6)]
+        self.assertEqual(self.select(RetentionPolicy(last=2), backups),
+                         ['day_4', 'day_5'])
+
+    def test_daily_keeps_last_backup_of_each_day(self):
+        backups = [full_backup('%d_%d' % (day, hour), 2024, 1, day, hour)
+                   for day in range(1, 4) for hour in [3, 15]]
+        self.assertEqual(
+            self.select(RetentionPolicy(last=0, daily=2), backups),
+            ['2_15', '3_15'])
+
+    def test_grandfather_father_son(self):
+        backups = []
+        moment = datetime.datetime(2024, 1, 1, 3)
+        while moment < datetime.datetime(2024, 4, 1):
+            backups.append(full_backup(moment.strftime('%Y%m%d'),
+                                       *moment.timetuple()[:4]))
+            moment += datetime.timedelta(days=1)
+        kept = self.select(
+            RetentionPolicy(last=1, daily=3, weekly=2, monthly=3), backups)
+        self.assertEqual(kept, [
+            '20240131', '20240229', '20240324', '20240329', '20240330',
+            '20240331'])
+
+    def test_chains_are_independent(self):
+        backups = [full_backup('a', 2024, 1, 1, 3),
+                   RepositoryBackup('db2', 'full', 0,
+                                    timestamp(2024, 1, 1, 2), 'b', 100)]
+        self.assertEqual(self.select(RetentionPolicy(last=1), backups),
+                         ['a', 'b'])
+
+    def test_parents_are_kept(self):
+        base = RepositoryBackup('db1', 'base', 0, timestamp(2024, 1, 1),
+                                'base', 100)
+        first = RepositoryBackup('db1', 'incremental', 2,
+                                 timestamp(2024, 1, 2), 'inc_1', 10)
+        second = RepositoryBackup('db1', 'incremental', 2,
+                                  timestamp(2024, 1, 3), 'inc_2', 10)
+        first.parent = base
+        second.parent = first
+        self.assertEqual(
+            self.select(RetentionPolicy(last=1), [base, first, second]),
+            ['base', 'inc_1', 'inc_2'])
+
+    def test_lower_levels_are_kept(self):
+        old_base = RepositoryBackup('db1', 'base', 0, timestamp(2024, 1, 1),
+                                    'old_base', 100)
+        base = RepositoryBackup('db1', 'base', 0, timestamp(2024, 1, 2),
+                                'base', 100)
+        differential = RepositoryBackup('db1', 'differential', 1,
+                                        timestamp(2024, 1, 3), 'diff', 10)
+        incremental = RepositoryBackup('db1', 'incremental', 2,
+                                       timestamp(2024, 1, 4), 'inc', 10)
+        self.assertEqual(
+            self.select(RetentionPolicy(last=1),
+                        [old_base, base, differential, incremental]),
+            ['base', 'diff', 'inc'])
+
+
+class ScanRepositoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repository = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.repository)
+
+    def create_archive(self, name):
+        with open(os.path.join(self.repository, name), 'wb') as archive:
+            archive.write(b'\0' * 10)
+
+    def test_cycles_are_rebuilt_per_chain(self):
+        for name in ['base_backup_20240101_0300_db1.tar.gz',
+                     'base_backup_20240101_0400_db2.tar.gz',
+                     'inc_1_backup_20240102_030000_db1.tar.gz',
+                     'diff_1_backup_20240103_030000_db1.tar.gz',
+                     'backup_20240104_0300.tar.gz',
+                     'notes.txt']:
+            self.create_archive(name)
+        backups = dict((backup.archive_path, backup)
+                       for backup in scan_repository(self.repository))
+        self.assertEqual(sorted(backups), [
+            'backup_20240104_0300.tar.gz',
+            'base_backup_20240101_0300_db1.tar.gz',
+            'base_backup_20240101_0400_db2.tar.gz',
+            'diff_1_backup_20240103_030000_db1.tar.gz',
+            'inc_1_backup_20240102_030000_db1.tar.gz'])
+        incremental = backups['inc_1_backup_20240102_030000_db1.tar.gz']
+        differential = backups['diff_1_backup_20240103_030000_db1.tar.gz']
+        self.assertEqual(incremental.kind, 'incremental')
+        self.assertEqual(incremental.chain, 'db1')
+        self.assertEqual(incremental.parent.archive_path,
+                         'base_backup_20240101_0300_db1.tar.gz')
+        self.assertEqual(differential.parent.archive_path,
+                         'base_backup_20240101_0300_db1.tar.gz')
+        self.assertEqual(backups['backup_20240104_0300.tar.gz'].chain,
+                         'default')
+        self.assertEqual(incremental.created_at, timestamp(2024, 1, 2, 3))
+
+    def test_checksums_are_deleted_first(self):
+        name = 'base_backup_20240101_0300_db1.tar.gz'
+        self.create_archive(name)
+        self.create_archive(filesystem_utils.get_checksum_path(name))
+        backup = full_backup(name, 2024, 1, 1, 3)
+        error = OSError('Device or resource busy')
+        with mock.patch.object(os, 'unlink', side_effect=[None, error]):
+            self.assertEqual(delete_backup(self.repository, backup),
+                             (backup, error))
+            self.assertEqual([call[0][0] for call in os.unlink.call_args_list],
+                             [filesystem_utils.get_checksum_path(
+                                 os.path.join(self.repository, name)),
+                              os.path.join(self.repository, name)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,250 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import xtrabackup.storage as storage
+
+
+class RecordingStorage(storage.LocalStorage):
+
+    def __init__(self, root, failed_offset=None):
+        storage.LocalStorage.__init__(self, root)
+        self.failed_offset = failed_offset
+        self.ranges = []
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def read_range(self, path, offset, size):
+        with self.lock:
+            self.ranges.append((offset, size))
+        if offset == self.failed_offset:
+            raise IOError('Connection reset')
+        return storage.LocalStorage.read_range(self, path, offset, size)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeS3Client:
+
+    def __init__(self, failures=0, failed_part=None):
+        self.failures = failures
+        self.failed_part = failed_part
+        self.uploaded = []
+        self.completed = None
+        self.aborted = False
+        self.lock = threading.Lock()
+
+    def create_multipart_upload(self, Bucket, Key):
+        return {'UploadId': 'new'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self.lock:
+            if self.failures or PartNumber == self.failed_part:
+                self.failures = max(0, self.failures - 1)
+                raise IOError('Connection reset')
+            self.uploaded.append((UploadId, PartNumber, len(Body)))
+        return {'ETag': '"%s"' % hashlib.md5(Body).hexdigest()}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId,
+                                  MultipartUpload):
+        self.completed = (UploadId, MultipartUpload['Parts'])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted = True
+
+
+class MultipartUploadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.part_size = storage.MIN_PART_SIZE
+        self.data = os.urandom(2 * self.part_size + 1000)
+        self.parts = [self.data[offset:offset + self.part_size]
+                      for offset in range(0, len(self.data), self.part_size)]
+        self.recorded = {}
+        patcher = mock.patch.object(storage, 'RETRY_DELAY', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record_part(self, number, size, digest):
+        self.recorded[number] = (size, digest)
+
+    def upload(self, client, upload_id=None, stored_parts=None):
+        writer = storage.MultipartUpload(
+            client, 'bucket', 'archive', self.part_size, 2, upload_id,
+            stored_parts, self.record_part)
+        for offset in range(0, len(self.data), 300000):
+            writer.write(self.data[offset:offset + 300000])
+        writer.close()
+        return writer
+
+    def get_part(self, number):
+        data = self.parts[number - 1]
+        return len(data), hashlib.md5(data).hexdigest()
+
+    def test_upload(self):
+        client = FakeS3Client(failures=2)
+        writer = self.upload(client)
+        self.assertEqual(writer.size, len(self.data))
+        self.assertEqual(sorted(client.uploaded), [
+            ('new', 1, self.part_size), ('new', 2, self.part_size),
+            ('new', 3, 1000)])
+        self.assertEqual(client.completed, ('new', [
+            {'PartNumber': number, 'ETag': '"%s"' % self.get_part(number)[1]}
+            for number in [1, 2, 3]]))
+        self.assertEqual(self.recorded, dict(
+            (number, self.get_part(number)) for number in [1, 2, 3]))
+
+    def test_stored_parts_are_reused(self):
+        client = FakeS3Client()
+        stored_parts = {1: self.get_part(1),
+                        2: (self.part_size, hashlib.md5(b'').hexdigest())}
+        self.upload(client, 'previous', stored_parts)
+        self.assertEqual(sorted(client.uploaded), [
+            ('previous', 2, self.part_size), ('previous', 3, 1000)])
+        self.assertEqual(client.completed[0], 'previous')
+        self.assertEqual([part['PartNumber'] for part in client.completed[1]],
+                         [1, 2, 3])
+        self.assertEqual(self.recorded[2], self.get_part(2))
+
+    def test_empty_upload(self):
+        client = FakeS3Client()
+        writer = storage.MultipartUpload(client, 'bucket', 'archive',
+                                         self.part_size, 2)
+        writer.close()
+        self.assertEqual(client.uploaded, [('new', 1, 0)])
+        self.assertEqual(len(client.completed[1]), 1)
+
+    def test_failed_part(self):
+        client = FakeS3Client(failed_part=2)
+        with self.assertRaises(IOError):
+            self.upload(client)
+        self.assertIsNone(client.completed)
+
+    def test_abort(self):
+        client = FakeS3Client()
+        writer = storage.MultipartUpload(client, 'bucket', 'archive',
+                                         self.part_size, 2)
+        writer.write(self.data)
+        writer.abort()
+        self.assertTrue(client.aborted)
+        self.assertIsNone(client.completed)
+
+
+class RangedReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = os.urandom(10000)
+        with open(os.path.join(self.directory, 'archive'), 'wb') as archive:
+            archive.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open(self, threads=3, **options):
+        self.storage = RecordingStorage(self.directory, **options)
+        return storage.RangedReader(self.storage, 'archive', threads,
+                                    range_size=1024)
+
+    def test_read(self):
+        for read_size in [-1, 1, 100, 1024, 3000, 20000]:
+            with self.open() as reader:
+                chunks = []
+                while True:
+                    data = reader.read(read_size)
+                    if not data:
+                        break
+                    if read_size > 0:
+                        self.assertLessEqual(len(data), read_size)
+                    chunks.append(data)
+            self.assertEqual(b''.join(chunks), self.data)
+            self.assertEqual(sorted(self.storage.ranges), [
+                (offset, min(1024, len(self.data) - offset))
+                for offset in range(0, len(self.data), 1024)])
+
+    def test_empty_archive(self):
+        self.data = b''
+        open(os.path.join(self.directory, 'archive'), 'wb').close()
+        with self.open() as reader:
+            self.assertEqual(reader.read(), b'')
+        self.assertEqual(self.storage.ranges, [])
+
+    def test_ranges_run_ahead_of_the_reader(self):
+        reader = self.open(threads=2)
+        # 2 ranges per thread are fetched before the first read.
+        for thread in reader.threads:
+            thread.join(0.2)
+        self.assertEqual(len(self.storage.ranges), 4)
+        self.assertEqual(reader.read(1024), self.data[:1024])
+        reader.close()
+        self.assertFalse(any(thread.is_alive() for thread in reader.threads))
+        self.assertFalse(self.storage.closed)
+
+    def test_failed_range(self):
+        with self.open(failed_offset=2048) as reader:
+            with self.assertRaises(IOError):
+                reader.read()
+        self.assertFalse(any(thread.is_alive() for thread in reader.threads))
+
+    def test_open_archive_closes_its_storage(self):
+        self.storage = RecordingStorage(self.directory)
+        with mock.patch.object(storage, 'split_location',
+                               return_value=(self.storage, 'archive')):
+            with storage.open_archive('sftp://host/archive') as reader:
+                self.assertEqual(reader.read(), self.data)
+        self.assertTrue(self.storage.closed)
+
+
+class SFTPStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(storage, 'paramiko')
+        self.paramiko = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.clients = []
+        self.paramiko.SSHClient.side_effect = self.create_client
+        self.storage = storage.get_storage('sftp://backup@host/backups')
+
+    def create_client(self):
+        client = mock.MagicMock()
+        client.open_sftp.return_value.stat.return_value.st_size = 42
+        self.clients.append(client)
+        return client
+
+    def open_connections(self, threads):
+        for index in range(threads):
+            thread = threading.Thread(target=self.storage.get_sftp)
+            thread.start()
+            thread.join()
+
+    def test_connection_per_thread(self):
+        self.assertIs(self.storage.get_sftp(), self.storage.get_sftp())
+        self.open_connections(2)
+        self.assertEqual(len(self.storage.clients), 3)
+
+    def test_close(self):
+        self.storage.get_sftp()
+        self.open_connections(2)
+        clients = list(self.storage.clients)
+        self.storage.close()
+        for client in clients:
+            client.close.assert_called_once_with()
+        self.assertEqual(self.storage.clients, [])
+        self.storage.get_sftp()
+        self.assertEqual(len(self.storage.clients), 1)
+
+    def test_location_connections_are_closed(self):
+        self.assertEqual(storage.get_archive_size(
+            'sftp://backup@host/backups/base_backup.tar.gz'), 42)
+        self.assertEqual(len(self.clients), 1)
+        self.clients[0].close.assert_called_once_with()
+        self.clients[0].open_sftp.return_value.stat.assert_called_once_with(
+            '/backups/base_backup.tar.gz')
+
+
+if __name__ == '__main__':
+    unittest.main()
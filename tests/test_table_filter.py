@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+from xtrabackup.exception import ProgramError
+from xtrabackup.table_filter import (BackupFilter, TableFilter,
+                                     describe_filters, dump_filters,
+                                     get_member_table, load_filters,
+                                     parse_table_patterns)
+
+
+class BackupFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tables_file = os.path.join(self.directory, 'tables.txt')
+        with open(self.tables_file, 'w') as tables_file:
+            tables_file.write('# Order tables\nshop.orders\n\nshop.items\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_full_backup(self):
+        backup_filter = BackupFilter()
+        self.assertFalse(backup_filter.is_partial())
+        self.assertEqual(backup_filter.get_options(), [])
+        self.assertIsNone(backup_filter.to_dict())
+
+    def test_options(self):
+        backup_filter = BackupFilter('shop  crm', r'^shop[.]orders',
+                                     self.tables_file)
+        self.assertTrue(backup_filter.is_partial())
+        self.assertEqual(backup_filter.get_options(), [
+            '--databases=shop crm', '--include=^shop[.]orders',
+            '--tables-file=' + self.tables_file])
+        self.assertEqual(backup_filter.to_dict(), {
+            'databases': ['shop', 'crm'],
+            'tables': '^shop[.]orders',
+            'table_names': ['shop.orders', 'shop.items']})
+
+    def test_invalid_filters(self):
+        with self.assertRaises(ProgramError):
+            BackupFilter(tables='shop.(orders')
+        with self.assertRaises(ProgramError):
+            BackupFilter(tables_file=os.path.join(self.directory, 'none'))
+
+    def test_filters_serialization(self):
+        filters = BackupFilter('shop', tables_file=self.tables_file).to_dict()
+        self.assertEqual(load_filters(dump_filters(filters)), filters)
+        self.assertIsNone(dump_filters(None))
+        self.assertIsNone(load_filters(None))
+        self.assertEqual(describe_filters(filters),
+                         'databases: shop - table_names: shop.orders '
+                         'shop.items')
+
+
+class TableFilterTest(unittest.TestCase):
+
+    def test_parse_table_patterns(self):
+        self.assertEqual(parse_table_patterns('shop.orders, archive.*,'),
+                         ['shop.orders', 'archive.*'])
+        for value in ['orders', ' , ']:
+            with self.assertRaises(ProgramError):
+                parse_table_patterns(value)
+
+    def test_member_table(self):
+        self.assertEqual(get_member_table('./shop/orders.ibd'),
+                         ('shop', 'orders'))
+        self.assertEqual(get_member_table('shop/orders#P#p2024.ibd'),
+                         ('shop', 'orders'))
+        self.assertEqual(get_member_table('my@002ddb/order@0020items.ibd'),
+                         ('my-db', 'order items'))
+        self.assertIsNone(get_member_table('ibdata1'))
+        self.assertIsNone(get_member_table('xtrabackup_checkpoints'))
+
+    def test_matches_member(self):
+        table_filter = TableFilter(['shop.orders', 'archive.*'], ['mysql'])
+        self.assertTrue(table_filter.matches_member('shop/orders.ibd'))
+        self.assertTrue(table_filter.matches_member('shop/orders#p#p1.ibd'))
+        self.assertTrue(table_filter.matches_member('archive/2023.ibd'))
+        self.assertFalse(table_filter.matches_member('shop/items.ibd'))
+        self.assertTrue(table_filter.matches_member('ibdata1'))
+        self.assertFalse(TableFilter(['*.*'], ['mysql']).matches_member(
+            'mysql/user.ibd'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import io
+import unittest
+from unittest import mock
+import xtrabackup.throttle as throttle
+from xtrabackup.exception import ProgramError
+from xtrabackup.throttle import (MEGABYTE, RateLimiter, ThrottledStream,
+                                 get_innobackupex_throttle,
+                                 set_process_priority, throttle_function)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(throttle, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_consume(self):
+        limiter = RateLimiter(10 * MEGABYTE)
+        for index in range(10):
+            limiter.consume(5 * MEGABYTE)
+        # 50 MB at 10 MB/s, without any allowance at the start.
+        self.assertAlmostEqual(sum(self.clock.sleeps), 5.0)
+
+    def test_allowance_is_capped(self):
+        limiter = RateLimiter(10 * MEGABYTE)
+        self.clock.now += 60
+        limiter.consume(10 * MEGABYTE)
+        self.assertEqual(self.clock.sleeps, [])
+        limiter.consume(10 * MEGABYTE)
+        self.assertAlmostEqual(sum(self.clock.sleeps), 1.0)
+
+    def test_set_rate(self):
+        limiter = RateLimiter(16 * MEGABYTE)
+        limiter.set_rate(64 * MEGABYTE)
+        self.assertEqual(limiter.rate, 16 * MEGABYTE)
+        limiter.set_rate(1)
+        self.assertEqual(limiter.rate, MEGABYTE)
+        limiter.consume(2 * MEGABYTE)
+        self.assertAlmostEqual(sum(self.clock.sleeps), 2.0)
+
+    def test_throttled_stream(self):
+        limiter = RateLimiter(MEGABYTE)
+        output = io.BytesIO()
+        stream = ThrottledStream(output, limiter)
+        stream.write(b'\0' * MEGABYTE)
+        self.assertEqual(output.getvalue(), b'\0' * MEGABYTE)
+        stream = ThrottledStream(io.BytesIO(b'\0' * MEGABYTE), limiter)
+        self.assertEqual(len(stream.read()), MEGABYTE)
+        self.assertAlmostEqual(sum(self.clock.sleeps), 2.0)
+
+    def test_throttle_function(self):
+        def copy(input_stream, output_stream):
+            output_stream.write(input_stream.read())
+
+        def produce(input_stream, output_stream):
+            output_stream.write(b'\0' * MEGABYTE)
+
+        self.assertIs(throttle_function(copy, None), copy)
+        limiter = RateLimiter(MEGABYTE)
+        output = io.BytesIO()
+        throttle_function(copy, limiter)(io.BytesIO(b'\0' * MEGABYTE),
+                                         output)
+        self.assertEqual(len(output.getvalue()), MEGABYTE)
+        throttle_function(produce, limiter)(None, output)
+        self.assertEqual(len(output.getvalue()), 2 * MEGABYTE)
+        self.assertAlmostEqual(sum(self.clock.sleeps), 2.0)
+
+
+class ThrottleOptionsTest(unittest.TestCase):
+
+    def test_innobackupex_throttle(self):
+        self.assertEqual(get_innobackupex_throttle(100 * MEGABYTE), 10)
+        self.assertEqual(get_innobackupex_throttle(25 * MEGABYTE), 2)
+        self.assertEqual(get_innobackupex_throttle(4 * MEGABYTE), 1)
+
+    def test_process_priority(self):
+        with mock.patch.object(throttle.os, 'nice') as nice, \
+                mock.patch.object(throttle.subprocess,
+                                  'check_call') as check_call:
+            set_process_priority('10', 'idle')
+            nice.assert_called_once_with(10)
+            self.assertEqual(check_call.call_args[0][0][:3],
+                             ['ionice', '-c', '3'])
+            with self.assertRaises(ProgramError):
+                set_process_priority(None, 'lowest')
+
+
+if __name__ == '__main__':
+    unittest.main()
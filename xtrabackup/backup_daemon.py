@@ -0,0 +1,365 @@
+import datetime
+import errno
+import fcntl
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from docopt import docopt
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+import xtrabackup.filesystem_utils as filesystem_utils
+import xtrabackup.timer as timer
+from xtrabackup.backup_scheduler import BACKUP_MODES, BackupJob
+from xtrabackup.cron import CronSchedule
+from xtrabackup.exception import ProgramError
+
+
+BACKUP_COMMANDS = ['xtrabackup.full_backup', 'xtrabackup.incremental_backup']
+MAX_WAIT = 60
+
+
+def get_process_context():
+    # The backups run in processes forked from a server process that has
+    # the backup modules loaded. The daemon itself runs threads, a fork of
+    # it could inherit a lock held by one of them.
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(BACKUP_COMMANDS)
+    return context
+
+
+def run_backup(command_name, arguments, log_name, connection, binaries=()):
+    # The server process was started before the daemon located the
+    # binaries, the backups are given the ones found.
+    filesystem_utils.located_binaries.update(binaries)
+    try:
+        importlib.import_module(command_name).run(arguments, log_name)
+    except Exception as error:
+        connection.send(str(error) or error.__class__.__name__)
+        sys.exit(1)
+    finally:
+        connection.close()
+
+
+def parse_listen_address(address):
+    host, separator, port = address.rpartition(':')
+    if not separator or not port.isdigit():
+        raise ProgramError("Invalid listen address, expected <host>:<port>: "
+                           + address)
+    return host or '127.0.0.1', int(port)
+
+
+def format_date(date):
+    return date.strftime('%Y-%m-%dT%H:%M:%S') if date else None
+
+
+class BackupRun:
+
+    def __init__(self, mode, trigger):
+        self.mode = mode
+        self.trigger = trigger
+        self.status = 'queued'
+        self.started_at = datetime.datetime.now()
+        self.duration = None
+        self.error = None
+        self.pid = None
+
+    def to_dict(self):
+        return {
+            'pid': self.pid,
+            'mode': self.mode,
+            'trigger': self.trigger,
+            'status': self.status,
+            'started_at': format_date(self.started_at),
+            'duration': self.duration,
+            'error': self.error,
+        }
+
+
+class DaemonInstance:
+    """Backups of one instance of the inventory, each one run in its own
+    process.
+
+    The backup options are parsed once per mode. A lock file in the
+    temporary directory keeps two backups of the instance from running at
+    the same time, including in another daemon sharing the directory.
+    """
+
+    def __init__(self, instance, tmp_dir, out_dir, slots, context, logger):
+        self.name = instance['name']
+        self.instance = instance
+        self.tmp_dir = tmp_dir
+        self.out_dir = out_dir
+        self.slots = slots
+        self.context = context
+        self.logger = logger
+        self.mode = instance.get('mode', 'full')
+        self.lock_path = os.path.join(tmp_dir, self.name + '.lock')
+        self.lock = threading.Lock()
+        self.arguments = {}
+        self.schedules = []
+        for schedule in instance.get('schedules', []):
+            mode = schedule.get('mode', self.mode)
+            self.get_arguments(mode)
+            self.schedules.append([CronSchedule(schedule['cron']), mode,
+                                   None])
+        self.get_arguments(self.mode)
+        self.running = None
+        self.last_run = None
+        self.thread = None
+
+    def get_arguments(self, mode):
+        if mode in self.arguments:
+            return self.arguments[mode]
+        if mode not in BACKUP_MODES:
+            raise ProgramError("Unsupported backup mode for %s: %s"
+                               % (self.name, mode))
+        job = BackupJob(dict(self.instance, mode=mode), self.tmp_dir,
+                        self.out_dir)
+        command = BACKUP_MODES[mode][0]
+        try:
+            arguments = docopt(importlib.import_module(command).__doc__,
+                               job.prepare_arguments())
+        except SystemExit:
+            raise ProgramError("Invalid backup options for %s: %s"
+                               % (self.name,
+                                  ' '.join(self.instance.get('options',
+                                                             []))))
+        self.arguments[mode] = (command, arguments, job.workdir)
+        return self.arguments[mode]
+
+    def acquire_lock(self):
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as error:
+            lock_file.close()
+            if error.errno in (errno.EAGAIN, errno.EACCES):
+                return None
+            raise
+        return lock_file
+
+    def start(self, mode, trigger):
+        command, arguments, workdir = self.get_arguments(mode)
+        with self.lock:
+            if self.running is not None:
+                return False
+            lock_file = self.acquire_lock()
+            if lock_file is None:
+                return False
+            self.running = BackupRun(mode, trigger)
+            self.thread = threading.Thread(
+                target=self.run, args=(self.running, lock_file))
+            self.thread.start()
+        return True
+
+    def run(self, backup_run, lock_file):
+        command, arguments, workdir = self.get_arguments(backup_run.mode)
+        stop_watch = timer.Timer()
+        try:
+            with self.slots:
+                backup_run.status = 'running'
+                self.logger.info("Backup started. Instance: %s - Mode: %s\
+ - Trigger: %s", self.name, backup_run.mode, backup_run.trigger)
+                stop_watch.start_timer()
+                filesystem_utils.mkdir_path(workdir, 0o755)
+                self.run_process(backup_run, command, arguments)
+                backup_run.status = 'success'
+        except Exception as error:
+            backup_run.status = 'failed'
+            backup_run.error = str(error)
+            self.logger.error("Backup failed. Instance: %s - Mode: %s\
+ - Error: %s", self.name, backup_run.mode, backup_run.error)
+        finally:
+            lock_file.close()
+            if stop_watch.start_time is not None:
+                stop_watch.stop_timer()
+                backup_run.duration = stop_watch.duration_in_seconds()
+            with self.lock:
+                self.running = None
+                self.last_run = backup_run
+        self.logger.info("Backup finished. Instance: %s - Mode: %s\
+ - Status: %s - Duration: %s", self.name, backup_run.mode,
+                         backup_run.status, backup_run.duration)
+
+    def run_process(self, backup_run, command, arguments):
+        reader, writer = self.context.Pipe(False)
+        process = self.context.Process(
+            target=run_backup,
+            args=(command, arguments, self.name, writer,
+                  sorted(filesystem_utils.located_binaries)),
+            name='%s-%s' % (self.name, backup_run.mode))
+        process.start()
+        writer.close()
+        backup_run.pid = process.pid
+        try:
+            error = reader.recv()
+        except EOFError:
+            error = None
+        process.join()
+        reader.close()
+        if process.exitcode != 0:
+            raise ProgramError(error or "Backup process exit code: %s"
+                               % process.exitcode)
+
+    def run_due_schedules(self, now):
+        for schedule in self.schedules:
+            cron, mode, next_run = schedule
+            if next_run is not None and next_run <= now:
+                if not self.start(mode, 'schedule'):
+                    self.logger.warning(
+                        "Scheduled backup skipped, a backup of the instance "
+                        "is running. Instance: %s - Mode: %s",
+                        self.name, mode)
+            if next_run is None or next_run <= now:
+                schedule[2] = cron.get_next(now)
+
+    def get_next_run(self):
+        next_runs = [next_run for cron, mode, next_run in self.schedules
+                     if next_run is not None]
+        return min(next_runs) if next_runs else None
+
+    def wait(self):
+        thread = self.thread
+        if thread is not None:
+            thread.join()
+
+    def to_dict(self):
+        with self.lock:
+            running, last_run = self.running, self.last_run
+        return {
+            'name': self.name,
+            'mode': self.mode,
+            'running': running.to_dict() if running else None,
+            'last_run': last_run.to_dict() if last_run else None,
+            'schedules': [{
+                'cron': cron.expression,
+                'mode': mode,
+                'next_run': format_date(next_run),
+            } for cron, mode, next_run in self.schedules],
+        }
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, status, value):
+        body = json.dumps(value, sort_keys=True).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_instance(self, name):
+        instance = self.server.backup_daemon.instances.get(name)
+        if instance is None:
+            self.send_json(404, {'error': 'Unknown instance: ' + name})
+        return instance
+
+    def do_GET(self):
+        parts = urlparse(self.path).path.strip('/').split('/')
+        daemon = self.server.backup_daemon
+        if parts == ['instances']:
+            self.send_json(200, [daemon.instances[name].to_dict()
+                                 for name in sorted(daemon.instances)])
+        elif len(parts) == 2 and parts[0] == 'instances':
+            instance = self.get_instance(parts[1])
+            if instance is not None:
+                self.send_json(200, instance.to_dict())
+        else:
+            self.send_json(404, {'error': 'Not found: ' + self.path})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 3 or parts[0] != 'instances' or \
+                parts[2] != 'backup':
+            self.send_json(404, {'error': 'Not found: ' + self.path})
+            return
+        instance = self.get_instance(parts[1])
+        if instance is None:
+            return
+        mode = parse_qs(url.query).get('mode', [instance.mode])[0]
+        try:
+            started = instance.start(mode, 'api')
+        except ProgramError as error:
+            self.send_json(400, {'error': str(error)})
+            return
+        if not started:
+            self.send_json(409, {'error': 'A backup of the instance is '
+                                          'running: ' + instance.name})
+            return
+        self.send_json(202, instance.to_dict())
+
+    def log_message(self, format, *args):
+        self.server.backup_daemon.logger.debug(
+            "Control request: " + format, *args)
+
+
+class ControlServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, backup_daemon):
+        HTTPServer.__init__(self, address, ControlHandler)
+        self.backup_daemon = backup_daemon
+
+
+class BackupDaemon:
+    """Runs the backups of the inventory on their cron schedules, and on
+    demand through an HTTP control API.
+    """
+
+    def __init__(self, instances, tmp_dir, out_dir, concurrency, listen,
+                 logger):
+        self.logger = logger
+        filesystem_utils.mkdir_path(tmp_dir, 0o755)
+        slots = threading.BoundedSemaphore(max(1, concurrency))
+        context = get_process_context()
+        self.instances = {}
+        for instance in instances:
+            if instance['name'] in self.instances:
+                raise ProgramError("Duplicate instance in inventory: "
+                                   + instance['name'])
+            self.instances[instance['name']] = DaemonInstance(
+                instance, tmp_dir, out_dir, slots, context, logger)
+        self.listen = parse_listen_address(listen)
+        self.stopped = threading.Event()
+        self.server = None
+
+    def start_server(self):
+        self.server = ControlServer(self.listen, self)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.logger.info("Control API listening on %s:%s", *self.listen)
+
+    def stop(self, *args):
+        self.stopped.set()
+
+    def run(self):
+        filesystem_utils.check_required_binaries(['innobackupex', 'tar'])
+        self.start_server()
+        try:
+            while not self.stopped.is_set():
+                now = datetime.datetime.now()
+                for instance in self.instances.values():
+                    instance.run_due_schedules(now)
+                next_runs = [instance.get_next_run()
+                             for instance in self.instances.values()]
+                next_runs = [next_run for next_run in next_runs
+                             if next_run is not None]
+                delay = MAX_WAIT
+                if next_runs:
+                    delay = (min(next_runs) -
+                             datetime.datetime.now()).total_seconds()
+                # The delay is capped to follow the changes of the clock.
+                self.stopped.wait(min(MAX_WAIT, max(0, delay)))
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+        self.logger.info("Waiting for the running backups.")
+        for instance in self.instances.values():
+            instance.wait()
@@ -0,0 +1,182 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import xtrabackup.filesystem_utils as filesystem_utils
+import xtrabackup.timer as timer
+from xtrabackup.exception import ProgramError
+
+
+BACKUP_MODES = {
+    'full': ('xtrabackup.full_backup', []),
+    'base': ('xtrabackup.incremental_backup', []),
+    'incremental': ('xtrabackup.incremental_backup', ['--incremental']),
+    'differential': ('xtrabackup.incremental_backup', ['--differential']),
+}
+
+
+def load_inventory(path):
+    with open(path) as inventory_file:
+        inventory = json.load(inventory_file)
+    instances = inventory.get('instances')
+    if not instances:
+        raise ProgramError("No instance defined in inventory: " + path)
+    return instances
+
+
+def get_device(path):
+    try:
+        return os.stat(path).st_dev
+    except OSError as error:
+        raise ProgramError("Unable to resolve the device of %s: %s"
+                           % (path, error))
+
+
+def get_repository_device(repository):
+    # A new repository is created on the device of its closest parent.
+    path = os.path.abspath(repository)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return get_device(path)
+
+
+def get_disk(instance):
+    if instance.get('disk'):
+        return instance['disk']
+    if not instance.get('data_dir'):
+        raise ProgramError("No disk or data_dir defined for instance: "
+                           + instance['name'])
+    return get_device(instance['data_dir'])
+
+
+class BackupJob:
+
+    def __init__(self, instance, tmp_dir, out_dir):
+        self.name = instance['name']
+        self.mode = instance.get('mode', 'full')
+        if self.mode not in BACKUP_MODES:
+            raise ProgramError("Unsupported backup mode for %s: %s"
+                               % (self.name, self.mode))
+        self.instance = instance
+        self.repository = instance['repository']
+        self.priority = int(instance.get('priority', 0))
+        self.io_rate = instance.get('io_rate')
+        if any(option.startswith('--io-rate')
+               for option in instance.get('options', [])):
+            raise ProgramError("Use io_rate instead of the --io-rate option "
+                               "for instance: " + self.name)
+        self.disk = None
+        self.repository_device = None
+        self.workdir = os.path.join(tmp_dir, self.name)
+        self.log_file = os.path.join(out_dir, self.name + '.log')
+        self.output_file = os.path.join(out_dir, self.name + '.out')
+        self.status = 'pending'
+        self.duration = None
+        self.stop_watch = timer.Timer()
+
+    def prepare_command(self):
+        module, mode_options = BACKUP_MODES[self.mode]
+        return [sys.executable, '-m', module] + self.prepare_arguments()
+
+    def prepare_arguments(self):
+        module, mode_options = BACKUP_MODES[self.mode]
+        arguments = [
+            self.repository,
+            '--user=' + self.instance['user'],
+            '--tmp-dir=' + self.workdir,
+            '--log-file=' + self.log_file,
+            '--out-file=' + self.output_file,
+            '--backup-threads=' + str(self.instance.get('threads', 1))]
+        for option in ['password', 'socket', 'host', 'port']:
+            if self.instance.get(option):
+                arguments.append('--%s=%s' % (option, self.instance[option]))
+        if self.io_rate:
+            arguments.append('--io-rate=%s' % self.io_rate)
+        arguments.append('--chain=' + self.instance.get('chain', self.name))
+        arguments.extend(mode_options)
+        arguments.extend(self.instance.get('options', []))
+        return arguments
+
+    def run(self):
+        self.status = 'running'
+        self.stop_watch.start_timer()
+        try:
+            filesystem_utils.mkdir_path(self.workdir, 0o755)
+            returncode = subprocess.call(self.prepare_command())
+        except Exception:
+            returncode = None
+        self.stop_watch.stop_timer()
+        self.duration = self.stop_watch.duration_in_seconds()
+        self.status = 'success' if returncode == 0 else 'failed'
+
+
+class BackupScheduler:
+    """Runs the backup jobs of an inventory by priority.
+
+    A job starts once the global concurrency and the slots of its disk and
+    of its repository device allow it. The MB/s budgets of a disk and of a
+    repository device are shared between their slots: each job is given
+    the rate of one slot as its --io-rate, so that the jobs running on the
+    same device never go over its budget.
+    """
+
+    def __init__(self, instances, tmp_dir, out_dir, concurrency,
+                 disk_slots, repository_slots, disk_rate=None,
+                 repository_rate=None):
+        self.jobs = [BackupJob(instance, tmp_dir, out_dir)
+                     for instance in instances]
+        self.concurrency = concurrency
+        self.disk_slots = disk_slots
+        self.repository_slots = repository_slots
+        rates = []
+        if disk_rate:
+            rates.append(float(disk_rate) / disk_slots)
+        if repository_rate:
+            rates.append(float(repository_rate) / repository_slots)
+        for job in self.jobs:
+            job.disk = get_disk(job.instance)
+            job.repository_device = get_repository_device(job.repository)
+            job_rates = rates + ([float(job.io_rate)] if job.io_rate else [])
+            if job_rates:
+                job.io_rate = min(job_rates)
+        self.condition = threading.Condition()
+        self.running = []
+
+    def count_running(self, attribute, value):
+        return len([job for job in self.running
+                    if getattr(job, attribute) == value])
+
+    def can_start(self, job):
+        return (len(self.running) < self.concurrency and
+                self.count_running('disk', job.disk) < self.disk_slots and
+                self.count_running('repository_device',
+                                   job.repository_device) <
+                self.repository_slots)
+
+    def run_job(self, job):
+        try:
+            job.run()
+        finally:
+            with self.condition:
+                self.running.remove(job)
+                self.condition.notify_all()
+
+    def run(self):
+        pending = sorted(self.jobs, key=lambda job: -job.priority)
+        threads = []
+        with self.condition:
+            while pending:
+                job = next((job for job in pending if self.can_start(job)),
+                           None)
+                if job is None:
+                    self.condition.wait()
+                    continue
+                pending.remove(job)
+                self.running.append(job)
+                thread = threading.Thread(target=self.run_job, args=(job,))
+                thread.start()
+                threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return self.jobs
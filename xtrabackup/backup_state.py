@@ -0,0 +1,74 @@
+import json
+import os
+import time
+from xtrabackup.telemetry import write_atomically
+import xtrabackup.filesystem_utils as filesystem_utils
+
+
+STATE_FILE = 'pyxtrabackup.state'
+STATE_VERSION = 1
+
+
+class BackupState:
+    """Stages completed by a backup, kept next to its temporary workdir.
+
+    The state is written after each stage, so that a new run of the same
+    backup skips the stages whose output is still in place.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.values = {}
+        self.completed = []
+        self.started_at = None
+
+    def load(self):
+        try:
+            with open(self.path) as state_file:
+                state = json.load(state_file)
+        except (IOError, OSError, ValueError):
+            return False
+        if state.get('version') != STATE_VERSION:
+            return False
+        self.values = state['values']
+        self.completed = state['completed']
+        self.started_at = state['started_at']
+        return True
+
+    def save(self):
+        write_atomically(self.path, json.dumps({
+            'version': STATE_VERSION,
+            'started_at': self.started_at,
+            'completed': self.completed,
+            'values': self.values,
+        }, sort_keys=True))
+
+    def start(self, values):
+        self.values = values
+        self.completed = []
+        self.started_at = time.time()
+        self.save()
+
+    def complete(self, stage, values):
+        self.completed.append(stage)
+        self.values.update(values)
+        self.save()
+
+    def is_completed(self, stage):
+        return stage in self.completed
+
+    def get_age(self):
+        return time.time() - (self.started_at or 0)
+
+    def matches(self, values):
+        return all(self.values.get(key) == value
+                   for key, value in values.items())
+
+    def remove(self):
+        self.values = {}
+        self.completed = []
+        filesystem_utils.delete_file_if_exists(self.path)
+
+
+def get_state_path(directory):
+    return os.path.join(directory, STATE_FILE)
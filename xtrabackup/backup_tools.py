@@ -1,44 +1,191 @@
+from xtrabackup.backup_state import BackupState, get_state_path
 from xtrabackup.command_executor import CommandExecutor
 from xtrabackup.exception import ProcessError
 from xtrabackup.http_manager import HttpManager
+from xtrabackup.output_log import OUTPUT_FILES, OUTPUT_MAX_SIZE, OutputLog
+from xtrabackup.progress import ProgressMonitor
+from xtrabackup.throttle import (INNOBACKUPEX_CHUNK_SIZE, LatencyProbe,
+                                 MEGABYTE, RateLimiter,
+                                 set_process_priority)
+from xtrabackup.catalog import Catalog, parse_policy
+from xtrabackup.checksum import ArchiveChecksums, verify_archives
+from xtrabackup.chunk_store import ChunkStore, CHUNK_DIRECTORY
+from xtrabackup.compression import Compressor
+from xtrabackup.storage import LocalStorage, get_storage
+from xtrabackup.table_filter import BackupFilter, describe_filters
 import xtrabackup.filesystem_utils as filesystem_utils
 import xtrabackup.log_manager as log_manager
+import xtrabackup.page_tracking as page_tracking
 import xtrabackup.exception as exception
+import xtrabackup.telemetry as telemetry
 import xtrabackup.timer as timer
 import logging
+import os
+import time
+
+
+REQUIRED_BINARIES = ['innobackupex', 'tar']
+STATE_ATTRIBUTES = ['backup_repository', 'final_archive_path',
+                    'archive_path', 'backup_kind', 'backup_level',
+                    'incremental_step', 'base_id', 'last_lsn',
+                    'archive_size', 'archive_checksum']
 
 
 class BackupTool:
 
-    def __init__(self, log_file, output_file, no_compression, debug=False):
+    def __init__(self, log_file, output_file, no_compression, debug=False,
+                 stream=False, compression='gzip', compression_level=None,
+                 compress_threads=1, deduplicate=False, socket=None,
+                 host=None, port=None,
+                 chain='default',
+                 io_rate=None, nice=None, ionice_class=None,
+                 latency_threshold=None, latency_probe_dir=None,
+                 report_file=None, prometheus_file=None,
+                 progress_file=None, progress_url=None,
+                 progress_interval=60, storage=None, upload_threads=4,
+                 upload_part_size='64M', resume=True, resume_max_age=24,
+                 out_file_size=OUTPUT_MAX_SIZE, out_file_count=OUTPUT_FILES,
+                 out_on_failure=False, out_per_job=False, databases=None,
+                 tables=None,
+                 tables_file=None, log_name=None):
         self.debug = debug
+        self.stream = stream
+        self.host = host
         self.log_manager = log_manager.LogManager()
         self.stop_watch = timer.Timer()
-        self.setup_logging(log_file)
+        self.report = telemetry.RunReport('pyxtrabackup', report_file,
+                                          prometheus_file)
+        self.setup_logging(log_file, log_name)
         try:
-            with open(output_file, 'a+'):
-                pass
+            self.output_log = OutputLog(output_file, out_file_size,
+                                        out_file_count, out_on_failure,
+                                        out_per_job)
+            self.output_log.check()
         except Exception as error:
             self.logger.error('Output file error: %s', str(error),
                               exc_info=self.debug)
             raise
-        self.command_executor = CommandExecutor(output_file)
-        self.compress = not no_compression
+        self.rate_limiter = None
+        if io_rate:
+            self.rate_limiter = RateLimiter(float(io_rate) * MEGABYTE)
+            if self.rate_limiter.max_rate < INNOBACKUPEX_CHUNK_SIZE:
+                self.logger.warning(
+                    'innobackupex throttles its copy by chunks of 10 MB, '
+                    'the copy is limited to 10 MB/s instead of %s MB/s.',
+                    io_rate)
+        self.nice = nice
+        self.ionice_class = ionice_class
+        self.latency_probe = None
+        if latency_threshold and self.rate_limiter and latency_probe_dir:
+            self.latency_probe = LatencyProbe(
+                latency_probe_dir, float(latency_threshold) / 1000,
+                self.rate_limiter)
+        self.progress = ProgressMonitor(self.logger, progress_file,
+                                        progress_url, progress_interval)
+        try:
+            self.backup_filter = BackupFilter(databases, tables,
+                                              tables_file)
+        except exception.ProgramError as error:
+            self.logger.error('Backup filters setup failed. %s', str(error),
+                              exc_info=self.debug)
+            raise
+        self.filters = self.backup_filter.to_dict()
+        if self.filters:
+            self.logger.info("Partial backup - %s",
+                             describe_filters(self.filters))
+            self.report.attributes['filters'] = self.filters
+        self.command_executor = CommandExecutor(
+            self.output_log,
+            self.prepare_connection_options(socket, host, port),
+            self.rate_limiter, self.progress,
+            filter_options=self.backup_filter.get_options())
+        self.chain = chain
+        self.catalog = None
+        self.backup_kind = 'base'
+        self.backup_level = 0
+        self.checksums = None
+        self.archive_size = None
+        self.archive_checksum = None
+        self.resume = resume
+        self.resume_max_age = float(resume_max_age) * 3600
+        self.state = None
+        self.force_scan = True
+        self.server_variables = {}
+        self.deduplicate = deduplicate
+        self.compression_level = compression_level
+        self.compress_threads = compress_threads
+        if no_compression:
+            self.compression = None
+            self.compressor = None
+        else:
+            self.compression = compression
+            try:
+                self.compressor = Compressor(compression, compression_level,
+                                             compress_threads)
+            except exception.ProgramError as error:
+                self.logger.error('Compression setup failed. %s', str(error),
+                                  exc_info=self.debug)
+                raise
+        self.storage_location = storage
+        self.storage = None
+        if storage:
+            try:
+                if deduplicate:
+                    raise exception.ProgramError(
+                        "Deduplicated backups are stored in the repository.")
+                self.storage = get_storage(
+                    storage, upload_threads,
+                    filesystem_utils.parse_size(upload_part_size))
+            except exception.ProgramError as error:
+                self.logger.error('Storage setup failed. %s', str(error),
+                                  exc_info=self.debug)
+                raise
         self.http = HttpManager()
 
-    def setup_logging(self, log_file):
-        self.logger = logging.getLogger(__name__)
+    def prepare_connection_options(self, socket, host, port):
+        options = []
+        if socket:
+            options.append('--socket=' + socket)
+        if host:
+            options.append('--host=' + host)
+        if port:
+            options.append('--port=' + port)
+        return options
+
+    def setup_logging(self, log_file, log_name=None):
+        # The backups of several instances running in one process each
+        # log into their own file.
+        self.logger = logging.getLogger(
+            __name__ + '.' + log_name if log_name else __name__)
         self.log_manager.attach_file_handler(self.logger, log_file)
 
-    def check_prerequisites(self, repository):
+    def check_prerequisites(self, repository, binaries=REQUIRED_BINARIES):
         try:
-            filesystem_utils.check_required_binaries(['innobackupex', 'tar'])
+            filesystem_utils.check_required_binaries(binaries)
             filesystem_utils.check_path_existence(repository)
         except exception.ProgramError as error:
             self.logger.error('Prerequisites check failed. %s', str(error),
                               exc_info=self.debug)
             raise
 
+    def start_throttling(self):
+        try:
+            set_process_priority(self.nice, self.ionice_class)
+        except Exception:
+            self.logger.error('Unable to set the process priority.',
+                              exc_info=self.debug)
+            raise
+        if self.latency_probe:
+            self.latency_probe.start()
+
+    def stop_throttling(self):
+        if self.latency_probe:
+            self.latency_probe.stop()
+            self.logger.info("Latency probe maximum fsync time: %.3fs\
+ - Final rate: %.1f MB/s",
+                             self.latency_probe.max_latency,
+                             self.rate_limiter.rate / MEGABYTE)
+
     def prepare_workdir(self, path):
         try:
             filesystem_utils.mkdir_path(path, 0o755)
@@ -48,12 +195,107 @@ class BackupTool:
             raise
         self.workdir = path + '/xtrabackup_tmp'
         self.logger.debug("Temporary workdir: " + self.workdir)
-        if self.compress:
-            self.archive_path = path + '/backup.tar.gz'
-        else:
-            self.archive_path = path + '/backup.tar'
+        self.state = BackupState(get_state_path(path))
+        self.archive_path = path + '/backup' + \
+            filesystem_utils.get_archive_extension(self.compression)
         self.logger.debug("Temporary archive: " + self.archive_path)
 
+    def reset_workdir(self):
+        filesystem_utils.delete_directory_if_exists(self.workdir)
+        if self.stream:
+            try:
+                filesystem_utils.mkdir_path(self.workdir, 0o755)
+            except exception.ProgramError:
+                self.logger.error('Workdir preparation failed.',
+                                  exc_info=self.debug)
+                raise
+
+    def get_state_identity(self, repository):
+        return {
+            'tool': self.report.tool,
+            'repository': os.path.abspath(repository),
+            'chain': self.chain,
+            'stream': self.stream,
+            'compression': self.compression,
+            'deduplicate': self.deduplicate,
+            'storage': self.storage_location,
+            'filters': self.filters,
+        }
+
+    def get_state_values(self):
+        values = dict((name, getattr(self, name, None))
+                      for name in STATE_ATTRIBUTES)
+        checkpoints_path = self.workdir + '/xtrabackup_checkpoints'
+        if os.path.isfile(checkpoints_path):
+            values['checkpoints'] = filesystem_utils.read_checkpoints(
+                checkpoints_path)
+        return values
+
+    def start_state(self, repository):
+        values = self.get_state_identity(repository)
+        values.update(self.get_state_values())
+        self.state.start(values)
+
+    def check_archive(self, archive_path):
+        if filesystem_utils.get_file_size(archive_path) != self.archive_size:
+            return False
+        result = verify_archives(archive_path, int(self.compress_threads))
+        return not result.failures and not result.unverified
+
+    def check_staged_data(self):
+        completed = self.state.completed
+        if 'copy' in completed or 'stream' in completed:
+            checkpoints = filesystem_utils.read_checkpoints(
+                self.workdir + '/xtrabackup_checkpoints')
+            if checkpoints != self.state.values.get('checkpoints'):
+                return False
+        if ('transfer' in completed or self.storage_location is not None and
+                ('archive' in completed or 'stream' in completed)):
+            return self.storage.get_size(self.get_storage_path(
+                self.final_archive_path)) == self.archive_size
+        if 'archive' in completed:
+            return self.check_archive(self.archive_path)
+        if 'stream' in completed:
+            return self.check_archive(self.final_archive_path)
+        return True
+
+    def resume_backup(self, repository):
+        if (self.resume and self.state.load() and self.state.completed and
+                self.state.matches(self.get_state_identity(repository)) and
+                self.state.get_age() < self.resume_max_age):
+            values = self.get_state_values()
+            for name in STATE_ATTRIBUTES:
+                setattr(self, name, self.state.values.get(name))
+            try:
+                staged = self.check_staged_data()
+            except Exception:
+                self.logger.debug('Staged backup check failed.',
+                                  exc_info=True)
+                staged = False
+            if staged:
+                self.logger.info("Resuming the backup after stages: %s",
+                                 ', '.join(self.state.completed))
+                return True
+            self.logger.warning(
+                'The staged backup of the previous run is incomplete, '
+                'starting over.')
+            for name in STATE_ATTRIBUTES:
+                setattr(self, name, values[name])
+        self.abort_stored_upload()
+        self.state.remove()
+        self.reset_workdir()
+        return False
+
+    def run_stage(self, name, function, *arguments):
+        if self.state.is_completed(name):
+            return
+        function(*arguments)
+        self.state.complete(name, self.get_state_values())
+
+    def finish_backup(self):
+        self.state.remove()
+        self.clean()
+
     def prepare_repository(self, repository, incremental):
         if incremental:
             sub_directory = '/INC'
@@ -66,39 +308,227 @@ class BackupTool:
             self.logger.error('Unable to create repository.',
                               exc_info=self.debug)
             raise
+        self.repository = repository
+        if self.storage is None:
+            self.storage = LocalStorage(repository)
+        try:
+            self.catalog = Catalog(repository)
+        except Exception:
+            self.logger.error('Unable to open the repository catalog.',
+                              exc_info=self.debug)
+            raise
+        if self.deduplicate:
+            self.prepare_chunk_store(repository)
+
+    def prepare_chunk_store(self, repository):
+        store_path = repository + '/' + CHUNK_DIRECTORY
+        try:
+            filesystem_utils.mkdir_path(store_path, 0o755)
+        except exception.ProgramError:
+            self.logger.error('Unable to create chunk store.',
+                              exc_info=self.debug)
+            raise
+        self.compressor = ChunkStore(store_path, self.compression,
+                                     self.compression_level,
+                                     self.compress_threads)
+        self.compressor.filters = self.filters
 
     def prepare_archive_name(self, incremental, incremental_cycle):
         if incremental:
-            backup_prefix = ''.join(['inc_', str(self.incremental_step), '_'])
+            backup_prefix = ''.join([
+                'diff_' if self.backup_kind == 'differential' else 'inc_',
+                str(self.incremental_step), '_'])
         else:
             if incremental_cycle:
                 backup_prefix = 'base_'
             else:
                 backup_prefix = ''
         self.final_archive_path = filesystem_utils.prepare_archive_path(
-            self.backup_repository, backup_prefix, self.compress)
+            self.backup_repository, backup_prefix, self.compression,
+            self.deduplicate, self.chain)
+        if self.deduplicate:
+            self.archive_path = self.final_archive_path
+        self.check_archive_name()
+
+    def check_archive_name(self):
+        try:
+            if (self.storage.exists(
+                    self.get_storage_path(self.final_archive_path)) or
+                    self.catalog.get_backup(self.final_archive_path)):
+                raise exception.ProgramError(
+                    "An archive already exists: " + self.final_archive_path)
+        except Exception:
+            self.logger.error('Archive name check failed.',
+                              exc_info=self.debug)
+            raise
+
+    def get_storage_path(self, path):
+        return os.path.relpath(path, self.repository)
+
+    def open_archive_writer(self):
+        if self.storage_location is None:
+            return None
+        path = self.get_storage_path(self.final_archive_path)
+        self.logger.debug("Archive upload: " + self.storage.get_uri(path))
+        upload = self.state.values.get('upload')
+        if self.resume and upload is not None and upload['path'] == path:
+            stored_parts = dict((int(number), tuple(part))
+                                for number, part in upload['parts'].items())
+            writer = self.storage.open_writer(path, upload['id'],
+                                              stored_parts)
+            if writer.upload_id == upload['id']:
+                self.logger.info("Resuming the archive upload, %s parts "
+                                 "stored.", len(stored_parts))
+        else:
+            writer = self.storage.open_writer(path)
+        self.record_upload(writer)
+        return writer
+
+    def record_upload(self, writer):
+        # The multipart uploads are recorded in the state, so that the next
+        # run reuses the parts already stored. A streamed upload is written
+        # during the copy, the next run copies the datadir again and cannot
+        # reuse its parts.
+        if (not self.resume or self.stream or
+                getattr(writer, 'upload_id', None) is None):
+            return
+        upload = self.state.values.get('upload')
+        if upload is None or upload['id'] != writer.upload_id:
+            self.state.values['upload'] = {
+                'path': self.get_storage_path(self.final_archive_path),
+                'id': writer.upload_id,
+                'parts': {},
+            }
+            self.state.save()
+        writer.on_part = self.record_upload_part
+
+    def record_upload_part(self, number, size, digest):
+        self.state.values['upload']['parts'][str(number)] = [size, digest]
+        self.state.save()
+
+    def abort_stored_upload(self):
+        upload = self.state.values.get('upload')
+        if (upload is None or
+                self.state.values.get('storage') != self.storage_location):
+            return
+        try:
+            self.storage.abort_upload(upload['path'], upload['id'])
+        except Exception:
+            self.logger.warning('Unable to abort the previous archive '
+                                'upload.', exc_info=self.debug)
+
+    def close_archive_writer(self, writer, checksums):
+        writer.close()
+        self.state.values.pop('upload', None)
+        self.archive_size = writer.size
+        if checksums is not None:
+            self.write_checksums(checksums, self.archive_path)
+            self.storage.upload(
+                filesystem_utils.get_checksum_path(self.archive_path),
+                self.get_storage_path(filesystem_utils.get_checksum_path(
+                    self.final_archive_path)))
+
+    def abort_archive_writer(self, writer):
+        if writer is None:
+            return
+        if 'upload' in self.state.values:
+            writer.stop()
+            self.logger.info('The archive upload is kept for the next run.')
+            return
+        try:
+            writer.abort()
+        except Exception:
+            self.logger.warning('Unable to abort the archive upload.',
+                                exc_info=self.debug)
+
+    def close_storage(self):
+        if self.storage is not None:
+            self.storage.close()
+
+    def prepare_checksums(self):
+        if self.deduplicate:
+            return None
+        self.checksums = ArchiveChecksums(self.compressor)
+        self.checksums.filters = self.filters
+        return self.checksums
+
+    def write_checksums(self, checksums, archive_path):
+        if checksums is None:
+            return
+        checksums.write(filesystem_utils.get_checksum_path(archive_path))
+        self.archive_checksum = checksums.digest()
+        self.logger.debug("Archive checksums: %s files - %s blocks",
+                          len(checksums.files), len(checksums.blocks))
 
     def exec_incremental_backup(self, user, password, thread_count):
         self.stop_watch.start_timer()
+        stage = self.report.start_stage('copy')
+        self.progress.start('copy')
         try:
             self.command_executor.exec_incremental_backup(
                 user,
                 password,
                 thread_count,
                 self.last_lsn,
-                self.workdir)
+                self.workdir,
+                self.force_scan)
         except ProcessError:
+            self.progress.stop('failed')
             self.logger.error(
                 'An error occured during the incremental backup process.',
                 exc_info=self.debug)
             self.clean()
             raise
+        self.progress.stop()
+        self.report_page_scan(stage, list(
+            page_tracking.find_delta_sizes(self.workdir)))
+        stage.stop()
         self.logger.info("Incremental backup time: %s - Duration: %s",
                          self.stop_watch.stop_timer(),
                          self.stop_watch.duration_in_seconds())
 
+    def prepare_page_tracking(self, user, password, force_scan):
+        if force_scan:
+            self.force_scan = True
+            return
+        self.server_variables = self.command_executor.get_server_variables(
+            user, password, page_tracking.TRACKING_VARIABLES)
+        self.force_scan = not page_tracking.is_tracking_enabled(
+            self.server_variables)
+        if self.force_scan:
+            self.logger.info(
+                'Changed page tracking is not enabled on the server, '
+                'the incremental backup scans every page.')
+        else:
+            self.logger.info('Changed page tracking is enabled on the '
+                             'server, the incremental backup uses it.')
+
+    def report_page_scan(self, stage, delta_sizes):
+        mode = self.progress.scan_mode or (
+            'full' if self.force_scan else 'bitmap')
+        if not self.force_scan and mode == 'full':
+            self.logger.warning(
+                'The changed page bitmaps do not cover the backup LSN '
+                'range, the incremental backup scanned every page.')
+        page_size = page_tracking.get_page_size(self.server_variables)
+        total_pages = None
+        # The datadir of a server reached with --host is not the local one.
+        if page_tracking.is_local_host(self.host):
+            total_pages = page_tracking.get_tablespace_pages(
+                self.server_variables.get('datadir') or
+                self.progress.base_directory, page_size)
+        scan = page_tracking.PageScan(mode, delta_sizes, page_size,
+                                      total_pages)
+        stage.attributes.update(scan.to_dict())
+        self.logger.info("Incremental scan: %s - Pages changed: %s\
+ - Pages scanned: %s - Pages skipped: %s", scan.mode,
+                         scan.changed_pages, scan.scanned_pages,
+                         scan.skipped_pages)
+
     def exec_full_backup(self, user, password, thread_count):
         self.stop_watch.start_timer()
+        stage = self.report.start_stage('copy')
+        self.progress.start('copy')
         try:
             self.command_executor.exec_filesystem_backup(
                 user,
@@ -106,64 +536,159 @@ class BackupTool:
                 thread_count,
                 self.workdir)
         except ProcessError:
+            self.progress.stop('failed')
             self.logger.error(
                 'An error occured during the backup process.',
                 exc_info=self.debug)
             self.clean()
             raise
+        self.progress.stop()
+        stage.stop()
         self.logger.info("Backup time: %s - Duration: %s",
                          self.stop_watch.stop_timer(),
                          self.stop_watch.duration_in_seconds())
 
+    def exec_streaming_backup(self, user, password, thread_count):
+        self.stop_watch.start_timer()
+        stage = self.report.start_stage('stream')
+        self.progress.start('stream')
+        checksums = self.prepare_checksums()
+        writer = None
+        if int(thread_count) > 1:
+            self.logger.warning('The files of a streaming backup are copied '
+                                'by a single thread, --backup-threads is '
+                                'ignored.')
+        try:
+            self.logger.debug("Archive path: " + self.final_archive_path)
+            writer = self.open_archive_writer()
+            self.command_executor.exec_streaming_backup(
+                user,
+                password,
+                self.workdir,
+                self.final_archive_path,
+                self.compressor,
+                checksums,
+                writer)
+            if writer is None:
+                self.write_checksums(checksums, self.final_archive_path)
+                self.archive_size = filesystem_utils.get_file_size(
+                    self.final_archive_path)
+            else:
+                self.close_archive_writer(writer, checksums)
+        except Exception:
+            self.progress.stop('failed')
+            self.logger.error(
+                'An error occured during the streaming backup process.',
+                exc_info=self.debug)
+            self.abort_archive_writer(writer)
+            filesystem_utils.delete_file_if_exists(self.final_archive_path)
+            filesystem_utils.delete_file_if_exists(
+                filesystem_utils.get_checksum_path(self.final_archive_path))
+            self.clean()
+            raise
+        self.progress.stop()
+        stage.stop(archive_bytes=self.archive_size)
+        self.logger.info("Streaming backup time: %s - Duration: %s",
+                         self.stop_watch.stop_timer(),
+                         self.stop_watch.duration_in_seconds())
+
     def prepare_backup(self, redo_logs):
         self.stop_watch.start_timer()
+        stage = self.report.start_stage('prepare')
+        self.progress.start('prepare')
         try:
             self.command_executor.exec_backup_preparation(self.workdir,
                                                           redo_logs)
         except ProcessError:
+            self.progress.stop('failed')
             self.logger.error(
                 'An error occured during the preparation process.',
                 exc_info=self.debug)
             self.clean()
             raise
+        self.progress.stop()
+        stage.stop()
         self.logger.info("Backup preparation time: %s - Duration: %s",
                          self.stop_watch.stop_timer(),
                          self.stop_watch.duration_in_seconds())
 
     def archive_backup(self):
         self.stop_watch.start_timer()
+        stage = self.report.start_stage('archive')
+        self.progress.start('archive', self.workdir)
+        checksums = self.prepare_checksums()
+        writer = None
         try:
+            writer = self.open_archive_writer()
             self.command_executor.create_archive(
-                self.workdir, self.archive_path, self.compress)
-        except ProcessError:
+                self.workdir, self.archive_path, self.compressor, checksums,
+                writer)
+            if writer is None:
+                self.write_checksums(checksums, self.archive_path)
+                self.archive_size = filesystem_utils.get_file_size(
+                    self.archive_path)
+            else:
+                self.close_archive_writer(writer, checksums)
+        except Exception:
+            self.progress.stop('failed')
             self.logger.error(
                 'An error occured during the archiving of the backup.',
                 exc_info=self.debug)
+            self.abort_archive_writer(writer)
             self.clean()
             raise
+        self.progress.stop()
+        stage.stop(archive_bytes=self.archive_size)
         self.logger.info("Backup archiving time: %s - Duration: %s",
                          self.stop_watch.stop_timer(),
                          self.stop_watch.duration_in_seconds())
+        if self.deduplicate:
+            self.logger.info("Deduplicated chunks written: %s bytes",
+                             self.compressor.written_bytes)
 
     def transfer_backup(self, repository):
+        if (self.archive_path == self.final_archive_path or
+                self.storage_location is not None):
+            return
         self.stop_watch.start_timer()
+        stage = self.report.start_stage('transfer')
         try:
             self.logger.debug("Archive path: " + self.final_archive_path)
-            filesystem_utils.move_file(self.archive_path,
-                                       self.final_archive_path)
+            self.storage.upload(
+                self.archive_path,
+                self.get_storage_path(self.final_archive_path),
+                self.rate_limiter)
+            self.storage.upload(
+                filesystem_utils.get_checksum_path(self.archive_path),
+                self.get_storage_path(filesystem_utils.get_checksum_path(
+                    self.final_archive_path)))
         except Exception:
             self.logger.error(
                 'An error occured during the backup transfer.',
                 exc_info=self.debug)
             self.clean()
             raise
+        stage.stop()
         self.logger.info("Archive copy time: %s - Duration: %s",
                          self.stop_watch.stop_timer(),
                          self.stop_watch.duration_in_seconds())
 
     def clean(self):
+        if self.state is not None and self.state.completed:
+            self.logger.info("Staged backup kept for the next run: " +
+                             self.workdir)
+            return
         filesystem_utils.delete_directory_if_exists(self.workdir)
 
+    def write_report(self, status):
+        if getattr(self, 'final_archive_path', None):
+            self.report.attributes['archive_path'] = self.final_archive_path
+        try:
+            self.report.write(status)
+        except Exception:
+            self.logger.error('Unable to write the run report.',
+                              exc_info=self.debug)
+
     def trigger_webhook(self, webhook_url):
         postdata = {
             'archive_repository': self.backup_repository,
@@ -173,39 +698,59 @@ class BackupTool:
         self.logger.debug("POST archive_path: " + self.final_archive_path)
         self.http.post(webhook_url, postdata)
 
-    def save_incremental_data(self, incremental):
+    def read_checkpoints(self):
         try:
-            if incremental:
-                self.incremental_step += 1
-            else:
-                self.incremental_step = 0
-            self.last_lsn = filesystem_utils.retrieve_value_from_file(
-                self.workdir + '/xtrabackup_checkpoints',
-                '^to_lsn = (\d+)$')
-            filesystem_utils.write_array_to_file(
-                '/var/tmp/pyxtrabackup-incremental',
-                ['BASEDIR=' + self.backup_repository,
-                 'LSN=' + self.last_lsn,
-                 'INCREMENTAL_STEP=' + str(self.incremental_step)])
+            checkpoints = filesystem_utils.read_checkpoints(
+                self.workdir + '/xtrabackup_checkpoints')
+            self.from_lsn = int(checkpoints['from_lsn'])
+            self.to_lsn = int(checkpoints['to_lsn'])
         except:
             self.logger.error(
-                'Unable to save the incremental backup data.',
+                'Unable to read the backup checkpoints.',
                 exc_info=self.debug)
             self.clean()
             raise
 
+    def prepare_backup_level(self, incremental, level, policy):
+        try:
+            if policy:
+                level = self.catalog.get_policy_level(self.chain,
+                                                      parse_policy(policy))
+            elif level is not None:
+                level = int(level)
+            elif not incremental:
+                level = 0
+            if self.stream and level != 0:
+                # innobackupex refuses to write an incremental backup into
+                # a tar stream.
+                raise exception.ProgramError(
+                    "Only base backups can be streamed, --stream is not "
+                    "supported by incremental and differential backups.")
+        except:
+            self.logger.error('Unable to select the backup level.',
+                              exc_info=self.debug)
+            self.clean()
+            raise
+        if level == 0:
+            self.backup_kind, self.backup_level = 'base', 0
+            return False
+        self.backup_kind = 'incremental' if level is None else 'differential'
+        self.backup_level = level
+        return True
+
     def load_incremental_data(self):
         try:
-            self.base_dir = filesystem_utils.retrieve_value_from_file(
-                '/var/tmp/pyxtrabackup-incremental',
-                '^BASEDIR=(.*)$')
-            self.last_lsn = filesystem_utils.retrieve_value_from_file(
-                '/var/tmp/pyxtrabackup-incremental',
-                '^LSN=(\d+)$')
-            self.incremental_step = int(
-                filesystem_utils.retrieve_value_from_file(
-                    '/var/tmp/pyxtrabackup-incremental',
-                    '^INCREMENTAL_STEP=(\d+)$'))
+            last_backup = self.catalog.get_last_backup(self.chain,
+                                                       self.backup_level)
+            self.base_id = last_backup.base_id
+            self.last_lsn = str(last_backup.to_lsn)
+            self.incremental_step = last_backup.step
+            if self.backup_level is None:
+                self.backup_level = last_backup.level + 1
+            if last_backup.get_filters() != self.filters:
+                raise exception.ProgramError(
+                    "The backup filters differ from the filters of the "
+                    "backup it starts from, take a new base backup.")
         except:
             self.logger.error(
                 'Unable to load the incremental backup data.',
@@ -213,33 +758,104 @@ class BackupTool:
             self.clean()
             raise
 
+    def catalog_backup(self, kind):
+        if kind in ['incremental', 'differential']:
+            step, base_id = self.incremental_step + 1, self.base_id
+        else:
+            step, base_id = 0, None
+        try:
+            self.catalog.add_backup(
+                self.chain, kind, self.backup_level, step, base_id,
+                self.from_lsn, self.to_lsn,
+                self.final_archive_path,
+                self.archive_size,
+                time.time() - self.report.start_time,
+                self.archive_checksum,
+                self.storage_location,
+                self.filters)
+        except Exception:
+            self.logger.error('Unable to record the backup in the catalog.',
+                              exc_info=self.debug)
+            raise
+
     def start_full_backup(self, repository, workdir, user,
                           password, threads, webhook):
         self.check_prerequisites(repository)
-        self.prepare_workdir(workdir)
-        self.prepare_repository(repository, False)
-        self.prepare_archive_name(False, False)
-        self.exec_full_backup(user, password, threads)
-        self.prepare_backup(False)
-        self.archive_backup()
-        self.transfer_backup(repository)
-        self.clean()
-        if webhook:
-            self.trigger_webhook(webhook)
+        self.start_throttling()
+        try:
+            self.prepare_workdir(workdir)
+            self.prepare_repository(repository, False)
+            if not self.resume_backup(repository):
+                self.prepare_archive_name(False, False)
+                self.start_state(repository)
+            if self.stream:
+                self.run_stage('stream', self.exec_streaming_backup, user,
+                               password, threads)
+                self.read_checkpoints()
+            else:
+                self.run_stage('copy', self.exec_full_backup, user,
+                               password, threads)
+                self.run_stage('prepare', self.prepare_backup, False)
+                self.read_checkpoints()
+                self.run_stage('archive', self.archive_backup)
+                self.run_stage('transfer', self.transfer_backup, repository)
+            self.run_stage('catalog', self.catalog_backup, 'full')
+            if webhook:
+                self.run_stage('webhook', self.trigger_webhook, webhook)
+            self.finish_backup()
+        except Exception:
+            self.write_report('failed')
+            raise
+        finally:
+            self.stop_throttling()
+            self.close_storage()
+        self.write_report('success')
 
     def start_incremental_backup(self, repository, incremental,
-                                 workdir, user, password, threads):
-        self.check_prerequisites(repository)
-        self.prepare_workdir(workdir)
-        self.prepare_repository(repository, True)
-        if incremental:
-            self.load_incremental_data()
-            self.prepare_archive_name(incremental, True)
-            self.exec_incremental_backup(user, password, threads)
-        else:
-            self.prepare_archive_name(incremental, True)
-            self.exec_full_backup(user, password, threads)
-        self.save_incremental_data(incremental)
-        self.archive_backup()
-        self.transfer_backup(repository)
-        self.clean()
+                                 workdir, user, password, threads,
+                                 level=None, policy=None,
+                                 force_scan=False):
+        self.report.tool = 'pyxtrabackup-inc'
+        # The mysql client reads the changed page tracking variables.
+        self.check_prerequisites(repository, REQUIRED_BINARIES + (
+            [] if force_scan else ['mysql']))
+        self.start_throttling()
+        try:
+            self.prepare_workdir(workdir)
+            self.prepare_repository(repository, True)
+            if self.resume_backup(repository):
+                incremental = self.backup_kind != 'base'
+            else:
+                incremental = self.prepare_backup_level(incremental, level,
+                                                        policy)
+                if incremental:
+                    self.load_incremental_data()
+                self.prepare_archive_name(incremental, True)
+                self.start_state(repository)
+            if incremental:
+                self.prepare_page_tracking(user, password, force_scan)
+            self.logger.info("Backup kind: %s - Level: %s", self.backup_kind,
+                             self.backup_level)
+            if self.stream:
+                self.run_stage('stream', self.exec_streaming_backup, user,
+                               password, threads)
+                self.read_checkpoints()
+            else:
+                if incremental:
+                    self.run_stage('copy', self.exec_incremental_backup,
+                                   user, password, threads)
+                else:
+                    self.run_stage('copy', self.exec_full_backup, user,
+                                   password, threads)
+                self.read_checkpoints()
+                self.run_stage('archive', self.archive_backup)
+                self.run_stage('transfer', self.transfer_backup, repository)
+            self.run_stage('catalog', self.catalog_backup, self.backup_kind)
+            self.finish_backup()
+        except Exception:
+            self.write_report('failed')
+            raise
+        finally:
+            self.stop_throttling()
+            self.close_storage()
+        self.write_report('success')
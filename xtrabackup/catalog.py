@@ -0,0 +1,205 @@
+import datetime
+import os
+import sqlite3
+import time
+from xtrabackup.exception import ProgramError
+from xtrabackup.storage import get_storage
+from xtrabackup.table_filter import dump_filters, load_filters
+
+
+CATALOG_FILE = 'catalog.sqlite'
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS backups (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chain TEXT NOT NULL,
+        base_id INTEGER,
+        step INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        level INTEGER NOT NULL DEFAULT 0,
+        from_lsn INTEGER,
+        to_lsn INTEGER NOT NULL,
+        archive_path TEXT NOT NULL,
+        size INTEGER,
+        duration REAL,
+        checksum TEXT,
+        storage TEXT,
+        filters TEXT,
+        created_at REAL NOT NULL)""",
+    """CREATE INDEX IF NOT EXISTS backups_chain
+        ON backups (chain, created_at)""",
+    """CREATE INDEX IF NOT EXISTS backups_base
+        ON backups (base_id, step)""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS backups_archive
+        ON backups (archive_path)""",
+    """CREATE TABLE IF NOT EXISTS restores (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        duration REAL NOT NULL,
+        created_at REAL NOT NULL)""",
+]
+SPEED_SAMPLES = 20
+COLUMNS = ['id', 'chain', 'base_id', 'step', 'kind', 'level', 'from_lsn',
+           'to_lsn', 'archive_path', 'size', 'duration', 'checksum',
+           'storage', 'filters', 'created_at']
+SELECT_BACKUPS = 'SELECT %s FROM backups' % ', '.join(COLUMNS)
+RESTORE_TIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d']
+INTERVAL_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+    'w': 604800,
+}
+POLICY_TOLERANCE = 0.95
+
+
+def parse_restore_time(value):
+    if not value:
+        return None
+    for time_format in RESTORE_TIME_FORMATS:
+        try:
+            restore_time = datetime.datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+        return time.mktime(restore_time.timetuple())
+    raise ProgramError("Invalid restore time: " + value)
+
+
+def parse_policy(value):
+    intervals = []
+    for interval in value.split(','):
+        interval = interval.strip().lower()
+        try:
+            if interval and interval[-1] in INTERVAL_UNITS:
+                intervals.append(float(interval[:-1]) *
+                                 INTERVAL_UNITS[interval[-1]])
+            else:
+                intervals.append(float(interval))
+        except ValueError:
+            raise ProgramError("Invalid backup policy: " + value)
+    return intervals
+
+
+def find_catalog(archive_path):
+    directory = os.path.dirname(os.path.abspath(archive_path))
+    while True:
+        if os.path.isfile(os.path.join(directory, CATALOG_FILE)):
+            return Catalog(directory)
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+class Backup:
+
+    def __init__(self, catalog, row):
+        self.catalog = catalog
+        for column, value in zip(COLUMNS, row):
+            setattr(self, column, value)
+
+    def get_archive_path(self):
+        if self.storage:
+            return get_storage(self.storage).get_uri(self.archive_path)
+        return os.path.join(self.catalog.repository, self.archive_path)
+
+    def get_filters(self):
+        return load_filters(self.filters)
+
+
+class Catalog:
+
+    def __init__(self, repository):
+        self.repository = os.path.abspath(repository)
+        self.path = os.path.join(self.repository, CATALOG_FILE)
+        self.connection = sqlite3.connect(self.path, timeout=60)
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def close(self):
+        self.connection.close()
+
+    def query(self, statement, parameters=()):
+        return [Backup(self, row) for row in
+                self.connection.execute(statement, parameters)]
+
+    def find_last_backup(self, chain, below_level=None):
+        backups = self.query(
+            SELECT_BACKUPS + """ WHERE chain = ? AND kind != 'full'
+            AND level < ? ORDER BY created_at DESC, id DESC LIMIT 1""",
+            (chain, below_level if below_level is not None else 2 ** 31))
+        return backups[0] if backups else None
+
+    def get_last_backup(self, chain, below_level=None):
+        backup = self.find_last_backup(chain, below_level)
+        if backup is None:
+            raise ProgramError("No base backup in the catalog for chain: "
+                               + chain)
+        return backup
+
+    def get_policy_level(self, chain, intervals):
+        now = time.time()
+        for level, interval in enumerate(intervals):
+            backup = self.find_last_backup(chain, level + 1)
+            if (backup is None or
+                    now - backup.created_at >= interval * POLICY_TOLERANCE):
+                return level
+        return len(intervals)
+
+    def add_backup(self, chain, kind, level, step, base_id, from_lsn, to_lsn,
+                   archive_path, size, duration, checksum, storage=None,
+                   filters=None):
+        with self.connection:
+            cursor = self.connection.execute(
+                """INSERT INTO backups (chain, base_id, step, kind, level,
+                from_lsn, to_lsn, archive_path, size, duration, checksum,
+                storage, filters, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (chain, base_id, step, kind, level, from_lsn, to_lsn,
+                 os.path.relpath(archive_path, self.repository), size,
+                 duration, checksum, storage, dump_filters(filters),
+                 time.time()))
+            if base_id is None:
+                self.connection.execute(
+                    'UPDATE backups SET base_id = id WHERE id = ?',
+                    (cursor.lastrowid,))
+        return cursor.lastrowid
+
+    def get_chain_backups(self, chain):
+        return self.query(SELECT_BACKUPS + """ WHERE chain = ?
+            ORDER BY created_at, id""", (chain,))
+
+    def get_backups(self, chain=None):
+        if chain is None:
+            return self.query(SELECT_BACKUPS + ' ORDER BY created_at, id')
+        return self.get_chain_backups(chain)
+
+    def delete_backup(self, backup_id):
+        with self.connection:
+            self.connection.execute('DELETE FROM backups WHERE id = ?',
+                                    (backup_id,))
+
+    def get_backup(self, archive_path):
+        archive_path = os.path.relpath(os.path.abspath(archive_path),
+                                       self.repository)
+        backups = self.query(SELECT_BACKUPS + ' WHERE archive_path = ?',
+                             (archive_path,))
+        return backups[0] if backups else None
+
+    def add_restore(self, kind, size, duration):
+        with self.connection:
+            self.connection.execute(
+                """INSERT INTO restores (kind, size, duration, created_at)
+                VALUES (?, ?, ?, ?)""", (kind, size, duration, time.time()))
+
+    def get_restore_speed(self, kind):
+        size, duration = self.connection.execute(
+            """SELECT SUM(size), SUM(duration) FROM (
+                SELECT size, duration FROM restores WHERE kind = ?
+                ORDER BY id DESC LIMIT ?)""",
+            (kind, SPEED_SAMPLES)).fetchone()
+        if not size or not duration:
+            return None
+        return size / duration
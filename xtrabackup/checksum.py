@@ -0,0 +1,472 @@
+import hashlib
+import json
+import os
+from xtrabackup.catalog import CATALOG_FILE, Catalog
+from xtrabackup.compression import (BLOCK_SIZE, copy_stream,
+                                    decompress_block, get_codec, map_blocks,
+                                    read_exactly)
+from xtrabackup.exception import ProgramError
+from xtrabackup.storage import (RangedReader, get_archive_size, is_remote,
+                                open_location)
+import xtrabackup.chunk_store as chunk_store
+import xtrabackup.filesystem_utils as filesystem_utils
+import xtrabackup.tar_stream as tar_stream
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+CHECKSUM_VERSION = 1
+
+if xxhash is not None:
+    DEFAULT_ALGORITHM = 'xxh64'
+elif hasattr(hashlib, 'blake2b'):
+    DEFAULT_ALGORITHM = 'blake2b'
+else:
+    DEFAULT_ALGORITHM = 'sha256'
+
+
+def new_hash(algorithm):
+    if algorithm == 'xxh64':
+        if xxhash is None:
+            raise ProgramError("Missing Python module for checksum "
+                               "algorithm: " + algorithm)
+        return xxhash.xxh64()
+    try:
+        return hashlib.new(algorithm)
+    except ValueError:
+        raise ProgramError("Unsupported checksum algorithm: " + algorithm)
+
+
+def hash_data(algorithm, data):
+    digest = new_hash(algorithm)
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class TarIndexer:
+
+    def __init__(self, checksums):
+        self.checksums = checksums
+        self.offset = 0
+        self.header = b''
+        self.member = None
+        self.digest = None
+        self.name_data = None
+        self.next_name = None
+        self.remaining = 0
+        self.padding = 0
+
+    def start_member(self, header, offset):
+        member = tar_stream.TarMember(header, None, offset, self.next_name)
+        self.remaining = member.size
+        self.padding = member.padded_size - member.size
+        if (member.type in tar_stream.LONG_NAME_TYPES or
+                member.type in tar_stream.PAX_HEADER_TYPES):
+            self.name_data = []
+        else:
+            self.next_name = None
+            if member.is_file():
+                self.digest = new_hash(self.checksums.algorithm)
+        self.member = member
+        if not self.remaining:
+            self.end_member()
+
+    def end_member(self):
+        member = self.member
+        if self.name_data is not None:
+            data = b''.join(self.name_data)
+            if member.type in tar_stream.LONG_NAME_TYPES:
+                self.next_name = tar_stream.parse_string(data)
+            else:
+                self.next_name = tar_stream.parse_pax_path(data)
+        elif self.digest is not None:
+            self.checksums.files.append([
+                member.name, member.offset + tar_stream.RECORD_SIZE,
+                member.size, self.digest.hexdigest()])
+        self.member = None
+        self.digest = None
+        self.name_data = None
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            if self.remaining:
+                part = view[:self.remaining]
+                if self.digest is not None:
+                    self.digest.update(part)
+                elif self.name_data is not None:
+                    self.name_data.append(part.tobytes())
+                self.remaining -= len(part)
+                if not self.remaining:
+                    self.end_member()
+            elif self.padding:
+                part = view[:self.padding]
+                self.padding -= len(part)
+            else:
+                part = view[:tar_stream.RECORD_SIZE - len(self.header)]
+                self.header += part.tobytes()
+                if len(self.header) == tar_stream.RECORD_SIZE:
+                    header, self.header = self.header, b''
+                    self.start_member(header, self.offset + len(part) -
+                                      tar_stream.RECORD_SIZE)
+            self.offset += len(part)
+            view = view[len(part):]
+
+
+class IndexedStream:
+
+    def __init__(self, stream, indexer):
+        self.stream = stream
+        self.indexer = indexer
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.indexer.update(data)
+        return data
+
+
+class BlockRecorder:
+
+    def __init__(self, checksums, output_stream, block_size=None):
+        self.checksums = checksums
+        self.output_stream = output_stream
+        self.block_size = block_size
+        self.digest = None
+        self.size = 0
+
+    def write(self, data):
+        self.output_stream.write(data)
+        if self.block_size is None:
+            self.checksums.add_block(len(data),
+                                     hash_data(self.checksums.algorithm,
+                                               data))
+            return
+        view = memoryview(data)
+        while view:
+            if self.digest is None:
+                self.digest = new_hash(self.checksums.algorithm)
+            part = view[:self.block_size - self.size]
+            self.digest.update(part)
+            self.size += len(part)
+            view = view[len(part):]
+            if self.size == self.block_size:
+                self.close_block()
+
+    def close_block(self):
+        if self.size:
+            self.checksums.add_block(self.size, self.digest.hexdigest())
+        self.digest = None
+        self.size = 0
+
+    def flush(self):
+        self.output_stream.flush()
+
+
+class ArchiveChecksums:
+    """Per-file and per-block checksums of an archive.
+
+    Files are hashed while the tar stream goes through, blocks are hashed
+    as they are written, so the archive is never read back. A block is a
+    compression block, or a fixed size slice of an uncompressed archive:
+    the offsets of the files in the tar stream give the blocks to read to
+    verify a single file.
+    """
+
+    def __init__(self, compressor=None, algorithm=None):
+        self.compressor = compressor
+        self.algorithm = algorithm or DEFAULT_ALGORITHM
+        new_hash(self.algorithm)
+        if compressor:
+            self.compression = compressor.codec.name
+            self.block_size = compressor.block_size
+        else:
+            self.compression = None
+            self.block_size = BLOCK_SIZE
+        self.files = []
+        self.blocks = []
+        self.size = 0
+        self.filters = None
+
+    def add_block(self, size, digest):
+        self.blocks.append([self.size, size, digest])
+        self.size += size
+
+    def index_stream(self, input_stream, output_stream):
+        recorder = BlockRecorder(self, output_stream, self.block_size)
+        copy_stream(IndexedStream(input_stream, TarIndexer(self)), recorder)
+        recorder.close_block()
+
+    def compress_stream(self, input_stream, output_stream):
+        self.compressor.compress_stream(
+            IndexedStream(input_stream, TarIndexer(self)),
+            BlockRecorder(self, output_stream))
+
+    def digest(self):
+        return hash_data(self.algorithm, ''.join(
+            digest for offset, size, digest in self.blocks).encode('ascii'))
+
+    def to_dict(self):
+        checksums = {
+            'version': CHECKSUM_VERSION,
+            'algorithm': self.algorithm,
+            'compression': self.compression,
+            'block_size': self.block_size,
+            'size': self.size,
+            'blocks': self.blocks,
+            'files': self.files,
+        }
+        if self.filters:
+            checksums['filters'] = self.filters
+        return checksums
+
+    def write(self, path):
+        temporary_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(temporary_path, 'w') as checksum_file:
+            json.dump(self.to_dict(), checksum_file)
+        os.rename(temporary_path, path)
+
+
+def read_checksums(archive_path):
+    if is_remote(archive_path):
+        with open_location(archive_path) as (storage, name):
+            name = filesystem_utils.get_checksum_path(name)
+            checksums = json.loads(storage.read_range(
+                name, 0, storage.get_size(name)).decode('utf-8'))
+    else:
+        with open(filesystem_utils.get_checksum_path(archive_path)) as \
+                checksum_file:
+            checksums = json.load(checksum_file)
+    if checksums.get('version') != CHECKSUM_VERSION:
+        raise ProgramError("Unsupported checksum file version: %s"
+                           % checksums.get('version'))
+    return checksums
+
+
+def read_block(archive_path, offset, size):
+    if is_remote(archive_path):
+        with open_location(archive_path) as (storage, name):
+            return storage.read_range(name, offset, size)
+    with open(archive_path, 'rb') as archive:
+        archive.seek(offset)
+        return read_exactly(archive, size)
+
+
+def verify_block(archive_path, offset, size, algorithm, expected):
+    data = read_block(archive_path, offset, size)
+    return (archive_path, offset, size,
+            len(data) == size and hash_data(algorithm, data) == expected)
+
+
+def verify_chunk(archive_path, store_path, digest, compression):
+    try:
+        size = len(chunk_store.load_chunk(store_path, digest, compression))
+    except (IOError, OSError, ProgramError):
+        return archive_path, digest, 0, False
+    return archive_path, digest, size, True
+
+
+def verify_remote_blocks(archive_path, checksums, threads):
+    """Checks the blocks of a stored archive, read in a single pass by
+    the ranged reader of its storage."""
+    with open_location(archive_path) as (storage, name):
+        with RangedReader(storage, name, threads) as reader:
+            position = 0
+            for offset, size, digest in sorted(checksums['blocks']):
+                read_exactly(reader, offset - position)
+                data = read_exactly(reader, size)
+                position = offset + len(data)
+                yield (archive_path, offset, size, len(data) == size and
+                       hash_data(checksums['algorithm'], data) == digest)
+
+
+def find_stored_archives(repository):
+    if not os.path.isfile(os.path.join(repository, CATALOG_FILE)):
+        return
+    catalog = Catalog(repository)
+    try:
+        backups = catalog.get_backups()
+    finally:
+        catalog.close()
+    for backup in backups:
+        if backup.storage:
+            yield backup.get_archive_path()
+
+
+def find_archives(path):
+    if is_remote(path) or not os.path.isdir(path):
+        yield path
+        return
+    for root, directories, files in os.walk(path):
+        if chunk_store.CHUNK_DIRECTORY in directories:
+            directories.remove(chunk_store.CHUNK_DIRECTORY)
+        for file_name in sorted(files):
+            if filesystem_utils.is_archive(file_name):
+                yield os.path.join(root, file_name)
+    # The archives uploaded with --storage are only known by the catalog.
+    for archive_path in find_stored_archives(path):
+        yield archive_path
+
+
+class VerificationResult:
+
+    def __init__(self):
+        self.archives = 0
+        self.blocks = 0
+        self.bytes = 0
+        self.failures = []
+        self.unverified = []
+
+    def add(self, archive_path, location, size, valid):
+        self.blocks += 1
+        self.bytes += size
+        if not valid:
+            self.failures.append((archive_path, location))
+
+
+def verify_archives(path, threads=1):
+    result = VerificationResult()
+    block_tasks = []
+    chunk_tasks = []
+    remote_archives = []
+    chunks = set()
+    for archive_path in find_archives(path):
+        result.archives += 1
+        if filesystem_utils.is_manifest(archive_path):
+            if is_remote(archive_path):
+                raise ProgramError("Deduplicated archives are stored in the "
+                                   "repository: " + archive_path)
+            store_path = chunk_store.find_store_path(archive_path)
+            manifest = chunk_store.read_manifest(archive_path)
+            for digest, size in manifest['chunks']:
+                if digest not in chunks:
+                    chunks.add(digest)
+                    chunk_tasks.append((archive_path, store_path, digest,
+                                        manifest['compression']))
+            continue
+        try:
+            checksums = read_checksums(archive_path)
+        except (IOError, OSError):
+            result.unverified.append(archive_path)
+            continue
+        if is_remote(archive_path):
+            remote_archives.append((archive_path, checksums))
+            continue
+        if filesystem_utils.get_file_size(archive_path) != checksums['size']:
+            result.failures.append((archive_path, 'size'))
+        for offset, size, digest in checksums['blocks']:
+            block_tasks.append((archive_path, offset, size,
+                                checksums['algorithm'], digest))
+    for archive_path, offset, size, valid in map_blocks(
+            block_tasks, verify_block, threads):
+        result.add(archive_path, offset, size, valid)
+    for archive_path, digest, size, valid in map_blocks(
+            chunk_tasks, verify_chunk, threads):
+        result.add(archive_path, digest, size, valid)
+    for archive_path, checksums in remote_archives:
+        if get_archive_size(archive_path) != checksums['size']:
+            result.failures.append((archive_path, 'size'))
+        for archive_path, offset, size, valid in verify_remote_blocks(
+                archive_path, checksums, threads):
+            result.add(archive_path, offset, size, valid)
+    return result
+
+
+def verify_file(archive_path, name):
+    checksums = read_checksums(archive_path)
+    name = name[2:] if name.startswith('./') else name
+    entry = next((entry for entry in checksums['files']
+                  if entry[0] in (name, './' + name)), None)
+    if entry is None:
+        raise ProgramError("File not found in archive checksums: " + name)
+    member_name, data_offset, size, expected = entry
+    block_size = checksums['block_size']
+    first_block = data_offset // block_size
+    last_block = max(first_block, (data_offset + size - 1) // block_size)
+    codec = None
+    if checksums['compression']:
+        codec = get_codec(checksums['compression'])
+    data = []
+    for offset, block_length, digest in \
+            checksums['blocks'][first_block:last_block + 1]:
+        block = read_block(archive_path, offset, block_length)
+        if hash_data(checksums['algorithm'], block) != digest:
+            return False
+        data.append(codec.decompress_block(block) if codec else block)
+    start = data_offset - first_block * block_size
+    content = b''.join(data)[start:start + size]
+    return hash_data(checksums['algorithm'], content) == expected
+
+
+def get_block_range(checksums, data_offset, size):
+    block_size = checksums['block_size']
+    first_block = data_offset // block_size
+    return first_block, max(first_block,
+                            (data_offset + size - 1) // block_size)
+
+
+def read_index_block(archive_path, offset, size, compression, algorithm,
+                     expected):
+    block = read_block(archive_path, offset, size)
+    if len(block) != size or hash_data(algorithm, block) != expected:
+        raise ProgramError("Corrupted block at offset %d of archive: %s"
+                           % (offset, archive_path))
+    return decompress_block(compression, block) if compression else block
+
+
+def get_member_path(destination, name):
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts or '..' in parts:
+        raise ProgramError("Invalid archive member name: " + name)
+    return os.path.join(destination, *parts)
+
+
+def extract_members(archive_path, destination, member_filter, threads=1):
+    """Extracts the files of an archive selected by member_filter.
+
+    The member index of the checksums gives the blocks holding each file,
+    only these blocks are read, checked and decompressed.
+    """
+    try:
+        checksums = read_checksums(archive_path)
+    except (IOError, OSError):
+        raise ProgramError("Archive without member index: " + archive_path)
+    entries = sorted((entry for entry in checksums['files']
+                      if member_filter(entry[0])),
+                     key=lambda entry: entry[1])
+    indexes = set()
+    for name, data_offset, size, digest in entries:
+        if size:
+            first_block, last_block = get_block_range(checksums,
+                                                      data_offset, size)
+            indexes.update(range(first_block, last_block + 1))
+    indexes = sorted(indexes)
+    tasks = [[archive_path] + checksums['blocks'][index][:2] +
+             [checksums['compression'], checksums['algorithm'],
+              checksums['blocks'][index][2]] for index in indexes]
+    results = map_blocks(tasks, read_index_block, threads)
+    blocks = ((index, next(results)) for index in indexes)
+    block_size = checksums['block_size']
+    block_index, block = None, b''
+    for name, data_offset, size, expected in entries:
+        path = get_member_path(destination, name)
+        filesystem_utils.mkdir_path(os.path.dirname(path), 0o755)
+        digest = new_hash(checksums['algorithm'])
+        position, end = data_offset, data_offset + size
+        with open(path, 'wb') as member_file:
+            while position < end:
+                while block_index != position // block_size:
+                    block_index, block = next(blocks)
+                start = position - block_index * block_size
+                data = block[start:start + end - position]
+                if not data:
+                    raise ProgramError("Truncated member in archive: " +
+                                       name)
+                member_file.write(data)
+                digest.update(data)
+                position += len(data)
+        if digest.hexdigest() != expected:
+            raise ProgramError("Corrupted member in archive: " + name)
+    return [entry[0] for entry in entries]
@@ -0,0 +1,184 @@
+import errno
+import gzip
+import hashlib
+import json
+import os
+import time
+from xtrabackup.compression import get_codec, map_blocks
+from xtrabackup.exception import ProgramError
+import xtrabackup.filesystem_utils as filesystem_utils
+import xtrabackup.tar_stream as tar_stream
+
+
+CHUNK_SIZE = 4 * 1024 * 1024
+CHUNK_DIRECTORY = 'chunks'
+MANIFEST_VERSION = 1
+
+
+def get_chunk_path(store_path, digest):
+    return os.path.join(store_path, digest[:2], digest)
+
+
+def store_chunk(store_path, digest, codec_name, level, data):
+    chunk_path = get_chunk_path(store_path, digest)
+    if codec_name:
+        data = get_codec(codec_name).compress_block(data, level)
+    directory = os.path.dirname(chunk_path)
+    filesystem_utils.mkdir_path(directory, 0o755)
+    temporary_path = '%s.%d.tmp' % (chunk_path, os.getpid())
+    with open(temporary_path, 'wb') as chunk_file:
+        chunk_file.write(data)
+    os.rename(temporary_path, chunk_path)
+    return len(data)
+
+
+def load_chunk(store_path, digest, codec_name):
+    with open(get_chunk_path(store_path, digest), 'rb') as chunk_file:
+        data = chunk_file.read()
+    if codec_name:
+        data = get_codec(codec_name).decompress_block(data)
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ProgramError("Corrupted chunk: " + digest)
+    return data
+
+
+def find_store_path(manifest_path):
+    directory = os.path.dirname(os.path.abspath(manifest_path))
+    while True:
+        store_path = os.path.join(directory, CHUNK_DIRECTORY)
+        if os.path.isdir(store_path):
+            return store_path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            raise ProgramError("Cannot locate chunk store for manifest: "
+                               + manifest_path)
+        directory = parent
+
+
+def read_manifest(manifest_path):
+    with gzip.open(manifest_path, 'rb') as manifest_file:
+        return json.loads(manifest_file.read().decode('utf-8'))
+
+
+def find_manifests(repository):
+    for root, directories, files in os.walk(repository):
+        if CHUNK_DIRECTORY in directories:
+            directories.remove(CHUNK_DIRECTORY)
+        for file_name in files:
+            if file_name.endswith(filesystem_utils.MANIFEST_EXTENSION):
+                yield os.path.join(root, file_name)
+
+
+class ChunkStore:
+    """Stores tar streams as deduplicated chunks and a manifest.
+
+    Chunk boundaries follow the tar members: file data is cut at fixed
+    offsets from the start of each file, so that a tablespace keeps the
+    same chunks from one backup to the next when only some pages change.
+    Headers and small files are packed together.
+    """
+
+    def __init__(self, store_path, compression=None, level=None, threads=1):
+        self.store_path = store_path
+        self.compression = compression
+        self.level = level
+        if compression and level is None:
+            self.level = get_codec(compression).default_level
+        self.threads = max(1, int(threads))
+        self.filters = None
+        self.written_bytes = 0
+
+    def iter_chunks(self, input_stream):
+        pending = []
+        pending_size = 0
+        for member in tar_stream.iter_members(input_stream):
+            if member.is_file() and member.padded_size >= CHUNK_SIZE:
+                pending.append(member.header)
+                yield b''.join(pending)
+                pending, pending_size = [], 0
+                while member.remaining:
+                    yield member.read(CHUNK_SIZE)
+                continue
+            pending.append(member.header)
+            pending.append(member.read(member.remaining))
+            pending_size += tar_stream.RECORD_SIZE + member.padded_size
+            if pending_size >= CHUNK_SIZE:
+                yield b''.join(pending)
+                pending, pending_size = [], 0
+        if pending:
+            yield b''.join(pending)
+
+    def is_stored(self, digest):
+        chunk_path = get_chunk_path(self.store_path, digest)
+        try:
+            os.utime(chunk_path, None)
+        except OSError as error:
+            if error.errno == errno.ENOENT:
+                return False
+            raise
+        return True
+
+    def compress_stream(self, input_stream, output_stream):
+        chunks = []
+        new_chunks = set()
+
+        def pending_chunks():
+            for data in self.iter_chunks(input_stream):
+                digest = hashlib.sha256(data).hexdigest()
+                chunks.append([digest, len(data)])
+                if digest in new_chunks or self.is_stored(digest):
+                    continue
+                new_chunks.add(digest)
+                yield (self.store_path, digest, self.compression, self.level,
+                       data)
+
+        for size in map_blocks(pending_chunks(), store_chunk, self.threads):
+            self.written_bytes += size
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'compression': self.compression,
+            'size': sum(size for digest, size in chunks),
+            'chunks': chunks,
+        }
+        if self.filters:
+            manifest['filters'] = self.filters
+        with gzip.GzipFile(fileobj=output_stream, mode='wb') as manifest_file:
+            manifest_file.write(json.dumps(manifest).encode('utf-8'))
+
+    def decompress_stream(self, input_stream, output_stream):
+        with gzip.GzipFile(fileobj=input_stream, mode='rb') as manifest_file:
+            manifest = json.loads(manifest_file.read().decode('utf-8'))
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ProgramError("Unsupported manifest version: %s"
+                               % manifest.get('version'))
+        chunks = ((self.store_path, digest, manifest['compression'])
+                  for digest, size in manifest['chunks'])
+        for data in map_blocks(chunks, load_chunk, self.threads):
+            output_stream.write(data)
+
+
+def collect_garbage(repository, dry_run=False, grace_period=86400):
+    store_path = os.path.join(repository, CHUNK_DIRECTORY)
+    if not os.path.isdir(store_path):
+        return 0, 0
+    referenced_chunks = set()
+    for manifest_path in find_manifests(repository):
+        for digest, size in read_manifest(manifest_path)['chunks']:
+            referenced_chunks.add(digest)
+    deadline = time.time() - grace_period
+    deleted_chunks = 0
+    deleted_bytes = 0
+    for directory in os.listdir(store_path):
+        directory_path = os.path.join(store_path, directory)
+        for file_name in os.listdir(directory_path):
+            if file_name in referenced_chunks:
+                continue
+            chunk_path = os.path.join(directory_path, file_name)
+            stat = os.stat(chunk_path)
+            if stat.st_mtime > deadline:
+                continue
+            deleted_chunks += 1
+            deleted_bytes += stat.st_size
+            if not dry_run:
+                os.unlink(chunk_path)
+    return deleted_chunks, deleted_bytes
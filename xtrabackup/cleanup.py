@@ -0,0 +1,119 @@
+import errno
+import os
+import threading
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+
+CLEAN_THREADS = 8
+CLEAN_MODES = ['delete', 'rename']
+TRASH_PREFIX = '.pyxtrabackup-trash-'
+
+
+def list_directory(path):
+    files = []
+    directories = []
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            directories.append(entry.path)
+        else:
+            files.append(entry.path)
+    return files, directories
+
+
+def unlink_files(path):
+    files, directories = list_directory(path)
+    for file_path in files:
+        try:
+            os.unlink(file_path)
+        except OSError as error:
+            if error.errno != errno.ENOENT:
+                raise
+    return directories
+
+
+def walk_directories(path, function, threads):
+    """Calls function on path and on every directory below it.
+
+    Each directory is handled by a thread of the pool as soon as its
+    parent has been listed: function returns the subdirectories to walk.
+    The directories below path are returned, parents first.
+    """
+    directories = []
+    pool = ThreadPool(max(1, int(threads)))
+    try:
+        pending = deque([pool.apply_async(function, (path,))])
+        while pending:
+            for directory in pending.popleft().get():
+                directories.append(directory)
+                pending.append(pool.apply_async(function, (directory,)))
+    finally:
+        pool.close()
+        pool.join()
+    return directories
+
+
+def delete_contents(path, threads=CLEAN_THREADS):
+    """Deletes everything inside path, keeping path itself.
+
+    The directories are emptied of their files in parallel, then removed
+    deepest first.
+    """
+    directories = walk_directories(path, unlink_files, threads)
+    for directory in reversed(directories):
+        os.rmdir(directory)
+
+
+def get_trash_path(path):
+    path = os.path.abspath(path)
+    parent, name = os.path.split(path)
+    trash_name = '%s%s-%d' % (TRASH_PREFIX, name, int(time.time()))
+    # A rename can not leave a mount point, the contents of the directory
+    # are then moved into a directory inside it.
+    if os.stat(path).st_dev == os.stat(parent).st_dev:
+        return os.path.join(parent, trash_name)
+    return os.path.join(path, trash_name)
+
+
+def move_contents_aside(path):
+    trash_path = get_trash_path(path)
+    os.mkdir(trash_path, 0o700)
+    for name in os.listdir(path):
+        entry_path = os.path.join(path, name)
+        if entry_path != trash_path:
+            os.rename(entry_path, os.path.join(trash_path, name))
+    return trash_path
+
+
+class BackgroundCleaner:
+    """Deletes a directory moved aside while the restoration goes on.
+
+    A directory moved inside the cleaned directory, when it is a mount
+    point, is still seen by innobackupex and must be gone before the
+    backup is prepared.
+    """
+
+    def __init__(self, trash_path, threads=CLEAN_THREADS):
+        self.trash_path = trash_path
+        self.threads = threads
+        self.error = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def is_nested(self, path):
+        return os.path.dirname(self.trash_path) == os.path.abspath(path)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        try:
+            delete_contents(self.trash_path, self.threads)
+            os.rmdir(self.trash_path)
+        except Exception as error:
+            self.error = error
+
+    def wait(self):
+        self.thread.join()
+        return self.error
@@ -1,20 +1,86 @@
+import contextlib
+import re
 import subprocess
 from xtrabackup.exception import ProcessError
+from xtrabackup.compression import copy_stream
+from xtrabackup.extractor import ArchiveExtractor
+from xtrabackup.page_tracking import parse_server_variables
+from xtrabackup.pipeline import Pipeline, FunctionStage, wait_process
+from xtrabackup.progress import OutputReader
+from xtrabackup.storage import DOWNLOAD_THREADS, is_remote, open_archive
+from xtrabackup.throttle import get_innobackupex_throttle, throttle_function
+
+
+# tar reports the bytes it went through every TAR_CHECKPOINT_RECORDS
+# records of 10 KB, instead of listing every file of the backup.
+TAR_CHECKPOINT_RECORDS = 10240
 
 
 class CommandExecutor:
 
-    def __init__(self, output_file_path):
-        self.output_file_path = output_file_path
+    def __init__(self, output_log, connection_options=None,
+                 rate_limiter=None, progress=None,
+                 download_threads=DOWNLOAD_THREADS, filter_options=None):
+        self.output_log = output_log
+        self.connection_options = connection_options or []
+        self.filter_options = filter_options or []
+        self.rate_limiter = rate_limiter
+        self.progress = progress
+        self.download_threads = download_threads
+
+    def create_stage(self, name, function):
+        return FunctionStage(name,
+                             throttle_function(function, self.rate_limiter))
+
+    def prepare_backup_options(self):
+        options = list(self.connection_options)
+        options.extend(self.filter_options)
+        if self.rate_limiter:
+            options.append('--throttle=%d' % get_innobackupex_throttle(
+                self.rate_limiter.max_rate))
+        return options
+
+    @contextlib.contextmanager
+    def open_output(self, job=None):
+        output_file = self.output_log.open(job)
+        reader = OutputReader(output_file, self.progress)
+        failed = True
+        try:
+            yield reader.writer
+            failed = False
+        finally:
+            reader.close()
+            output_file.close(failed)
 
-    def exec_command(self, command):
-        with open(self.output_file_path, 'a+') as error_file:
+    def get_tar_options(self, direction):
+        if self.progress is None:
+            return []
+        return ['--checkpoint=%d' % TAR_CHECKPOINT_RECORDS,
+                '--checkpoint-action=echo=%%{%s}T' % direction]
+
+    def exec_command(self, command, job=None):
+        with self.open_output(job) as error_file:
             process = subprocess.Popen(command, stdout=error_file,
                                        stderr=subprocess.STDOUT)
-            process.communicate()
+            wait_process(process)
             if process.returncode != 0:
                 raise ProcessError(command, process.returncode)
 
+    def exec_pipeline(self, stages, output_path=None, output_stream=None,
+                      job=None):
+        if output_stream is not None:
+            if not isinstance(stages[-1], FunctionStage):
+                stages.append(FunctionStage('upload', copy_stream))
+            with self.open_output(job) as error_file:
+                Pipeline(stages, error_file).run(output_stream)
+            return
+        with self.open_output(job) as error_file:
+            if output_path is None:
+                Pipeline(stages, error_file).run(error_file)
+                return
+            with open(output_path, 'wb') as output_file:
+                Pipeline(stages, error_file).run(output_file)
+
     def exec_filesystem_backup(self, user, password,
                                threads, backup_directory):
         command = [
@@ -26,10 +92,75 @@ class CommandExecutor:
             backup_directory]
         if password:
             command.append('--password=' + password)
-        self.exec_command(command)
+        command.extend(self.prepare_backup_options())
+        self.exec_command(command, 'copy')
+
+    def create_output_stages(self, compressor, checksums):
+        if compressor and checksums:
+            return [self.create_stage('compression',
+                                      checksums.compress_stream)]
+        if compressor:
+            return [self.create_stage('compression',
+                                      compressor.compress_stream)]
+        if checksums:
+            return [self.create_stage('checksum', checksums.index_stream)]
+        if self.rate_limiter:
+            return [self.create_stage('throttle', copy_stream)]
+        return []
+
+    def get_server_variables(self, user, password, names):
+        command = [
+            'mysql',
+            '--user=' + user,
+            '--batch',
+            '--skip-column-names']
+        if password:
+            command.append('--password=' + password)
+        command.extend(self.connection_options)
+        command.extend([
+            '--execute',
+            'SHOW GLOBAL VARIABLES WHERE Variable_name IN (%s)' % ', '.join(
+                "'%s'" % name for name in names)])
+        try:
+            output = subprocess.check_output(command,
+                                             stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            return {}
+        return parse_server_variables(output.decode('utf-8', 'replace'))
+
+    def exec_sql(self, user, password, statement):
+        command = [
+            'mysql',
+            '--user=' + user,
+            '--batch']
+        if password:
+            command.append('--password=' + password)
+        command.extend(self.connection_options)
+        command.extend(['--execute', statement])
+        self.exec_command(command, 'import')
+
+    def exec_streaming_backup(self, user, password, backup_directory,
+                              archive_path, compressor, checksums=None,
+                              output_stream=None):
+        # xtrabackup only copies the files in parallel into an xbstream
+        # stream, a tar stream is written by a single thread. Incremental
+        # backups cannot be written into a tar stream.
+        command = [
+            'innobackupex',
+            '--user=' + user,
+            '--no-lock',
+            '--stream=tar',
+            '--extra-lsndir=' + backup_directory]
+        if password:
+            command.append('--password=' + password)
+        command.extend(self.prepare_backup_options())
+        command.append(backup_directory)
+        stages = [command] + self.create_output_stages(compressor, checksums)
+        self.exec_pipeline(stages, archive_path, output_stream, 'stream')
 
     def exec_incremental_backup(self, user, password,
-                                threads, lsn, backup_directory):
+                                threads, lsn, backup_directory,
+                                force_scan=True):
         command = [
             'innobackupex',
             '--user=' + user,
@@ -37,62 +168,125 @@ class CommandExecutor:
             '--incremental',
             '--incremental-lsn=' + lsn,
             '--no-lock',
-            '--no-timestamp',
-            '--incremental-force-scan',
-            backup_directory]
+            '--no-timestamp']
+        if force_scan:
+            command.append('--incremental-force-scan')
+        command.append(backup_directory)
         if password:
             command.append('--password=' + password)
-        self.exec_command(command)
+        command.extend(self.prepare_backup_options())
+        self.exec_command(command, 'copy')
 
-    def exec_backup_preparation(self, backup_directory, redo_logs):
+    def prepare_apply_options(self, use_memory, threads):
+        options = []
+        if use_memory:
+            options.append('--use-memory=' + use_memory)
+        if threads:
+            options.append('--parallel=' + str(threads))
+        return options
+
+    def exec_backup_preparation(self, backup_directory, redo_logs,
+                                use_memory=None, threads=None,
+                                export=False):
         command = [
             'innobackupex',
-            '--apply-log',
-            backup_directory]
+            '--apply-log']
+        command.extend(self.prepare_apply_options(use_memory, threads))
+        command.append(backup_directory)
         if redo_logs:
             command.append('--redo-only')
-        self.exec_command(command)
+        if export:
+            command.append('--export')
+        self.exec_command(command, 'prepare')
 
     def exec_incremental_preparation(self, backup_directory,
-                                     incremental_directory):
+                                     incremental_directory,
+                                     use_memory=None, threads=None):
         command = [
             'innobackupex',
             '--apply-log',
-            '--redo-only',
+            '--redo-only']
+        command.extend(self.prepare_apply_options(use_memory, threads))
+        command.extend([
             '--incremental-dir=' + incremental_directory,
-            backup_directory]
-        self.exec_command(command)
+            backup_directory])
+        self.exec_command(command, 'prepare')
+
+    def get_xtrabackup_version(self):
+        try:
+            output = subprocess.check_output(['xtrabackup', '--version'],
+                                             stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        version = re.search(r'version (\d+)\.(\d+)\.(\d+)',
+                            output.decode('utf-8', 'replace'))
+        if version is None:
+            return None
+        return tuple(int(number) for number in version.groups())
 
     def exec_manage_service(self, service_name, action):
         command = ['service', service_name, action]
-        self.exec_command(command)
+        self.exec_command(command, 'service')
 
-    def exec_chown(self, user, group, directory_path):
-        command = ['/bin/chown', '-R', user + ':' + group, directory_path]
-        self.exec_command(command)
-
-    def create_archive(self, directory, archive_path, compress):
-        if compress:
-            tar_options = 'cpvzf'
-        else:
-            tar_options = 'cpvf'
+    def create_archive(self, directory, archive_path, compressor,
+                       checksums=None, output_stream=None):
+        if (not compressor and not self.rate_limiter and not checksums and
+                output_stream is None):
+            self.exec_command(['tar', 'cpf', archive_path] +
+                              self.get_tar_options('w') +
+                              ['-C', directory, '.'], 'archive')
+            return
         command = [
             'tar',
-            tar_options,
-            archive_path,
+            'cpf',
+            '-'] + self.get_tar_options('w') + [
             '-C',
             directory, '.']
-        self.exec_command(command)
+        stages = [command] + self.create_output_stages(compressor, checksums)
+        self.exec_pipeline(stages, archive_path, output_stream, 'archive')
+
+    def extract_archive(self, archive_path, destination_path, compressor,
+                        io_mode=None, owner=None):
+        if io_mode:
+            self.extract_archive_stream(archive_path, destination_path,
+                                        compressor, io_mode, owner)
+            return
+        if not compressor and not is_remote(archive_path):
+            self.exec_command(['tar', 'xipf', archive_path] +
+                              self.get_tar_options('r') +
+                              ['-C', destination_path], 'extract')
+            return
+
+        def read_archive(input_stream, output_stream):
+            with open_archive(archive_path, self.download_threads) as archive:
+                if compressor:
+                    compressor.decompress_stream(archive, output_stream)
+                else:
+                    copy_stream(archive, output_stream)
 
-    def extract_archive(self, archive_path, destination_path, compressed):
-        if compressed:
-            tar_options = 'xpvzf'
-        else:
-            tar_options = 'xpvf'
         command = [
             'tar',
-            tar_options,
-            archive_path,
+            'xipf',
+            '-'] + self.get_tar_options('r') + [
             '-C',
             destination_path]
-        self.exec_command(command)
+        self.exec_pipeline([
+            FunctionStage('decompression', read_archive),
+            command], job='extract')
+
+    def extract_archive_stream(self, archive_path, destination_path,
+                               compressor, io_mode, owner=None):
+        extractor = ArchiveExtractor(destination_path, io_mode, owner)
+
+        def read_archive(input_stream, output_stream):
+            with open_archive(archive_path, self.download_threads) as archive:
+                if compressor:
+                    compressor.decompress_stream(archive, output_stream)
+                else:
+                    extractor.extract_stream(archive, output_stream)
+
+        stages = [FunctionStage('decompression', read_archive)]
+        if compressor:
+            stages.append(FunctionStage('extraction',
+                                        extractor.extract_stream))
+        self.exec_pipeline(stages, job='extract')
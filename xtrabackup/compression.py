@@ -0,0 +1,255 @@
+import multiprocessing
+import struct
+import zlib
+from collections import deque
+from xtrabackup.exception import ProgramError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+BLOCK_SIZE = 4 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+
+class GzipCodec:
+    """Independent gzip members carrying their size in a FEXTRA field."""
+
+    name = 'gzip'
+    available = True
+    default_level = 6
+    header_size = 20
+    header_struct = struct.Struct('<4sI2BH2sHI')
+
+    def compress_block(self, data, level):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        deflated = compressor.compress(data) + compressor.flush()
+        member_size = self.header_size + len(deflated) + 8
+        header = self.header_struct.pack(
+            b'\x1f\x8b\x08\x04', 0, 0, 255, 8, b'XB', 4, member_size)
+        trailer = struct.pack('<II', zlib.crc32(data) & 0xffffffff,
+                              len(data) & 0xffffffff)
+        return b''.join([header, deflated, trailer])
+
+    def decompress_block(self, block):
+        return zlib.decompress(block, 16 + zlib.MAX_WBITS)
+
+    def block_size(self, header):
+        if len(header) < self.header_size:
+            return None
+        magic, _, _, _, xlen, subfield, slen, member_size = \
+            self.header_struct.unpack(header[:self.header_size])
+        if (magic != b'\x1f\x8b\x08\x04' or xlen != 8 or
+                subfield != b'XB' or slen != 4):
+            return None
+        return member_size
+
+    def decompress_serial(self, prefix, input_stream, output_stream):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = prefix
+        while data:
+            output_stream.write(decompressor.decompress(data))
+            while decompressor.unused_data:
+                unused_data = decompressor.unused_data
+                output_stream.write(decompressor.flush())
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                output_stream.write(decompressor.decompress(unused_data))
+            data = input_stream.read(READ_SIZE)
+        output_stream.write(decompressor.flush())
+
+
+class SkippableFrameCodec:
+    """Frames preceded by a zstd/lz4 skippable frame holding their size."""
+
+    header_size = 12
+    header_struct = struct.Struct('<III')
+    skippable_magic = 0x184D2A5B
+
+    def compress_block(self, data, level):
+        frame = self.compress_frame(data, level)
+        header = self.header_struct.pack(self.skippable_magic, 4, len(frame))
+        return header + frame
+
+    def block_size(self, header):
+        if len(header) < self.header_size:
+            return None
+        magic, size, frame_size = self.header_struct.unpack(
+            header[:self.header_size])
+        if magic != self.skippable_magic or size != 4:
+            return None
+        return self.header_size + frame_size
+
+    def decompress_block(self, block):
+        return self.decompress_frame(block[self.header_size:])
+
+
+class ZstdCodec(SkippableFrameCodec):
+
+    name = 'zstd'
+    available = zstandard is not None
+    default_level = 3
+
+    def compress_frame(self, data, level):
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    def decompress_frame(self, frame):
+        return zstandard.ZstdDecompressor().decompress(frame)
+
+    def decompress_serial(self, prefix, input_stream, output_stream):
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            PrefixedStream(prefix, input_stream), read_across_frames=True)
+        copy_stream(reader, output_stream)
+
+
+class Lz4Codec(SkippableFrameCodec):
+
+    name = 'lz4'
+    available = lz4_frame is not None
+    default_level = 0
+
+    def compress_frame(self, data, level):
+        return lz4_frame.compress(data, compression_level=level,
+                                  store_size=True)
+
+    def decompress_frame(self, frame):
+        return lz4_frame.decompress(frame)
+
+    def decompress_serial(self, prefix, input_stream, output_stream):
+        reader = lz4_frame.open(PrefixedStream(prefix, input_stream), 'rb')
+        copy_stream(reader, output_stream)
+
+
+CODECS = {
+    'gzip': GzipCodec,
+    'zstd': ZstdCodec,
+    'lz4': Lz4Codec,
+}
+
+
+class PrefixedStream:
+
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.stream.read(size)
+        if size < 0:
+            data, self.prefix = self.prefix + self.stream.read(), b''
+            return data
+        data, self.prefix = self.prefix[:size], self.prefix[size:]
+        return data
+
+
+def copy_stream(input_stream, output_stream):
+    while True:
+        data = input_stream.read(READ_SIZE)
+        if not data:
+            break
+        output_stream.write(data)
+
+
+def read_exactly(stream, size):
+    chunks = []
+    while size > 0:
+        data = stream.read(size)
+        if not data:
+            break
+        chunks.append(data)
+        size -= len(data)
+    return b''.join(chunks)
+
+
+def get_codec(name):
+    if name not in CODECS:
+        raise ProgramError("Unsupported compression algorithm: " + name)
+    codec_class = CODECS[name]
+    if not codec_class.available:
+        raise ProgramError("Missing Python module for compression "
+                           "algorithm: " + name)
+    return codec_class()
+
+
+def compress_block(codec_name, level, data):
+    return get_codec(codec_name).compress_block(data, level)
+
+
+def decompress_block(codec_name, block):
+    return get_codec(codec_name).decompress_block(block)
+
+
+def map_blocks(blocks, function, threads):
+    if threads <= 1:
+        for arguments in blocks:
+            yield function(*arguments)
+        return
+    # The blocks are mapped from the threads of a pipeline, the workers are
+    # started by a server process so that they do not fork those threads.
+    pool = multiprocessing.get_context('forkserver').Pool(threads)
+    try:
+        pending = deque()
+        for arguments in blocks:
+            pending.append(pool.apply_async(function, arguments))
+            if len(pending) >= 2 * threads:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class Compressor:
+
+    def __init__(self, codec_name, level=None, threads=1):
+        self.codec = get_codec(codec_name)
+        if level is None:
+            level = self.codec.default_level
+        self.level = int(level)
+        self.threads = max(1, int(threads))
+        self.block_size = BLOCK_SIZE
+
+    def run_blocks(self, blocks, function, output_stream):
+        for data in map_blocks(blocks, function, self.threads):
+            output_stream.write(data)
+
+    def read_raw_blocks(self, input_stream):
+        while True:
+            data = read_exactly(input_stream, self.block_size)
+            if not data:
+                break
+            yield (self.codec.name, self.level, data)
+
+    def read_compressed_blocks(self, header, input_stream):
+        while header:
+            block_size = self.codec.block_size(header)
+            if block_size is None:
+                raise ProgramError("Corrupted %s block in archive."
+                                   % self.codec.name)
+            block = header + read_exactly(input_stream,
+                                          block_size - len(header))
+            if len(block) != block_size:
+                raise ProgramError("Truncated %s block in archive."
+                                   % self.codec.name)
+            yield (self.codec.name, block)
+            header = read_exactly(input_stream, self.codec.header_size)
+
+    def compress_stream(self, input_stream, output_stream):
+        self.run_blocks(self.read_raw_blocks(input_stream),
+                        compress_block, output_stream)
+
+    def decompress_stream(self, input_stream, output_stream):
+        header = read_exactly(input_stream, self.codec.header_size)
+        if header and self.codec.block_size(header) is None:
+            self.codec.decompress_serial(header, input_stream, output_stream)
+            return
+        self.run_blocks(self.read_compressed_blocks(header, input_stream),
+                        decompress_block, output_stream)
@@ -0,0 +1,102 @@
+import datetime
+from xtrabackup.exception import ProgramError
+
+
+CRON_FIELDS = [
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),
+]
+
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+
+# A schedule matching no date within this many days, such as the 31st of
+# February, never runs.
+SEARCH_DAYS = 366 * 5
+
+
+def parse_field(value, minimum, maximum):
+    values = set()
+    for part in value.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+            if step < 1:
+                raise ValueError(step)
+        if part == '*':
+            first, last = minimum, maximum
+        elif '-' in part:
+            first, last = [int(bound) for bound in part.split('-', 1)]
+        else:
+            first = int(part)
+            last = maximum if step > 1 else first
+        if first < minimum or last > maximum or first > last:
+            raise ValueError(part)
+        values.update(range(first, last + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Five fields crontab schedule: minute, hour, day of the month, month
+    and day of the week (0 or 7 for Sunday).
+
+    As with cron, when both the day of the month and the day of the week
+    are restricted, a date matching either one of them matches.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = CRON_ALIASES.get(expression, expression).split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ProgramError("Invalid cron schedule, expected 5 fields: "
+                               + expression)
+        self.values = {}
+        try:
+            for value, (name, minimum, maximum) in zip(fields, CRON_FIELDS):
+                self.values[name] = parse_field(value, minimum, maximum)
+        except ValueError:
+            raise ProgramError("Invalid cron schedule: " + expression)
+        if 7 in self.values['weekday']:
+            self.values['weekday'].add(0)
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def matches_day(self, date):
+        day = date.day in self.values['day']
+        weekday = (date.weekday() + 1) % 7 in self.values['weekday']
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def matches(self, date):
+        return (date.minute in self.values['minute'] and
+                date.hour in self.values['hour'] and
+                date.month in self.values['month'] and
+                self.matches_day(date))
+
+    def get_next(self, after):
+        date = after.replace(second=0, microsecond=0) + \
+            datetime.timedelta(minutes=1)
+        limit = date + datetime.timedelta(days=SEARCH_DAYS)
+        while date < limit:
+            if date.month not in self.values['month']:
+                date = (date.replace(day=1, hour=0, minute=0) +
+                        datetime.timedelta(days=32)).replace(day=1)
+            elif not self.matches_day(date):
+                date = date.replace(hour=0, minute=0) + \
+                    datetime.timedelta(days=1)
+            elif date.hour not in self.values['hour']:
+                date = date.replace(minute=0) + datetime.timedelta(hours=1)
+            elif date.minute not in self.values['minute']:
+                date += datetime.timedelta(minutes=1)
+            else:
+                return date
+        return None
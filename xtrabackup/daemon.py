@@ -0,0 +1,62 @@
+"""Xtrabackup script
+
+Usage:
+    pyxtrabackup-daemon <inventory> [options]
+    pyxtrabackup-daemon (-h | --help)
+    pyxtrabackup --version
+
+
+Options:
+    -h --help                   \
+    Show this screen.
+    -d --debug                  \
+    Enable verbose error
+    --version                   \
+    Show version.
+    --concurrency=<jobs>        \
+    Maximum number of backups running at the same time [default: 2].
+    --listen=<address>          \
+    Address of the HTTP control API [default: 127.0.0.1:8089].
+    --tmp-dir=<tmp>             \
+    Temporary directory, one sub-directory per instance [default: /tmp].
+    --out-dir=<dir>             \
+    Directory of the per-instance log and output files \
+[default: /var/log/mysql].
+    --log-file=<log>            \
+    Log file [default: /var/log/mysql/pyxtrabackup-daemon.log].
+
+"""
+from docopt import docopt
+import signal
+import sys
+import logging
+from xtrabackup.backup_daemon import BackupDaemon
+from xtrabackup.backup_scheduler import load_inventory
+import xtrabackup.log_manager as log_manager
+
+
+def main():
+    arguments = docopt(__doc__, version='3.1.6')
+    logger = logging.getLogger(__name__)
+    try:
+        log_manager.LogManager().attach_file_handler(
+            logger, arguments['--log-file'])
+        backup_daemon = BackupDaemon(
+            load_inventory(arguments['<inventory>']),
+            arguments['--tmp-dir'],
+            arguments['--out-dir'],
+            int(arguments['--concurrency']),
+            arguments['--listen'],
+            logger)
+        signal.signal(signal.SIGTERM, backup_daemon.stop)
+        signal.signal(signal.SIGINT, backup_daemon.stop)
+        backup_daemon.run()
+    except Exception:
+        logger.error("pyxtrabackup-daemon failed.",
+                     exc_info=arguments['--debug'])
+        exit(1)
+    exit(0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
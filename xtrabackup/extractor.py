@@ -0,0 +1,184 @@
+import errno
+import fcntl
+import grp
+import mmap
+import os
+import pwd
+import tarfile
+from xtrabackup.exception import ProgramError
+
+
+IO_MODES = ['buffered', 'direct', 'dontneed']
+WRITE_SIZE = 8 * 1024 * 1024
+DIRECT_IO_ALIGNMENT = 4096
+DONTNEED_INTERVAL = 64 * 1024 * 1024
+# Python versions with extraction filters refuse the links leaving the
+# destination themselves, and clear the special mode bits.
+EXTRACT_OPTIONS = {'filter': 'data'} if hasattr(tarfile, 'data_filter') \
+    else {}
+
+
+class ArchiveExtractor:
+    """Writes a tar stream into a directory.
+
+    With an owner, the files are given to it as they are written, instead
+    of keeping the owner recorded in the archive.
+    """
+
+    def __init__(self, destination_path, io_mode='buffered', owner=None):
+        if io_mode not in IO_MODES:
+            raise ProgramError("Unsupported restore I/O mode: " + io_mode)
+        self.destination_path = os.path.realpath(destination_path)
+        self.io_mode = io_mode
+        self.restore_owner = os.geteuid() == 0
+        self.owner = owner
+        self.buffer = mmap.mmap(-1, WRITE_SIZE)
+
+    def extract_stream(self, input_stream, output_stream):
+        directories = []
+        try:
+            archive = tarfile.open(fileobj=input_stream, mode='r|',
+                                   ignore_zeros=True)
+            for member in archive:
+                path = self.get_member_path(member)
+                if member.isreg():
+                    self.write_file(archive, member, path)
+                elif member.isdir():
+                    if not os.path.isdir(path):
+                        os.makedirs(path, 0o700)
+                    directories.append((member, path))
+                else:
+                    self.check_link(member, path)
+                    archive.extract(member, self.destination_path,
+                                    **EXTRACT_OPTIONS)
+                    if self.restore_owner and self.owner is not None:
+                        os.lchown(path, *self.owner)
+            for member, path in reversed(directories):
+                self.set_attributes(member, path)
+        finally:
+            self.buffer.close()
+
+    def is_inside(self, path):
+        return (path == self.destination_path or
+                path.startswith(self.destination_path + os.sep))
+
+    def get_member_path(self, member):
+        path = os.path.normpath(os.path.join(self.destination_path,
+                                             member.name))
+        # The parent directory is resolved, in case a link extracted
+        # earlier leads out of the destination.
+        if not self.is_inside(path) or (
+                path != self.destination_path and not self.is_inside(
+                    os.path.realpath(os.path.dirname(path)))):
+            raise ProgramError("Archive member outside of the destination: "
+                               + member.name)
+        return path
+
+    def check_link(self, member, path):
+        if member.isdev():
+            raise ProgramError("Unsupported archive member type: "
+                               + member.name)
+        if member.issym():
+            target = os.path.join(os.path.dirname(path), member.linkname)
+        elif member.islnk():
+            target = os.path.join(self.destination_path, member.linkname)
+        else:
+            return
+        if not self.is_inside(os.path.realpath(target)):
+            raise ProgramError("Archive link outside of the destination: "
+                               + member.name)
+
+    def open_file(self, path):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW
+        if self.io_mode == 'direct':
+            try:
+                return os.open(path, flags | os.O_DIRECT, 0o600), True
+            except OSError as error:
+                if error.errno != errno.EINVAL:
+                    raise
+        return os.open(path, flags, 0o600), False
+
+    def preallocate(self, fd, size):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except (AttributeError, OSError):
+            pass
+
+    def disable_direct_io(self, fd):
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+
+    def read_block(self, source, size):
+        view = memoryview(self.buffer)
+        read = 0
+        try:
+            while read < size:
+                count = source.readinto(view[read:size])
+                if not count:
+                    raise ProgramError("Truncated archive member.")
+                read += count
+        finally:
+            view.release()
+
+    def write_file(self, archive, member, path):
+        parent_path = os.path.dirname(path)
+        if not os.path.isdir(parent_path):
+            os.makedirs(parent_path, 0o755)
+        source = archive.extractfile(member)
+        fd, direct_io = self.open_file(path)
+        try:
+            if member.size:
+                self.preallocate(fd, member.size)
+            written = 0
+            advised = 0
+            while written < member.size:
+                size = min(WRITE_SIZE, member.size - written)
+                self.read_block(source, size)
+                if direct_io and size % DIRECT_IO_ALIGNMENT:
+                    self.disable_direct_io(fd)
+                    direct_io = False
+                view = memoryview(self.buffer)
+                try:
+                    offset = 0
+                    while offset < size:
+                        offset += os.write(fd, view[offset:size])
+                finally:
+                    view.release()
+                written += size
+                if (self.io_mode == 'dontneed' and
+                        written - advised >= DONTNEED_INTERVAL):
+                    self.drop_cache(fd, advised, written - advised)
+                    advised = written
+            if self.io_mode == 'dontneed' and written > advised:
+                self.drop_cache(fd, advised, written - advised)
+            self.set_file_attributes(member, fd)
+        finally:
+            os.close(fd)
+        os.utime(path, (member.mtime, member.mtime))
+
+    def drop_cache(self, fd, offset, length):
+        os.fdatasync(fd)
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+
+    def get_owner(self, member):
+        if self.owner is not None:
+            return self.owner
+        try:
+            uid = pwd.getpwnam(member.uname).pw_uid if member.uname \
+                else member.uid
+            gid = grp.getgrnam(member.gname).gr_gid if member.gname \
+                else member.gid
+        except KeyError:
+            uid, gid = member.uid, member.gid
+        return uid, gid
+
+    def set_file_attributes(self, member, fd):
+        if self.restore_owner:
+            os.fchown(fd, *self.get_owner(member))
+        os.fchmod(fd, member.mode)
+
+    def set_attributes(self, member, path):
+        if self.restore_owner:
+            os.lchown(path, *self.get_owner(member))
+        os.chmod(path, member.mode)
+        os.utime(path, (member.mtime, member.mtime))
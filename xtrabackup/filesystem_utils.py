@@ -1,13 +1,38 @@
 import errno
 import os
+import re
 import datetime
-from distutils import spawn
+from xtrabackup.cleanup import CLEAN_THREADS, delete_contents
 from xtrabackup.exception import ProgramError
 from re import search
-from shutil import rmtree, move
+from shutil import rmtree, move, which
 from glob import glob
 
 
+SIZE_UNITS = {
+    'K': 1024,
+    'M': 1024 ** 2,
+    'G': 1024 ** 3,
+    'T': 1024 ** 4,
+}
+
+MANIFEST_EXTENSION = '.tar.manifest'
+
+CHAIN_NAME_PATTERN = re.compile(r'[^A-Za-z0-9_-]')
+
+CHECKSUM_EXTENSION = '.checksums'
+
+ARCHIVE_EXTENSIONS = {
+    'gzip': '.tar.gz',
+    'zstd': '.tar.zst',
+    'lz4': '.tar.lz4',
+}
+
+# Binaries already found in the PATH, looked up once by a long-running
+# process.
+located_binaries = set()
+
+
 def create_sub_repository(repository_path, sub_directory):
     sub_repository = ''.join([
         repository_path,
@@ -18,18 +43,50 @@ def create_sub_repository(repository_path, sub_directory):
     return sub_repository
 
 
-def prepare_archive_path(archive_sub_repository, prefix, compress):
+def prepare_archive_path(archive_sub_repository, prefix, compression,
+                         deduplicate=False, chain=None):
+    # Several chains share a repository, the name of the chain keeps
+    # their backups of the same second apart.
     archive_path = ''.join([
         archive_sub_repository,
         '/',
         prefix,
         'backup_',
-        datetime.datetime.now().strftime("%Y%m%d_%H%M")])
-    if compress:
-        archive_path = archive_path + '.tar.gz'
-    else:
-        archive_path = archive_path + '.tar'
-    return archive_path
+        datetime.datetime.now().strftime("%Y%m%d_%H%M%S")])
+    if chain:
+        archive_path += '_' + CHAIN_NAME_PATTERN.sub('-', chain)
+    return archive_path + get_archive_extension(compression, deduplicate)
+
+
+def get_archive_extension(compression, deduplicate=False):
+    if deduplicate:
+        return MANIFEST_EXTENSION
+    if compression:
+        return ARCHIVE_EXTENSIONS[compression]
+    return '.tar'
+
+
+def is_manifest(archive_path):
+    return archive_path.endswith(MANIFEST_EXTENSION)
+
+
+def is_archive(archive_path):
+    extensions = ['.tar', MANIFEST_EXTENSION] + list(
+        ARCHIVE_EXTENSIONS.values())
+    return any(archive_path.endswith(extension) for extension in extensions)
+
+
+def get_checksum_path(archive_path):
+    return archive_path + CHECKSUM_EXTENSION
+
+
+def get_archive_compression(archive_path):
+    for compression, extension in ARCHIVE_EXTENSIONS.items():
+        if archive_path.endswith(extension):
+            return compression
+    if archive_path.endswith('.tar'):
+        return None
+    return 'gzip'
 
 
 def mkdir_path(path, mode):
@@ -44,8 +101,11 @@ def mkdir_path(path, mode):
 
 def check_required_binaries(binaries):
     for binary in binaries:
-        if spawn.find_executable(binary) is None:
+        if binary in located_binaries:
+            continue
+        if which(binary) is None:
             raise ProgramError("Cannot locate binary: " + binary)
+        located_binaries.add(binary)
 
 
 def check_path_existence(path):
@@ -61,14 +121,94 @@ def retrieve_value_from_file(path, pattern):
                 return value.group(1)
 
 
-def write_array_to_file(path, array):
-    with open(path, 'w') as fp:
-        for item in array:
-            fp.write(item + '\n')
+def read_checkpoints(path):
+    checkpoints = {}
+    with open(path) as checkpoints_file:
+        for line in checkpoints_file:
+            if '=' in line:
+                key, value = line.split('=', 1)
+                checkpoints[key.strip()] = value.strip()
+    return checkpoints
+
+
+def parse_size(value):
+    value = value.strip().upper()
+    if value and value[-1] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    try:
+        return int(value)
+    except ValueError:
+        raise ProgramError("Invalid size: " + value)
 
 
-def move_file(origin_path, destination_path):
-    move(origin_path, destination_path)
+def get_file_size(path):
+    return os.path.getsize(path)
+
+
+def get_directory_size(path):
+    size = 0
+    for root, directories, files in os.walk(path):
+        for file_name in files:
+            size += os.lstat(os.path.join(root, file_name)).st_size
+    return size
+
+
+def get_available_memory():
+    try:
+        available = retrieve_value_from_file('/proc/meminfo',
+                                             r'^MemAvailable:\s+(\d+) kB$')
+    except IOError:
+        return None
+    if available is None:
+        return None
+    return int(available) * 1024
+
+
+def scan_files(path, excluded_directories=()):
+    directories = [path]
+    while directories:
+        for entry in os.scandir(directories.pop()):
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in excluded_directories:
+                    directories.append(entry.path)
+            else:
+                yield entry.path, entry.stat(follow_symlinks=False)
+
+
+def delete_empty_directories(path, root):
+    path = os.path.abspath(path)
+    root = os.path.abspath(root)
+    while path != root and path.startswith(root + os.sep):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+        path = os.path.dirname(path)
+
+
+def move_file(origin_path, destination_path, rate_limiter=None):
+    if rate_limiter is None or is_same_device(
+            origin_path, os.path.dirname(destination_path)):
+        move(origin_path, destination_path)
+        return
+    with open(origin_path, 'rb') as origin:
+        with open(destination_path, 'wb') as destination:
+            while True:
+                data = origin.read(1024 * 1024)
+                if not data:
+                    break
+                rate_limiter.consume(len(data))
+                destination.write(data)
+    os.unlink(origin_path)
+
+
+def is_same_device(path, other_path):
+    return os.stat(path).st_dev == os.stat(other_path).st_dev
+
+
+def delete_file_if_exists(path):
+    if os.path.isfile(path):
+        os.unlink(path)
 
 
 def delete_directory_if_exists(path):
@@ -76,13 +216,8 @@ def delete_directory_if_exists(path):
         rmtree(path)
 
 
-def clean_directory(path):
-    for file_object in os.listdir(path):
-        file_path = os.path.join(path, file_object)
-        if os.path.islink(file_path) or os.path.isfile(file_path):
-            os.unlink(file_path)
-        else:
-            rmtree(file_path)
+def clean_directory(path, threads=CLEAN_THREADS):
+    delete_contents(path, threads)
 
 
 def split_path(path):
@@ -91,5 +226,6 @@ def split_path(path):
 
 
 def get_prefixed_file_in_dir(directory, prefix):
-    files = glob(''.join([directory, '/', prefix, '*']))
+    files = [path for path in glob(''.join([directory, '/', prefix, '*']))
+             if not path.endswith(CHECKSUM_EXTENSION)]
     return files[0]
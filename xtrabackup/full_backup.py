@@ -17,16 +17,80 @@ Options:
     MySQL user.
     --password=<pwd>            \
     MySQL password.
+    --socket=<socket>           \
+    MySQL server socket.
+    --host=<host>               \
+    MySQL server host.
+    --port=<port>               \
+    MySQL server port.
+    --chain=<name>              \
+    Name of the backup chain in the repository catalog [default: default].
     --tmp-dir=<tmp>             \
     Temporary directory [default: /tmp].
     --log-file=<log>            \
     Log file [default: /var/log/mysql/pyxtrabackup.log].
     --out-file=<log>            \
     Output file [default: /var/log/mysql/xtrabackup.out].
+    --out-file-size=<size>      \
+    Compress the output file aside beyond this size, 0 to never rotate \
+[default: 100M].
+    --out-file-count=<count>    \
+    Rotated output files kept [default: 5].
+    --out-on-failure            \
+    Only write the output of the commands that failed.
+    --out-per-job               \
+    Write the output of each job in its own file next to the output file.
     --backup-threads=<threads>  \
     Threads count [default: 1].
     --no-compress               \
     Do not create a compressed archive of the backup.
+    --stream                    \
+    Stream the backup directly into the repository archive.
+    --compression=<algorithm>   \
+    Compression algorithm: gzip, zstd or lz4 [default: gzip].
+    --compression-level=<level> \
+    Compression level, defaults to the algorithm default.
+    --compress-threads=<count>  \
+    Compression processes count [default: 1].
+    --dedup                     \
+    Store the backup as deduplicated chunks in the repository.
+    --databases=<names>         \
+    Only back up these databases or database.table names, space separated.
+    --tables=<regex>            \
+    Only back up the tables whose database.table name matches this regex.
+    --tables-file=<path>        \
+    Only back up the database.table names listed in this file.
+    --storage=<location>        \
+    Store the archives in a directory, s3://<bucket>/<prefix> or \
+sftp://<user>@<host>/<path> instead of the repository.
+    --upload-threads=<count>    \
+    Concurrent uploads of archive parts to S3 [default: 4].
+    --upload-part-size=<size>   \
+    Size of the archive parts uploaded to S3 [default: 64M].
+    --no-resume                 \
+    Start over instead of resuming the stages of a failed run.
+    --resume-max-age=<hours>    \
+    Only resume a failed run started within this delay [default: 24].
+    --io-rate=<MB/s>            \
+    Maximum I/O rate of the copy, archive and transfer stages.
+    --nice=<increment>          \
+    Niceness increment of the backup processes.
+    --ionice-class=<class>      \
+    I/O scheduling class: idle, best-effort or realtime.
+    --latency-threshold=<ms>    \
+    Halve the I/O rate while the fsync latency is above this value.
+    --latency-probe-dir=<dir>   \
+    Directory on the data volume used to probe the fsync latency.
+    --report-file=<path>        \
+    Write a JSON report of the run stages.
+    --prometheus-file=<path>    \
+    Write the run metrics for the Prometheus textfile collector.
+    --progress-file=<path>      \
+    Keep the progress of the running stage in this JSON file.
+    --progress-url=<url>        \
+    Post the progress of the running stage to this URL.
+    --progress-interval=<sec>   \
+    Progress reporting interval [default: 60].
     --webhook=<url>             \
     Webhook post backup. If enable will post backup information in JSON format.
 
@@ -37,19 +101,52 @@ import logging
 from xtrabackup.backup_tools import BackupTool
 
 
+def run(arguments, log_name=None):
+    backup_tool = BackupTool(
+        arguments['--log-file'], arguments['--out-file'],
+        arguments['--no-compress'], arguments['--debug'],
+        arguments['--stream'], arguments['--compression'],
+        arguments['--compression-level'],
+        arguments['--compress-threads'], arguments['--dedup'],
+        arguments['--socket'], arguments['--host'],
+        arguments['--port'],
+        io_rate=arguments['--io-rate'],
+        nice=arguments['--nice'],
+        ionice_class=arguments['--ionice-class'],
+        latency_threshold=arguments['--latency-threshold'],
+        latency_probe_dir=arguments['--latency-probe-dir'],
+        report_file=arguments['--report-file'],
+        prometheus_file=arguments['--prometheus-file'],
+        progress_file=arguments['--progress-file'],
+        progress_url=arguments['--progress-url'],
+        progress_interval=arguments['--progress-interval'],
+        storage=arguments['--storage'],
+        upload_threads=arguments['--upload-threads'],
+        upload_part_size=arguments['--upload-part-size'],
+        out_file_size=arguments['--out-file-size'],
+        out_file_count=arguments['--out-file-count'],
+        out_on_failure=arguments['--out-on-failure'],
+        out_per_job=arguments['--out-per-job'],
+        databases=arguments['--databases'],
+        tables=arguments['--tables'],
+        tables_file=arguments['--tables-file'],
+        resume=not arguments['--no-resume'],
+        resume_max_age=arguments['--resume-max-age'],
+        chain=arguments['--chain'],
+        log_name=log_name)
+
+    backup_tool.start_full_backup(arguments['<repository>'],
+                                  arguments['--tmp-dir'],
+                                  arguments['--user'],
+                                  arguments['--password'],
+                                  arguments['--backup-threads'],
+                                  arguments['--webhook'])
+
+
 def main():
     arguments = docopt(__doc__, version='3.1.6')
     try:
-        backup_tool = BackupTool(
-            arguments['--log-file'], arguments['--out-file'],
-            arguments['--no-compress'], arguments['--debug'])
-
-        backup_tool.start_full_backup(arguments['<repository>'],
-                                      arguments['--tmp-dir'],
-                                      arguments['--user'],
-                                      arguments['--password'],
-                                      arguments['--backup-threads'],
-                                      arguments['--webhook'])
+        run(arguments)
     except Exception:
         logger = logging.getLogger(__name__)
         logger.error("pyxtrabackup failed.", exc_info=arguments['--debug'])
@@ -0,0 +1,54 @@
+"""Xtrabackup script
+
+Usage:
+    pyxtrabackup-gc <repository> [options]
+    pyxtrabackup-gc (-h | --help)
+    pyxtrabackup --version
+
+
+Options:
+    -h --help                   \
+    Show this screen.
+    -d --debug                  \
+    Enable verbose error
+    --version                   \
+    Show version.
+    --dry-run                   \
+    Only report the chunks that would be deleted.
+    --grace-period=<hours>      \
+    Keep unreferenced chunks younger than this [default: 24].
+    --log-file=<log>            \
+    Log file [default: /var/log/mysql/pyxtrabackup-gc.log].
+
+"""
+from docopt import docopt
+import sys
+import logging
+from xtrabackup.chunk_store import collect_garbage
+import xtrabackup.log_manager as log_manager
+
+
+def main():
+    arguments = docopt(__doc__, version='3.1.6')
+    logger = logging.getLogger(__name__)
+    try:
+        log_manager.LogManager().attach_file_handler(
+            logger, arguments['--log-file'])
+        deleted_chunks, deleted_bytes = collect_garbage(
+            arguments['<repository>'],
+            arguments['--dry-run'],
+            float(arguments['--grace-period']) * 3600)
+        if arguments['--dry-run']:
+            logger.info("Unreferenced chunks: %s - Reclaimable: %s bytes",
+                        deleted_chunks, deleted_bytes)
+        else:
+            logger.info("Deleted chunks: %s - Reclaimed: %s bytes",
+                        deleted_chunks, deleted_bytes)
+    except Exception:
+        logger.error("pyxtrabackup-gc failed.", exc_info=arguments['--debug'])
+        exit(1)
+    exit(0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import logging
+import os
 
 
 class LogManager:
@@ -7,6 +8,10 @@ class LogManager:
         logging.basicConfig(level=logging.INFO)
 
     def attach_file_handler(self, logger, log_file):
+        for handler in logger.handlers:
+            if (isinstance(handler, logging.FileHandler) and
+                    handler.baseFilename == os.path.abspath(log_file)):
+                return
         try:
             handler = logging.FileHandler(log_file)
         except Exception as error:
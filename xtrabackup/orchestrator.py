@@ -0,0 +1,71 @@
+"""Xtrabackup script
+
+Usage:
+    pyxtrabackup-orchestrator <inventory> [options]
+    pyxtrabackup-orchestrator (-h | --help)
+    pyxtrabackup --version
+
+
+Options:
+    -h --help                   \
+    Show this screen.
+    -d --debug                  \
+    Enable verbose error
+    --version                   \
+    Show version.
+    --concurrency=<jobs>        \
+    Maximum number of backups running at the same time [default: 2].
+    --disk-slots=<jobs>         \
+    Maximum number of backups reading the same disk [default: 1].
+    --repository-slots=<jobs>   \
+    Maximum number of backups writing to the same device [default: 1].
+    --disk-rate=<MB/s>          \
+    Read budget of each disk, shared by its slots.
+    --repository-rate=<MB/s>    \
+    Write budget of each repository device, shared by its slots.
+    --tmp-dir=<tmp>             \
+    Temporary directory, one sub-directory per instance [default: /tmp].
+    --out-dir=<dir>             \
+    Directory of the per-instance log and output files \
+[default: /var/log/mysql].
+    --log-file=<log>            \
+    Log file [default: /var/log/mysql/pyxtrabackup-orchestrator.log].
+
+"""
+from docopt import docopt
+import sys
+import logging
+from xtrabackup.backup_scheduler import BackupScheduler, load_inventory
+import xtrabackup.log_manager as log_manager
+
+
+def main():
+    arguments = docopt(__doc__, version='3.1.6')
+    logger = logging.getLogger(__name__)
+    try:
+        log_manager.LogManager().attach_file_handler(
+            logger, arguments['--log-file'])
+        scheduler = BackupScheduler(
+            load_inventory(arguments['<inventory>']),
+            arguments['--tmp-dir'],
+            arguments['--out-dir'],
+            int(arguments['--concurrency']),
+            int(arguments['--disk-slots']),
+            int(arguments['--repository-slots']),
+            arguments['--disk-rate'],
+            arguments['--repository-rate'])
+        jobs = scheduler.run()
+        for job in jobs:
+            logger.info("Instance: %s - Status: %s - Duration: %s",
+                        job.name, job.status, job.duration)
+    except Exception:
+        logger.error("pyxtrabackup-orchestrator failed.",
+                     exc_info=arguments['--debug'])
+        exit(1)
+    if any(job.status != 'success' for job in jobs):
+        exit(1)
+    exit(0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
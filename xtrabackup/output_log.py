@@ -0,0 +1,134 @@
+import collections
+import gzip
+import os
+import shutil
+import threading
+import xtrabackup.filesystem_utils as filesystem_utils
+
+
+OUTPUT_MAX_SIZE = '100M'
+OUTPUT_FILES = 5
+FAILURE_BUFFER_LINES = 5000
+ROTATED_EXTENSION = '.gz'
+
+
+def get_job_path(path, job):
+    root, extension = os.path.splitext(path)
+    return '%s.%s%s' % (root, job, extension)
+
+
+def get_rotated_path(path, index):
+    return '%s.%d%s' % (path, index, ROTATED_EXTENSION)
+
+
+class RotatingFile:
+    """Output file compressed aside once it grows beyond a maximum size.
+
+    The rotated files are named <path>.1.gz (the most recent one) up to
+    <path>.<files>.gz, older files are deleted.
+    """
+
+    def __init__(self, path, max_size=None, files=OUTPUT_FILES):
+        self.path = path
+        self.max_size = max_size
+        self.files = files
+        self.lock = threading.Lock()
+        self.output_file = open(path, 'ab')
+        self.size = self.output_file.tell()
+
+    def rotate(self):
+        self.output_file.close()
+        filesystem_utils.delete_file_if_exists(
+            get_rotated_path(self.path, self.files))
+        for index in range(self.files - 1, 0, -1):
+            rotated_path = get_rotated_path(self.path, index)
+            if os.path.exists(rotated_path):
+                os.rename(rotated_path, get_rotated_path(self.path,
+                                                         index + 1))
+        if self.files > 0:
+            with open(self.path, 'rb') as input_file:
+                with gzip.open(get_rotated_path(self.path, 1),
+                               'wb') as rotated_file:
+                    shutil.copyfileobj(input_file, rotated_file)
+        self.output_file = open(self.path, 'wb')
+        self.size = 0
+
+    def write(self, data):
+        with self.lock:
+            if (self.max_size and self.size and
+                    self.size + len(data) > self.max_size):
+                self.rotate()
+            self.output_file.write(data)
+            self.size += len(data)
+
+    def flush(self):
+        with self.lock:
+            self.output_file.flush()
+
+    def close(self, failed=False):
+        with self.lock:
+            self.output_file.close()
+
+
+class FailureBuffer:
+    """Last lines of a command output, only written when it fails."""
+
+    def __init__(self, output_file, job=None, lines=FAILURE_BUFFER_LINES):
+        self.output_file = output_file
+        self.job = job
+        self.lines = collections.deque(maxlen=lines)
+        self.dropped = 0
+
+    def write(self, data):
+        if len(self.lines) == self.lines.maxlen:
+            self.dropped += 1
+        self.lines.append(data)
+
+    def flush(self):
+        pass
+
+    def close(self, failed=False):
+        try:
+            if failed:
+                self.output_file.write(
+                    ('--- Failed %s: %d earlier lines dropped ---\n' % (
+                        self.job or 'command', self.dropped)).encode())
+                for line in self.lines:
+                    self.output_file.write(line)
+        finally:
+            self.lines.clear()
+            self.output_file.close()
+
+
+class OutputLog:
+    """Destination of the output of the commands run by the tools.
+
+    Each command, or job, opens its own writer: the output file, or a
+    file next to it named after the job, capped in size and rotated. In
+    failure mode, the output is held in memory and only written when the
+    command fails.
+    """
+
+    def __init__(self, path, max_size=OUTPUT_MAX_SIZE, files=OUTPUT_FILES,
+                 on_failure=False, per_job=False):
+        self.path = path
+        self.max_size = filesystem_utils.parse_size(str(max_size or 0))
+        self.files = max(0, int(files))
+        self.on_failure = on_failure
+        self.per_job = per_job
+
+    def check(self):
+        with open(self.path, 'a+'):
+            pass
+
+    def get_path(self, job=None):
+        if self.per_job and job:
+            return get_job_path(self.path, job)
+        return self.path
+
+    def open(self, job=None):
+        output_file = RotatingFile(self.get_path(job), self.max_size,
+                                   self.files)
+        if self.on_failure:
+            return FailureBuffer(output_file, job)
+        return output_file
@@ -0,0 +1,63 @@
+import errno
+import grp
+import os
+import pwd
+import threading
+from xtrabackup.cleanup import list_directory, walk_directories
+from xtrabackup.exception import ProgramError
+
+
+MYSQL_USER = 'mysql'
+MYSQL_GROUP = 'mysql'
+OWNER_THREADS = 8
+
+
+def get_owner(user=MYSQL_USER, group=MYSQL_GROUP):
+    try:
+        return pwd.getpwnam(user).pw_uid, grp.getgrnam(group).gr_gid
+    except KeyError:
+        raise ProgramError("Unknown owner: %s:%s" % (user, group))
+
+
+def set_owner(path, uid, gid):
+    status = os.lstat(path)
+    if status.st_uid == uid and status.st_gid == gid:
+        return False
+    os.lchown(path, uid, gid)
+    return True
+
+
+class TreeOwner:
+    """Gives a directory tree to an owner, with a pool of threads listing
+    the directories with os.scandir.
+
+    Only the files with another owner are changed, the files already
+    owned when they were extracted just cost a lstat.
+    """
+
+    def __init__(self, uid, gid, threads=OWNER_THREADS):
+        self.uid = uid
+        self.gid = gid
+        self.threads = threads
+        self.lock = threading.Lock()
+        self.checked = 0
+        self.changed = 0
+
+    def set_directory_owner(self, path):
+        files, directories = list_directory(path)
+        changed = 0
+        for entry_path in files + directories:
+            try:
+                changed += set_owner(entry_path, self.uid, self.gid)
+            except OSError as error:
+                if error.errno != errno.ENOENT:
+                    raise
+        with self.lock:
+            self.checked += len(files) + len(directories)
+            self.changed += changed
+        return directories
+
+    def apply(self, path):
+        self.checked = 1
+        self.changed = int(set_owner(path, self.uid, self.gid))
+        walk_directories(path, self.set_directory_owner, self.threads)
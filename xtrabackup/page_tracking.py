@@ -0,0 +1,104 @@
+import math
+import os
+
+
+TRACKING_VARIABLES = ['innodb_track_changed_pages', 'innodb_page_size',
+                      'datadir']
+DEFAULT_PAGE_SIZE = 16384
+DELTA_EXTENSION = '.delta'
+TABLESPACE_EXTENSIONS = ('.ibd', '.ibu')
+TABLESPACE_PREFIXES = ('ibdata', 'undo')
+LOCAL_HOSTS = ['localhost', '127.0.0.1', '::1']
+
+
+def parse_server_variables(output):
+    variables = {}
+    for line in output.splitlines():
+        if '\t' in line:
+            name, value = line.split('\t', 1)
+            variables[name.strip().lower()] = value.strip()
+    return variables
+
+
+def is_tracking_enabled(variables):
+    return variables.get('innodb_track_changed_pages', '').upper() in [
+        'ON', '1']
+
+
+def get_page_size(variables):
+    try:
+        return int(variables.get('innodb_page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+
+
+def count_delta_pages(size, page_size):
+    # A delta file is made of groups of pages, each one starting with a
+    # header page listing the page numbers of the group.
+    pages = size // page_size
+    return pages - int(math.ceil(pages * 4.0 / page_size))
+
+
+def is_tablespace(file_name):
+    return (file_name.endswith(TABLESPACE_EXTENSIONS) or
+            file_name.startswith(TABLESPACE_PREFIXES))
+
+
+def is_local_host(host):
+    return not host or host in LOCAL_HOSTS
+
+
+def get_tablespace_pages(datadir, page_size):
+    # The system and undo tablespaces are at the root of the datadir, the
+    # file-per-table tablespaces in the directory of their database.
+    if not datadir or not os.path.isdir(datadir):
+        return None
+    size = 0
+    for entry in os.scandir(datadir):
+        if entry.is_dir(follow_symlinks=False):
+            for table_entry in os.scandir(entry.path):
+                if (table_entry.name.endswith(TABLESPACE_EXTENSIONS) and
+                        table_entry.is_file(follow_symlinks=False)):
+                    size += table_entry.stat(follow_symlinks=False).st_size
+        elif is_tablespace(entry.name):
+            size += entry.stat(follow_symlinks=False).st_size
+    return size // page_size
+
+
+def find_delta_sizes(directory):
+    for root, directories, files in os.walk(directory):
+        for file_name in files:
+            if file_name.endswith(DELTA_EXTENSION):
+                yield os.lstat(os.path.join(root, file_name)).st_size
+
+
+class PageScan:
+    """Pages read by an incremental backup.
+
+    A full scan reads every page of every tablespace, the changed page
+    bitmaps only point to the pages modified since the last backup.
+    The copied pages are counted from the delta files of the backup.
+    """
+
+    def __init__(self, mode, delta_sizes, page_size, total_pages):
+        self.mode = mode
+        self.changed_pages = None
+        if delta_sizes is not None:
+            self.changed_pages = sum(count_delta_pages(size, page_size)
+                                     for size in delta_sizes)
+        self.total_pages = total_pages
+        if mode == 'bitmap':
+            self.scanned_pages = self.changed_pages
+        else:
+            self.scanned_pages = total_pages
+        self.skipped_pages = None
+        if total_pages is not None and self.scanned_pages is not None:
+            self.skipped_pages = max(0, total_pages - self.scanned_pages)
+
+    def to_dict(self):
+        return {
+            'scan_mode': self.mode,
+            'pages_changed': self.changed_pages,
+            'pages_scanned': self.scanned_pages,
+            'pages_skipped': self.skipped_pages,
+        }
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import threading
+from xtrabackup.exception import ProcessError, ProgramError
+import xtrabackup.telemetry as telemetry
+
+
+def wait_process(process):
+    if process.returncode is not None:
+        return process.returncode
+    pid, status, usage = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    telemetry.record_child_usage(usage)
+    return process.returncode
+
+
+class FunctionStage:
+
+    def __init__(self, name, function):
+        self.name = name
+        self.function = function
+        self.error = None
+
+    def run(self, input_stream, output_stream, close_output):
+        try:
+            self.function(input_stream, output_stream)
+            output_stream.flush()
+        except Exception as error:
+            self.error = error
+        finally:
+            if input_stream is not None:
+                input_stream.close()
+            if close_output:
+                output_stream.close()
+
+
+class Pipeline:
+
+    def __init__(self, stages, error_file):
+        self.stages = stages
+        self.error_file = error_file
+        self.processes = []
+        self.threads = []
+
+    def start_process(self, command, source, sink):
+        process = subprocess.Popen(command, stdin=source, stdout=sink,
+                                   stderr=self.error_file, close_fds=True)
+        self.processes.append((command, process))
+        return process
+
+    def start_thread(self, stage, source, sink, close_sink):
+        thread = threading.Thread(target=stage.run,
+                                  args=(source, sink, close_sink))
+        thread.daemon = True
+        thread.start()
+        self.threads.append((stage, thread))
+
+    def run(self, output_stream):
+        source = None
+        for index, stage in enumerate(self.stages):
+            last_stage = index == len(self.stages) - 1
+            if isinstance(stage, FunctionStage):
+                if last_stage:
+                    sink = output_stream
+                else:
+                    read_fd, write_fd = os.pipe()
+                    sink = os.fdopen(write_fd, 'wb')
+                self.start_thread(stage, source, sink, not last_stage)
+                source = None if last_stage else os.fdopen(read_fd, 'rb')
+            else:
+                sink = output_stream if last_stage else subprocess.PIPE
+                process = self.start_process(stage, source, sink)
+                if source is not None:
+                    source.close()
+                source = process.stdout
+        self.wait()
+
+    def wait(self):
+        for command, process in self.processes:
+            wait_process(process)
+        for stage, thread in self.threads:
+            thread.join()
+        for command, process in reversed(self.processes):
+            if process.returncode != 0:
+                raise ProcessError(command, process.returncode)
+        for stage, thread in self.threads:
+            if stage.error is not None:
+                raise ProgramError("Pipeline stage '%s' failed: %s" % (
+                    stage.name, str(stage.error)))
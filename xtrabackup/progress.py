@@ -0,0 +1,197 @@
+import json
+import os
+import re
+import threading
+import time
+import xtrabackup.filesystem_utils as filesystem_utils
+from xtrabackup.http_manager import HttpManager
+from xtrabackup.telemetry import write_atomically
+
+
+DATA_DIRECTORY_PATTERN = re.compile(r'cd to (\S+)')
+FILE_START_PATTERN = re.compile(
+    r'(?:\[(\d+)\]\s+)?(?:Copying|Streaming) (\S+)')
+FILE_DONE_PATTERN = re.compile(
+    r'(?:\[(\d+)\]\s+)?(?:\.\.\.done|Done: (?:Copying|Streaming) (\S+))')
+LSN_PATTERN = re.compile(r'log scanned up to \((\d+)\)')
+SCAN_MODE_PATTERN = re.compile(r'using the (changed page bitmap|full scan)')
+TAR_BYTES_PATTERN = re.compile(r'^tar: (\d+) \(')
+SCAN_MODES = {
+    'changed page bitmap': 'bitmap',
+    'full scan': 'full',
+}
+
+
+class ProgressMonitor:
+
+    def __init__(self, logger, status_file=None, webhook_url=None,
+                 interval=60):
+        self.logger = logger
+        self.status_file = status_file
+        self.webhook_url = webhook_url
+        self.interval = float(interval)
+        self.http = HttpManager()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.stage = None
+        self.scan_mode = None
+
+    def start(self, stage, base_directory=None, total_bytes=None):
+        with self.lock:
+            self.stage = stage
+            self.base_directory = base_directory
+            self.total_bytes = total_bytes
+            self.done_bytes = 0
+            self.done_files = 0
+            self.current_files = {}
+            self.lsn = None
+            self.scan_mode = None
+            self.start_clock = time.monotonic()
+            self.last_activity = self.start_clock
+            self.last_sample = (self.start_clock, 0)
+            self.throughput = 0.0
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self, status='success'):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.publish(status)
+
+    def get_file_size(self, path):
+        if self.base_directory:
+            path = os.path.join(self.base_directory, path)
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def file_done(self, path):
+        self.done_files += 1
+        self.done_bytes += self.get_file_size(path)
+        self.last_activity = time.monotonic()
+
+    def parse_line(self, line):
+        with self.lock:
+            if self.stage is None:
+                return
+            match = LSN_PATTERN.search(line)
+            if match:
+                self.lsn = int(match.group(1))
+                return
+            match = SCAN_MODE_PATTERN.search(line)
+            if match:
+                self.scan_mode = SCAN_MODES[match.group(1)]
+                return
+            match = DATA_DIRECTORY_PATTERN.search(line)
+            if match and self.base_directory is None:
+                self.base_directory = match.group(1)
+                return
+            match = FILE_DONE_PATTERN.search(line)
+            if match:
+                path = match.group(2) or self.current_files.pop(
+                    match.group(1), None)
+                if path:
+                    self.file_done(path)
+                return
+            match = FILE_START_PATTERN.search(line)
+            if match:
+                self.current_files[match.group(1)] = match.group(2)
+                self.last_activity = time.monotonic()
+                return
+            match = TAR_BYTES_PATTERN.search(line)
+            if match:
+                self.done_bytes = int(match.group(1))
+                self.last_activity = time.monotonic()
+
+    def get_status(self):
+        if self.total_bytes is None and self.base_directory:
+            self.total_bytes = filesystem_utils.get_directory_size(
+                self.base_directory)
+        with self.lock:
+            now = time.monotonic()
+            sample_time, sample_bytes = self.last_sample
+            if now > sample_time:
+                self.throughput = (self.done_bytes - sample_bytes) / (
+                    now - sample_time)
+            self.last_sample = (now, self.done_bytes)
+            status = {
+                'stage': self.stage,
+                'timestamp': time.time(),
+                'elapsed_seconds': now - self.start_clock,
+                'idle_seconds': now - self.last_activity,
+                'files': self.done_files,
+                'bytes': self.done_bytes,
+                'total_bytes': self.total_bytes,
+                'throughput': self.throughput,
+                'lsn': self.lsn,
+                'progress': None,
+                'eta_seconds': None,
+            }
+        if self.total_bytes:
+            status['progress'] = min(1.0, float(status['bytes']) /
+                                     self.total_bytes)
+            if status['bytes']:
+                average_throughput = status['bytes'] / status[
+                    'elapsed_seconds']
+                status['eta_seconds'] = max(
+                    0, self.total_bytes - status['bytes']) / average_throughput
+        return status
+
+    def publish(self, state='running'):
+        status = self.get_status()
+        status['state'] = state
+        self.logger.info(
+            "Progress %s: %s files - %.1f MB - %s - %.1f MB/s - ETA: %s\
+ - LSN: %s",
+            status['stage'], status['files'], status['bytes'] / 1048576.0,
+            '%.1f%%' % (status['progress'] * 100)
+            if status['progress'] is not None else 'unknown',
+            status['throughput'] / 1048576.0,
+            '%ds' % status['eta_seconds']
+            if status['eta_seconds'] is not None else 'unknown',
+            status['lsn'])
+        try:
+            if self.status_file:
+                write_atomically(self.status_file,
+                                 json.dumps(status, sort_keys=True))
+            if self.webhook_url:
+                self.http.post(self.webhook_url, status)
+        except Exception as error:
+            self.logger.warning("Unable to publish the progress: %s",
+                                str(error))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.publish()
+
+
+class OutputReader:
+
+    def __init__(self, output_file, monitor):
+        self.output_file = output_file
+        self.monitor = monitor
+        read_fd, write_fd = os.pipe()
+        self.reader = os.fdopen(read_fd, 'rb')
+        self.writer = os.fdopen(write_fd, 'wb')
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        for line in iter(self.reader.readline, b''):
+            self.output_file.write(line)
+            self.output_file.flush()
+            if self.monitor is not None:
+                self.monitor.parse_line(
+                    line.decode('utf-8', 'replace').strip())
+        self.reader.close()
+
+    def close(self):
+        self.writer.close()
+        self.thread.join()
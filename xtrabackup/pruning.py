@@ -0,0 +1,84 @@
+"""Xtrabackup script
+
+Usage:
+    pyxtrabackup-prune <repository> [options]
+    pyxtrabackup-prune (-h | --help)
+    pyxtrabackup --version
+
+
+Options:
+    -h --help                   \
+    Show this screen.
+    -d --debug                  \
+    Enable verbose error
+    --version                   \
+    Show version.
+    --dry-run                   \
+    Only report the backups that would be deleted.
+    --keep-last=<count>         \
+    Keep the last backups of each chain [default: 1].
+    --keep-daily=<count>        \
+    Keep the last backup of this many days [default: 7].
+    --keep-weekly=<count>       \
+    Keep the last backup of this many weeks [default: 4].
+    --keep-monthly=<count>      \
+    Keep the last backup of this many months [default: 12].
+    --chain=<name>              \
+    Only prune this chain of the catalog, defaults to all the chains.
+    --scan                      \
+    Find the backups by scanning the repository instead of the catalog.
+    --threads=<count>           \
+    Concurrent deletions [default: 4].
+    --log-file=<log>            \
+    Log file [default: /var/log/mysql/pyxtrabackup-prune.log].
+
+"""
+from docopt import docopt
+import sys
+import logging
+from xtrabackup.retention import RetentionPolicy, prune_repository
+import xtrabackup.log_manager as log_manager
+
+
+def main():
+    arguments = docopt(__doc__, version='3.1.6')
+    logger = logging.getLogger(__name__)
+    try:
+        log_manager.LogManager().attach_file_handler(
+            logger, arguments['--log-file'])
+        policy = RetentionPolicy(arguments['--keep-last'],
+                                 arguments['--keep-daily'],
+                                 arguments['--keep-weekly'],
+                                 arguments['--keep-monthly'])
+        result = prune_repository(arguments['<repository>'], policy,
+                                  arguments['--chain'],
+                                  arguments['--dry-run'],
+                                  arguments['--threads'],
+                                  arguments['--scan'])
+        for backup in result.pruned:
+            logger.info("%s: %s (%s, %s, %s bytes)",
+                        'Prunable backup' if arguments['--dry-run']
+                        else 'Pruned backup', backup.archive_path,
+                        backup.chain, backup.kind, backup.size)
+        for backup, error in result.failures:
+            logger.error("Unable to prune backup: %s - %s",
+                         backup.archive_path, str(error))
+        if arguments['--dry-run']:
+            logger.info("Kept backups: %s - Prunable backups: %s\
+ - Reclaimable: %s bytes", len(result.kept), len(result.pruned),
+                        result.bytes)
+        else:
+            logger.info("Kept backups: %s - Pruned backups: %s\
+ - Reclaimed: %s bytes", len(result.kept), len(result.pruned),
+                        result.bytes)
+    except Exception:
+        logger.error("pyxtrabackup-prune failed.",
+                     exc_info=arguments['--debug'])
+        exit(1)
+    if result.failures:
+        exit(1)
+    exit(0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
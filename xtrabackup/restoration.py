@@ -3,15 +3,8 @@
 Usage:
     pyxtrabackup-restore --base-archive=<base_archive_path> \
 --incremental-archive=<incremental_archive_path> \
---user=<user> \
-[--password=<pwd>] \
-[--data-dir=<data_dir>] \
-[--restart] \
-[--tmp-dir=<tmp>] \
-[--log-file=<log>] \
-[--out-file=<log>] \
-[--backup-threads=<threads>] \
-[--uncompressed-archives]
+--user=<user> [options]
+    pyxtrabackup-restore --repository=<repository> --user=<user> [options]
     pyxtrabackup-restore (-h | --help)
     pyxtrabackup --version
 
@@ -25,10 +18,32 @@ Options:
     MySQL user.
     --password=<pwd>                            \
     MySQL password.
+    --socket=<socket>                           \
+    MySQL server socket, used to import the restored tables.
+    --host=<host>                               \
+    MySQL server host, used to import the restored tables.
+    --port=<port>                               \
+    MySQL server port, used to import the restored tables.
     --base-archive=<archive_path>               \
-    Base backup.
+    Base backup, a path or a storage URI.
     --incremental-archive=<archive_path>        \
-    Incremental archive target.
+    Incremental archive target, a path or a storage URI.
+    --repository=<repository>                   \
+    Restore the backups found in the catalog of this repository.
+    --chain=<name>                              \
+    Backup chain to restore from the catalog [default: default].
+    --restore-time=<time>                       \
+    Restore the last backup taken before this time \
+(YYYY-MM-DD HH:MM:SS), defaults to the latest backup.
+    --restore-lsn=<lsn>                         \
+    Restore the last backup ending before this LSN.
+    --plan-only                                 \
+    Only log the backups that would be restored and the estimated duration.
+    --tables=<patterns>                         \
+    Only restore these tables into the running server, comma separated \
+database.table patterns (e.g. shop.orders,archive.*).
+    --export-only                               \
+    Only export the tables into the temporary directory, do not import them.
     --data-dir=<data_dir>                       \
     MySQL server data directory [default: /var/lib/mysql]
     --restart                                   \
@@ -39,16 +54,50 @@ Options:
     Log file [default: /var/log/mysql/pyxtrabackup-restore.log].
     --out-file=<log>                            \
     Output file [default: /var/log/mysql/xtrabackup.out].
+    --out-file-size=<size>                      \
+    Compress the output file aside beyond this size, 0 to never rotate \
+[default: 100M].
+    --out-file-count=<count>                    \
+    Rotated output files kept [default: 5].
+    --out-on-failure                            \
+    Only write the output of the commands that failed.
+    --out-per-job                               \
+    Write the output of each job in its own file next to the output file.
     --backup-threads=<threads>                  \
     Threads count [default: 1].
+    --use-memory=<size>                         \
+    Memory used to apply the backups, auto uses half of the available \
+memory [default: auto].
+    --clean-mode=<mode>                         \
+    How the data directory is emptied: delete, or rename to move it aside \
+and delete it during the restoration [default: delete].
+    --clean-threads=<count>                     \
+    Threads deleting the files of the data directory [default: 8].
+    --chown-threads=<count>                     \
+    Threads giving the restored files to mysql:mysql [default: 8].
+    --restore-io=<mode>                         \
+    Base backup extraction: tar, buffered, direct or dontneed \
+[default: tar].
+    --report-file=<path>                        \
+    Write a JSON report of the run stages.
+    --prometheus-file=<path>                    \
+    Write the run metrics for the Prometheus textfile collector.
     --uncompressed-archives                     \
     Specify that the backup archives are not compressed. \
 Use this option if you did backup with --no-compress.
+    --prefetch=<count>                          \
+    Incremental archives extracted ahead of the one being applied \
+[default: 1].
+    --prefetch-disk-budget=<size>               \
+    Disk space allowed for extracted incremental archives (e.g. 50G).
+    --download-threads=<count>                  \
+    Concurrent ranged reads of the remote archives [default: 4].
 
 """
 from docopt import docopt
 import sys
 import logging
+from xtrabackup.catalog import parse_restore_time
 from xtrabackup.restoration_tools import RestorationTool
 
 
@@ -57,12 +106,40 @@ def main():
     restore_tool = RestorationTool(arguments['--log-file'],
                                    arguments['--out-file'],
                                    arguments['--data-dir'],
-                                   arguments['--uncompressed-archives'])
+                                   arguments['--uncompressed-archives'],
+                                   arguments['--prefetch'],
+                                   arguments['--prefetch-disk-budget'],
+                                   arguments['--backup-threads'],
+                                   arguments['--use-memory'],
+                                   arguments['--restore-io'],
+                                   arguments['--report-file'],
+                                   arguments['--prometheus-file'],
+                                   arguments['--download-threads'],
+                                   arguments['--out-file-size'],
+                                   arguments['--out-file-count'],
+                                   arguments['--out-on-failure'],
+                                   arguments['--out-per-job'],
+                                   arguments['--socket'],
+                                   arguments['--host'],
+                                   arguments['--port'],
+                                   arguments['--tables'],
+                                   arguments['--clean-mode'],
+                                   arguments['--clean-threads'],
+                                   arguments['--chown-threads'])
     try:
-        restore_tool.start_restoration(arguments['--base-archive'],
-                                       arguments['--incremental-archive'],
-                                       arguments['--tmp-dir'],
-                                       arguments['--restart'])
+        restore_tool.start_restoration(
+            arguments['--base-archive'],
+            arguments['--incremental-archive'],
+            arguments['--tmp-dir'],
+            arguments['--restart'],
+            arguments['--repository'],
+            arguments['--chain'],
+            parse_restore_time(arguments['--restore-time']),
+            arguments['--restore-lsn'],
+            arguments['--plan-only'],
+            arguments['--user'],
+            arguments['--password'],
+            arguments['--export-only'])
     except Exception:
         logger = logging.getLogger(__name__)
         logger.error("pyxtrabackup failed.", exc_info=True)
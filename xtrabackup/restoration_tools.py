@@ -1,20 +1,83 @@
+from xtrabackup.catalog import Catalog, find_catalog
+from xtrabackup.checksum import extract_members, read_checksums
+from xtrabackup.cleanup import (BackgroundCleaner, CLEAN_MODES,
+                                CLEAN_THREADS, move_contents_aside)
+from xtrabackup.chunk_store import ChunkStore, find_store_path, read_manifest
 from xtrabackup.command_executor import CommandExecutor
-from xtrabackup.exception import ProcessError
+from xtrabackup.compression import Compressor
+from xtrabackup.exception import ProcessError, ProgramError
+from xtrabackup.output_log import OUTPUT_FILES, OUTPUT_MAX_SIZE, OutputLog
+from xtrabackup.ownership import OWNER_THREADS, TreeOwner, get_owner, set_owner
+from xtrabackup.restore_planner import RestorePlanner
+from xtrabackup.restore_scheduler import IncrementalPrefetcher
+from xtrabackup.storage import (get_archive_size, get_location_path,
+                                is_remote)
+from xtrabackup.table_filter import (SYSTEM_DATABASES, TableFilter,
+                                     describe_filters, get_member_table,
+                                     is_partition, parse_table_patterns)
 import xtrabackup.filesystem_utils as filesystem_utils
 import xtrabackup.log_manager as log_manager
+import xtrabackup.telemetry as telemetry
 import xtrabackup.timer as timer
+import glob
 import logging
+import os
 
 
 class RestorationTool:
 
-    def __init__(self, log_file, output_file, data_dir, uncompressed_archives):
+    def __init__(self, log_file, output_file, data_dir, uncompressed_archives,
+                 prefetch=1, prefetch_disk_budget=None, threads=1,
+                 use_memory='auto', restore_io='tar', report_file=None,
+                 prometheus_file=None, download_threads=4,
+                 out_file_size=OUTPUT_MAX_SIZE, out_file_count=OUTPUT_FILES,
+                 out_on_failure=False, out_per_job=False, socket=None,
+                 host=None, port=None, tables=None, clean_mode='delete',
+                 clean_threads=CLEAN_THREADS, chown_threads=OWNER_THREADS):
         self.log_manager = log_manager.LogManager()
         self.data_dir = data_dir
         self.stop_watch = timer.Timer()
+        self.report = telemetry.RunReport('pyxtrabackup-restore', report_file,
+                                          prometheus_file)
         self.setup_logging(log_file)
-        self.command_executor = CommandExecutor(output_file)
+        self.command_executor = CommandExecutor(
+            OutputLog(output_file, out_file_size, out_file_count,
+                      out_on_failure, out_per_job),
+            self.prepare_connection_options(socket, host, port),
+            download_threads=max(1, int(download_threads)))
         self.compressed_archives = not uncompressed_archives
+        self.prefetch = int(prefetch)
+        if prefetch_disk_budget:
+            self.prefetch_disk_budget = filesystem_utils.parse_size(
+                prefetch_disk_budget)
+        else:
+            self.prefetch_disk_budget = None
+        self.threads = max(1, int(threads))
+        self.use_memory = use_memory
+        self.apply_threads = None
+        self.restore_io = None if restore_io == 'tar' else restore_io
+        self.catalog = None
+        self.extraction_durations = {}
+        if clean_mode not in CLEAN_MODES:
+            raise ProgramError("Unsupported clean mode: " + clean_mode)
+        self.clean_mode = clean_mode
+        self.clean_threads = max(1, int(clean_threads))
+        self.data_dir_cleaner = None
+        self.data_dir_cleaner_stage = None
+        self.chown_threads = max(1, int(chown_threads))
+        self.table_filter = None
+        if tables:
+            self.table_filter = TableFilter(parse_table_patterns(tables))
+
+    def prepare_connection_options(self, socket, host, port):
+        options = []
+        if socket:
+            options.append('--socket=' + socket)
+        if host:
+            options.append('--host=' + host)
+        if port:
+            options.append('--port=' + port)
+        return options
 
     def setup_logging(self, log_file):
         self.logger = logging.getLogger(__name__)
@@ -25,6 +88,37 @@ class RestorationTool:
         filesystem_utils.mkdir_path(self.workdir, 0o755)
         self.logger.debug("Temporary workdir: " + self.workdir)
 
+    def get_archive_compressor(self, archive_path):
+        archive_path = get_location_path(archive_path)
+        if filesystem_utils.is_manifest(archive_path):
+            return ChunkStore(find_store_path(archive_path),
+                              threads=self.threads)
+        if not self.compressed_archives:
+            return None
+        compression = filesystem_utils.get_archive_compression(archive_path)
+        if compression is None:
+            return None
+        return Compressor(compression, threads=self.threads)
+
+    def prepare_tuning(self):
+        if self.use_memory == 'auto':
+            available_memory = filesystem_utils.get_available_memory()
+            if available_memory is None:
+                self.use_memory = None
+            else:
+                self.use_memory = '%dM' % max(
+                    100, available_memory // 2 // (1024 * 1024))
+        version = self.command_executor.get_xtrabackup_version()
+        if self.threads > 1 and version is not None and version >= (2, 4):
+            self.apply_threads = self.threads
+        self.logger.debug("Restoration tuning: " + self.describe_tuning())
+
+    def describe_tuning(self):
+        return 'Decompression threads: %s - Restore I/O: %s\
+ - Apply memory: %s - Apply threads: %s' % (
+            self.threads, self.restore_io or 'tar',
+            self.use_memory or 'default', self.apply_threads or 1)
+
     def stop_service(self):
         try:
             self.command_executor.exec_manage_service('mysql', 'stop')
@@ -36,95 +130,277 @@ class RestorationTool:
             raise
 
     def clean_data_dir(self):
+        self.stop_watch.start_timer()
+        stage = self.report.start_stage('clean_data_dir')
         try:
-            filesystem_utils.clean_directory(self.data_dir)
+            if self.clean_mode == 'rename':
+                self.data_dir_cleaner = BackgroundCleaner(
+                    move_contents_aside(self.data_dir), self.clean_threads)
+                self.data_dir_cleaner.start()
+                self.logger.info("MySQL data directory moved aside: %s",
+                                 self.data_dir_cleaner.trash_path)
+            else:
+                filesystem_utils.clean_directory(self.data_dir,
+                                                 self.clean_threads)
         except:
             self.logger.error(
                 'Unable to clean MySQL data directory.',
                 exc_info=True)
             self.clean()
             raise
+        stage.stop()
+        if self.data_dir_cleaner is not None:
+            self.data_dir_cleaner_stage = self.report.start_stage(
+                'clean_data_dir_background', background=True)
+        self.logger.info("MySQL data directory cleaning time: %s\
+ - Duration: %s",
+                         self.stop_watch.stop_timer(),
+                         self.stop_watch.duration_in_seconds())
+
+    def wait_data_dir_cleaner(self, nested_only=False):
+        cleaner = self.data_dir_cleaner
+        if cleaner is None or nested_only and not cleaner.is_nested(
+                self.data_dir):
+            return
+        self.data_dir_cleaner = None
+        stage = self.report.start_stage('clean_data_dir_wait')
+        error = cleaner.wait()
+        stage.stop()
+        self.data_dir_cleaner_stage.stop(
+            'success' if error is None else 'failed')
+        if error is None:
+            return
+        if nested_only:
+            self.logger.error(
+                'Unable to delete the MySQL data directory moved aside.')
+            raise error
+        self.logger.warning(
+            "Unable to delete the MySQL data directory moved aside: %s - %s",
+            cleaner.trash_path, str(error))
 
     def restore_base_backup(self, archive_path):
         self.stop_watch.start_timer()
+        stage = self.report.start_stage('base_restoration')
         try:
-            self.command_executor.extract_archive(archive_path,
-                                                  self.data_dir,
-                                                  self.compressed_archives)
-            self.command_executor.exec_backup_preparation(self.data_dir, True)
-        except ProcessError:
+            self.command_executor.extract_archive(
+                archive_path,
+                self.data_dir,
+                self.get_archive_compressor(archive_path),
+                self.restore_io,
+                get_owner() if self.restore_io else None)
+            self.wait_data_dir_cleaner(True)
+            self.command_executor.exec_backup_preparation(
+                self.data_dir, True, self.use_memory, self.apply_threads)
+        except:
             self.logger.error(
                 'An error occured during the base backup restoration process.',
                 exc_info=True)
             self.clean()
             raise
-        self.logger.info("Base backup restoration time: %s - Duration: %s",
+        stage.stop(archive_bytes=get_archive_size(archive_path))
+        self.logger.info("Base backup restoration time: %s - Duration: %s\
+ - %s",
                          self.stop_watch.stop_timer(),
-                         self.stop_watch.duration_in_seconds())
+                         self.stop_watch.duration_in_seconds(),
+                         self.describe_tuning())
+        self.record_restore_speed('base', archive_path,
+                                  self.stop_watch.duration_in_seconds())
 
-    def restore_incremental_backups(self, incremental_archive):
+    def prepare_restoration_plan(self, base_archive, incremental_archive,
+                                 repository, chain, restore_time,
+                                 restore_lsn):
         try:
-            repository, archive_name = filesystem_utils.split_path(
-                incremental_archive)
-            incremental_target = int(archive_name.split('_')[1])
-            for step in range(0, incremental_target + 1):
-                self.apply_incremental_backup(repository, step)
+            if repository:
+                self.catalog = Catalog(repository)
+            elif is_remote(incremental_archive):
+                raise ProgramError("The incremental archives of a remote "
+                                   "archive are found with --repository.")
+            else:
+                self.catalog = find_catalog(incremental_archive)
+                target = None
+                if self.catalog is not None:
+                    target = self.catalog.get_backup(incremental_archive)
+                if target is None:
+                    self.catalog = None
+                    return base_archive, self.find_incremental_archives(
+                        incremental_archive)
+                chain, restore_time, restore_lsn = \
+                    target.chain, None, target.to_lsn
+            plan = RestorePlanner(self.catalog).plan(
+                chain, restore_time, int(restore_lsn) if restore_lsn else None)
+        except:
+            self.logger.error('Unable to find the backups to restore.',
+                              exc_info=True)
+            raise
+        for description in plan.describe():
+            self.logger.info("Restoration plan: %s", description)
+        self.logger.info("Restoration plan estimated duration: %.0fs",
+                         plan.get_duration())
+        archives = [backup.get_archive_path() for backup in plan.backups]
+        return archives[0], archives[1:]
+
+    def get_archive_filters(self, archive_path):
+        try:
+            if filesystem_utils.is_manifest(get_location_path(archive_path)):
+                return read_manifest(archive_path).get('filters')
+            return read_checksums(archive_path).get('filters')
+        except (IOError, OSError, ValueError, ProgramError):
+            return None
+
+    def prepare_partial_restoration(self, base_archive):
+        filters = self.get_archive_filters(base_archive)
+        if filters is None:
+            return
+        self.logger.info("Partial backup - %s", describe_filters(filters))
+        self.report.attributes['filters'] = filters
+        if self.table_filter is None:
+            self.logger.warning(
+                'The backup is partial, its tables are imported into the '
+                'running server instead of replacing the MySQL datadir.')
+            self.table_filter = TableFilter(['*.*'], SYSTEM_DATABASES)
+
+    def record_restore_speed(self, kind, archive_path, duration):
+        if self.catalog is None:
+            return
+        try:
+            self.catalog.add_restore(
+                kind, get_archive_size(archive_path), duration)
+        except Exception:
+            self.logger.warning('Unable to record the restore speed.',
+                                exc_info=True)
+
+    def find_incremental_archives(self, incremental_archive):
+        repository, archive_name = filesystem_utils.split_path(
+            incremental_archive)
+        # A differential backup only needs the base backup.
+        if archive_name.startswith('diff_'):
+            return [incremental_archive]
+        if not archive_name.startswith('inc_'):
+            raise ProgramError("Not an incremental archive: " +
+                               incremental_archive)
+        # The incremental backups taken after a differential backup start
+        # from it, which only the catalog records.
+        if glob.glob(os.path.join(repository, 'diff_*')):
+            raise ProgramError("The cycle has differential backups, restore "
+                               "it with --repository.")
+        incremental_target = int(archive_name.split('_')[1])
+        return [self.get_incremental_archive(repository, step)
+                for step in range(0, incremental_target + 1)]
+
+    def restore_incremental_backups(self, incremental_archives):
+        prefetcher = IncrementalPrefetcher(self.extract_incremental_backup,
+                                           self.prefetch,
+                                           self.prefetch_disk_budget)
+        try:
+            prefetcher.start(list(enumerate(incremental_archives)))
+            for archive in incremental_archives:
+                self.apply_incremental_backup(prefetcher)
         except:
             self.logger.error(
                 'An error occured during the incremental\
                  backups restoration process.',
                 exc_info=True)
+            prefetcher.stop()
             self.clean()
             raise
+        prefetcher.stop()
 
-    def apply_incremental_backup(self, archive_repository, incremental_step):
-        self.stop_watch.start_timer()
+    def get_incremental_archive(self, archive_repository, incremental_step):
+        prefix = ''.join(['inc_', str(incremental_step), '_'])
         try:
-            prefix = ''.join(['inc_', str(incremental_step), '_'])
-            backup_archive = filesystem_utils.get_prefixed_file_in_dir(
+            return filesystem_utils.get_prefixed_file_in_dir(
                 archive_repository, prefix)
-            extracted_archive_path = ''.join([self.workdir, '/',
-                                              prefix, 'archive'])
-            filesystem_utils.mkdir_path(extracted_archive_path, 0o755)
-            self.command_executor.extract_archive(backup_archive,
-                                                  extracted_archive_path,
-                                                  self.compressed_archives)
+        except IndexError:
+            raise ProgramError("Missing incremental archive: %s/%s*"
+                               % (archive_repository, prefix))
+
+    def extract_incremental_backup(self, incremental_step, backup_archive):
+        stop_watch = timer.Timer()
+        stop_watch.start_timer()
+        stage = self.report.start_stage(
+            'incremental_%s_extraction' % incremental_step)
+        extracted_archive_path = ''.join([self.workdir, '/inc_',
+                                          str(incremental_step), '_archive'])
+        filesystem_utils.mkdir_path(extracted_archive_path, 0o755)
+        self.command_executor.extract_archive(
+            backup_archive,
+            extracted_archive_path,
+            self.get_archive_compressor(backup_archive))
+        stage.stop(archive_bytes=get_archive_size(backup_archive))
+        self.logger.info("Incremental step #%s extraction time: %s\
+ - Duration: %s",
+                         incremental_step,
+                         stop_watch.stop_timer(),
+                         stop_watch.duration_in_seconds())
+        self.extraction_durations[incremental_step] = \
+            stop_watch.duration_in_seconds()
+        return extracted_archive_path
+
+    def apply_incremental_backup(self, prefetcher):
+        try:
+            archive = prefetcher.get()
+            self.stop_watch.start_timer()
+            stage = self.report.start_stage(
+                'incremental_%s_application' % archive.step)
             self.command_executor.exec_incremental_preparation(
                 self.data_dir,
-                extracted_archive_path)
+                archive.extracted_path,
+                self.use_memory,
+                self.apply_threads)
+            prefetcher.release(archive)
+            stage.stop()
         except:
             self.logger.error(
                 'An error occured during an incremental backup restoration.',
                 exc_info=True)
-            self.clean()
             raise
         self.logger.info("Incremental step #%s restoration time: %s\
- - Duration: %s",
-                         incremental_step,
+ - Duration: %s - %s",
+                         archive.step,
                          self.stop_watch.stop_timer(),
-                         self.stop_watch.duration_in_seconds())
+                         self.stop_watch.duration_in_seconds(),
+                         self.describe_tuning())
+        self.record_restore_speed(
+            'incremental', archive.archive_path,
+            self.stop_watch.duration_in_seconds() +
+            self.extraction_durations.get(archive.step, 0))
 
     def prepare_data_dir(self):
+        self.stop_watch.start_timer()
+        stage = self.report.start_stage('final_preparation')
         try:
-            self.command_executor.exec_backup_preparation(self.data_dir, False)
+            self.command_executor.exec_backup_preparation(
+                self.data_dir, False, self.use_memory, self.apply_threads)
         except:
             self.logger.error(
                 'An error occured during the backup final preparation.',
                 exc_info=True)
             self.clean()
             raise
-        self.logger.info("Backup final preparation time: %s - Duration: %s",
+        stage.stop()
+        self.logger.info("Backup final preparation time: %s - Duration: %s\
+ - %s",
                          self.stop_watch.stop_timer(),
-                         self.stop_watch.duration_in_seconds())
+                         self.stop_watch.duration_in_seconds(),
+                         self.describe_tuning())
 
     def set_data_dir_permissions(self):
+        self.stop_watch.start_timer()
+        stage = self.report.start_stage('permissions')
         try:
-            self.command_executor.exec_chown('mysql', 'mysql', self.data_dir)
+            owner = TreeOwner(*get_owner(), threads=self.chown_threads)
+            owner.apply(self.data_dir)
         except:
             self.logger.error('Unable to reset MySQL data dir permissions.',
                               exc_info=True)
             self.clean()
             raise
+        stage.stop()
+        self.logger.info("MySQL data directory permissions time: %s\
+ - Duration: %s - Files: %s - Changed: %s",
+                         self.stop_watch.stop_timer(),
+                         self.stop_watch.duration_in_seconds(),
+                         owner.checked, owner.changed)
 
     def start_service(self):
         try:
@@ -136,18 +412,182 @@ class RestorationTool:
             self.clean()
             raise
 
+    def extract_tables(self, archive_path, destination_path):
+        if filesystem_utils.is_manifest(get_location_path(archive_path)):
+            raise ProgramError("Deduplicated archives can not be partially "
+                               "restored: " + archive_path)
+        filesystem_utils.mkdir_path(destination_path, 0o755)
+        return extract_members(archive_path, destination_path,
+                               self.table_filter.matches_member,
+                               self.threads)
+
+    def extract_table_backups(self, base_archive, incremental_archives):
+        self.stop_watch.start_timer()
+        stage = self.report.start_stage('table_extraction')
+        try:
+            members = self.extract_tables(base_archive, self.export_path)
+            if incremental_archives:
+                self.command_executor.exec_backup_preparation(
+                    self.export_path, True, self.use_memory,
+                    self.apply_threads)
+            for step, archive_path in enumerate(incremental_archives):
+                extracted_archive_path = ''.join([
+                    self.workdir, '/inc_', str(step), '_archive'])
+                self.extract_tables(archive_path, extracted_archive_path)
+                self.command_executor.exec_incremental_preparation(
+                    self.export_path, extracted_archive_path,
+                    self.use_memory, self.apply_threads)
+                filesystem_utils.delete_directory_if_exists(
+                    extracted_archive_path)
+        except (ProcessError, ProgramError):
+            self.logger.error(
+                'An error occured during the tables extraction.',
+                exc_info=True)
+            self.clean()
+            raise
+        stage.stop()
+        self.logger.info("Tables extraction time: %s - Duration: %s\
+ - Files: %s - Incremental backups: %s",
+                         self.stop_watch.stop_timer(),
+                         self.stop_watch.duration_in_seconds(),
+                         len(members), len(incremental_archives))
+
+    def export_tables(self):
+        self.stop_watch.start_timer()
+        stage = self.report.start_stage('table_export')
+        try:
+            self.command_executor.exec_backup_preparation(
+                self.export_path, False, self.use_memory,
+                self.apply_threads, export=True)
+            tables = self.find_exported_tables()
+            if not tables:
+                raise ProgramError("No table of the backup matches: " +
+                                   ', '.join(self.table_filter.patterns))
+        except (ProcessError, ProgramError):
+            self.logger.error(
+                'An error occured during the tables export.',
+                exc_info=True)
+            self.clean()
+            raise
+        stage.stop()
+        self.logger.info("Tables export time: %s - Duration: %s",
+                         self.stop_watch.stop_timer(),
+                         self.stop_watch.duration_in_seconds())
+        return tables
+
+    def find_exported_tables(self):
+        tables = {}
+        for directory in sorted(os.listdir(self.export_path)):
+            directory_path = os.path.join(self.export_path, directory)
+            if not os.path.isdir(directory_path):
+                continue
+            for file_name in sorted(os.listdir(directory_path)):
+                if not file_name.endswith(('.ibd', '.cfg')):
+                    continue
+                table = get_member_table(directory + '/' + file_name)
+                if self.table_filter.matches(*table):
+                    tables.setdefault(table, (directory, []))[1].append(
+                        file_name)
+        return tables
+
+    def import_table(self, user, password, table, directory, file_names):
+        name = '.'.join('`%s`' % part.replace('`', '``') for part in table)
+        if any(is_partition(file_name) for file_name in file_names):
+            tablespace = 'PARTITION ALL TABLESPACE'
+        else:
+            tablespace = 'TABLESPACE'
+        self.command_executor.exec_sql(
+            user, password, 'SET SESSION foreign_key_checks = 0; '
+            'ALTER TABLE %s DISCARD %s' % (name, tablespace))
+        for file_name in file_names:
+            destination_path = os.path.join(self.data_dir, directory,
+                                            file_name)
+            filesystem_utils.move_file(
+                os.path.join(self.export_path, directory, file_name),
+                destination_path)
+            set_owner(destination_path, *get_owner())
+        self.command_executor.exec_sql(
+            user, password, 'SET SESSION foreign_key_checks = 0; '
+            'ALTER TABLE %s IMPORT %s' % (name, tablespace))
+
+    def import_tables(self, user, password, tables):
+        self.stop_watch.start_timer()
+        stage = self.report.start_stage('table_import')
+        for table in sorted(tables):
+            directory, file_names = tables[table]
+            try:
+                self.import_table(user, password, table, directory,
+                                  file_names)
+            except (IOError, OSError, ProcessError, ProgramError):
+                self.logger.error(
+                    'Unable to import the table %s.%s, it must exist with '
+                    'the definition it had in the backup. Exported tables '
+                    'kept in: %s', table[0], table[1], self.export_path,
+                    exc_info=True)
+                raise
+            self.logger.info("Imported table: %s.%s", *table)
+        stage.stop()
+        self.logger.info("Tables import time: %s - Duration: %s\
+ - Tables: %s",
+                         self.stop_watch.stop_timer(),
+                         self.stop_watch.duration_in_seconds(), len(tables))
+
+    def restore_tables(self, base_archive, incremental_archives, user,
+                       password, export_only):
+        self.export_path = self.workdir + '/tables'
+        self.extract_table_backups(base_archive, incremental_archives)
+        tables = self.export_tables()
+        if export_only:
+            self.logger.info("Exported tables: %s - Directory: %s",
+                             ', '.join('%s.%s' % table
+                                       for table in sorted(tables)),
+                             self.export_path)
+            return
+        self.import_tables(user, password, tables)
+        self.clean()
+
     def clean(self):
         filesystem_utils.delete_directory_if_exists(self.workdir)
 
+    def write_report(self, status):
+        self.report.attributes['data_dir'] = self.data_dir
+        try:
+            self.report.write(status)
+        except Exception:
+            self.logger.error('Unable to write the run report.',
+                              exc_info=True)
+
     def start_restoration(self, base_archive, incremental_archive,
-                          workdir, restart_service):
-        self.prepare_workdir(workdir)
-        self.stop_service()
-        self.clean_data_dir()
-        self.restore_base_backup(base_archive)
-        self.restore_incremental_backups(incremental_archive)
-        self.prepare_data_dir()
-        self.set_data_dir_permissions()
-        self.clean()
-        if restart_service:
-            self.start_service()
+                          workdir, restart_service, repository=None,
+                          chain='default', restore_time=None,
+                          restore_lsn=None, plan_only=False, user=None,
+                          password=None, export_only=False):
+        try:
+            base_archive, incremental_archives = \
+                self.prepare_restoration_plan(base_archive,
+                                              incremental_archive,
+                                              repository, chain,
+                                              restore_time, restore_lsn)
+            self.prepare_partial_restoration(base_archive)
+            if plan_only:
+                return
+            self.prepare_workdir(workdir)
+            self.prepare_tuning()
+            if self.table_filter is not None:
+                self.restore_tables(base_archive, incremental_archives,
+                                    user, password, export_only)
+            else:
+                self.stop_service()
+                self.clean_data_dir()
+                self.restore_base_backup(base_archive)
+                self.restore_incremental_backups(incremental_archives)
+                self.prepare_data_dir()
+                self.set_data_dir_permissions()
+                self.wait_data_dir_cleaner()
+                self.clean()
+                if restart_service:
+                    self.start_service()
+        except Exception:
+            self.write_report('failed')
+            raise
+        self.write_report('success')
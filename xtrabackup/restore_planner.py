@@ -0,0 +1,103 @@
+import heapq
+import itertools
+from xtrabackup.exception import ProgramError
+
+
+DEFAULT_SPEEDS = {
+    'base': 100 * 1024 * 1024,
+    'incremental': 50 * 1024 * 1024,
+}
+APPLY_OVERHEAD = 10.0
+BASE_KINDS = ['full', 'base']
+
+
+def get_speed_kind(backup):
+    return 'base' if backup.kind in BASE_KINDS else 'incremental'
+
+
+class RestorePlan:
+
+    def __init__(self, backups, estimates):
+        self.backups = backups
+        self.estimates = estimates
+
+    def get_duration(self):
+        return sum(self.estimates)
+
+    def describe(self):
+        return ['%s (%s, %s bytes, LSN %s-%s): %.0fs' % (
+            backup.archive_path, backup.kind, backup.size,
+            backup.from_lsn, backup.to_lsn, estimate)
+            for backup, estimate in zip(self.backups, self.estimates)]
+
+
+class RestorePlanner:
+    """Finds the cheapest archives to restore up to a target LSN.
+
+    Backups are edges between LSNs: a base or full backup starts from an
+    empty datadir, an incremental or differential backup goes from its
+    from_lsn to its to_lsn. The cost of an edge is the estimated time to
+    extract and apply the archive, from the speeds measured by the
+    previous restorations.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.speeds = {}
+        for kind, default_speed in DEFAULT_SPEEDS.items():
+            self.speeds[kind] = (catalog.get_restore_speed(kind) or
+                                 default_speed)
+
+    def estimate(self, backup):
+        return APPLY_OVERHEAD + float(backup.size or 0) / self.speeds[
+            get_speed_kind(backup)]
+
+    def get_target(self, backups, restore_time=None, restore_lsn=None):
+        candidates = [backup for backup in backups
+                      if (restore_time is None or
+                          backup.created_at <= restore_time) and
+                      (restore_lsn is None or backup.to_lsn <= restore_lsn)]
+        if not candidates:
+            raise ProgramError("No backup in the catalog before the "
+                               "restore target.")
+        return max(candidates,
+                   key=lambda backup: (backup.to_lsn, backup.created_at))
+
+    def plan(self, chain, restore_time=None, restore_lsn=None):
+        backups = self.catalog.get_chain_backups(chain)
+        target = self.get_target(backups, restore_time, restore_lsn)
+        deltas = {}
+        for backup in backups:
+            if backup.kind not in BASE_KINDS:
+                deltas.setdefault(backup.from_lsn, []).append(backup)
+        counter = itertools.count()
+        queue = [(self.estimate(backup), next(counter), backup, None)
+                 for backup in backups if backup.kind in BASE_KINDS]
+        heapq.heapify(queue)
+        visited = set()
+        while queue:
+            cost, index, backup, previous = heapq.heappop(queue)
+            state = (backup.kind == 'full', backup.to_lsn)
+            if state in visited:
+                continue
+            visited.add(state)
+            path = (backup, previous)
+            if backup.to_lsn == target.to_lsn:
+                return self.build_plan(path)
+            if backup.kind == 'full':
+                continue
+            for delta in deltas.get(backup.to_lsn, []):
+                if delta.to_lsn <= target.to_lsn:
+                    heapq.heappush(queue, (cost + self.estimate(delta),
+                                           next(counter), delta, path))
+        raise ProgramError("No restorable chain of backups up to LSN %s."
+                           % target.to_lsn)
+
+    def build_plan(self, path):
+        backups = []
+        while path is not None:
+            backup, path = path
+            backups.append(backup)
+        backups.reverse()
+        return RestorePlan(backups,
+                           [self.estimate(backup) for backup in backups])
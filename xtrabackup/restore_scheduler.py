@@ -0,0 +1,94 @@
+import threading
+from xtrabackup.storage import get_archive_size
+import xtrabackup.filesystem_utils as filesystem_utils
+
+
+class PrefetchedArchive:
+
+    def __init__(self, step, archive_path, estimated_size):
+        self.step = step
+        self.archive_path = archive_path
+        self.size = estimated_size
+        self.extracted_path = None
+        self.error = None
+
+
+class IncrementalPrefetcher:
+
+    def __init__(self, extract_function, lookahead, disk_budget=None):
+        self.extract_function = extract_function
+        self.lookahead = max(0, lookahead)
+        self.disk_budget = disk_budget
+        self.condition = threading.Condition()
+        self.archives = []
+        self.next_index = 0
+        self.applied_index = 0
+        self.used_space = 0
+        self.stopped = False
+        self.thread = None
+
+    def start(self, archives):
+        for step, archive_path in archives:
+            self.archives.append(PrefetchedArchive(
+                step, archive_path, get_archive_size(archive_path)))
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def can_prefetch(self, archive):
+        if self.next_index - self.applied_index > self.lookahead:
+            return False
+        if self.disk_budget is None or self.used_space == 0:
+            return True
+        return self.used_space + archive.size <= self.disk_budget
+
+    def run(self):
+        while True:
+            with self.condition:
+                if self.next_index >= len(self.archives):
+                    return
+                archive = self.archives[self.next_index]
+                while not self.stopped and not self.can_prefetch(archive):
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                self.used_space += archive.size
+            try:
+                archive.extracted_path = self.extract_function(
+                    archive.step, archive.archive_path)
+                extracted_size = filesystem_utils.get_directory_size(
+                    archive.extracted_path)
+            except Exception as error:
+                with self.condition:
+                    archive.error = error
+                    self.next_index += 1
+                    self.condition.notify_all()
+                return
+            with self.condition:
+                self.used_space += extracted_size - archive.size
+                archive.size = extracted_size
+                self.next_index += 1
+                self.condition.notify_all()
+
+    def get(self):
+        with self.condition:
+            archive = self.archives[self.applied_index]
+            while self.next_index <= self.applied_index:
+                self.condition.wait()
+            if archive.error is not None:
+                raise archive.error
+            return archive
+
+    def release(self, archive):
+        filesystem_utils.delete_directory_if_exists(archive.extracted_path)
+        with self.condition:
+            self.used_space -= archive.size
+            self.applied_index += 1
+            self.condition.notify_all()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,259 @@
+import datetime
+import os
+import re
+import time
+from multiprocessing.pool import ThreadPool
+from xtrabackup.catalog import Catalog
+from xtrabackup.chunk_store import CHUNK_DIRECTORY
+from xtrabackup.restore_planner import BASE_KINDS
+from xtrabackup.storage import get_storage
+import xtrabackup.filesystem_utils as filesystem_utils
+
+
+ARCHIVE_NAME_PATTERN = re.compile(
+    r'^(?:(base|inc|diff)_(?:(\d+)_)?)?backup_(\d{8}_\d{4}(?:\d{2})?)'
+    r'(?:_([A-Za-z0-9_-]+))?\.tar')
+ARCHIVE_DATE_FORMATS = {
+    13: '%Y%m%d_%H%M',
+    15: '%Y%m%d_%H%M%S',
+}
+ARCHIVE_KINDS = {
+    None: 'full',
+    'base': 'base',
+    'inc': 'incremental',
+    'diff': 'differential',
+}
+ARCHIVE_LEVELS = {
+    'full': 0,
+    'base': 0,
+    'differential': 1,
+    'incremental': 2,
+}
+
+
+def get_day(moment):
+    return moment.date()
+
+
+def get_week(moment):
+    return moment.isocalendar()[:2]
+
+
+def get_month(moment):
+    return moment.year, moment.month
+
+
+class RepositoryBackup:
+
+    def __init__(self, chain, kind, level, created_at, archive_path, size,
+                 backup_id=None, base_id=None, from_lsn=None, to_lsn=None,
+                 storage=None):
+        self.chain = chain
+        self.kind = kind
+        self.level = level
+        self.created_at = created_at
+        self.archive_path = archive_path
+        self.size = size or 0
+        self.id = backup_id
+        self.base_id = base_id
+        self.from_lsn = from_lsn
+        self.to_lsn = to_lsn
+        self.storage = storage
+        self.parent = None
+
+    def get_moment(self):
+        return datetime.datetime.fromtimestamp(self.created_at)
+
+
+def load_catalog_backups(catalog, chain=None):
+    backups = []
+    for backup in catalog.get_backups(chain):
+        backups.append(RepositoryBackup(
+            backup.chain, backup.kind, backup.level, backup.created_at,
+            backup.archive_path, backup.size, backup.id, backup.base_id,
+            backup.from_lsn, backup.to_lsn, backup.storage))
+    ends = {}
+    for backup in backups:
+        if backup.kind != 'full':
+            ends.setdefault((backup.chain, backup.base_id, backup.to_lsn),
+                            []).append(backup)
+    for backup in backups:
+        if backup.kind in BASE_KINDS:
+            continue
+        candidates = [candidate for candidate in ends.get(
+            (backup.chain, backup.base_id, backup.from_lsn), [])
+            if candidate.created_at <= backup.created_at and
+            candidate is not backup]
+        if candidates:
+            backup.parent = max(candidates,
+                                key=lambda candidate: candidate.created_at)
+    return backups
+
+
+def scan_repository(repository):
+    sizes = {}
+    archives = []
+    for path, stat in filesystem_utils.scan_files(repository,
+                                                  [CHUNK_DIRECTORY]):
+        sizes[path] = stat.st_size
+        match = ARCHIVE_NAME_PATTERN.match(os.path.basename(path))
+        if match and filesystem_utils.is_archive(path):
+            archives.append((path, match))
+    backups = []
+    for path, match in archives:
+        kind = ARCHIVE_KINDS[match.group(1)]
+        created_at = time.mktime(datetime.datetime.strptime(
+            match.group(3),
+            ARCHIVE_DATE_FORMATS[len(match.group(3))]).timetuple())
+        backups.append(RepositoryBackup(
+            match.group(4) or 'default', kind, ARCHIVE_LEVELS.get(kind),
+            created_at, os.path.relpath(path, repository),
+            sizes[path] + sizes.get(
+                filesystem_utils.get_checksum_path(path), 0)))
+    # Without a catalog, the cycle of each chain is rebuilt from the dates
+    # of the archives, as the incremental state file did.
+    bases = {}
+    lasts = {}
+    for backup in sorted(backups, key=lambda backup: backup.created_at):
+        if backup.kind == 'full':
+            continue
+        if backup.kind == 'base':
+            bases[backup.chain] = backup
+        elif backup.kind == 'differential':
+            backup.parent = bases.get(backup.chain)
+        else:
+            backup.parent = lasts.get(backup.chain)
+        lasts[backup.chain] = backup
+    return backups
+
+
+class RetentionPolicy:
+    """Keeps the last backups of each day, week and month of each chain.
+
+    A kept backup is only restorable with the backups it was taken
+    against, they are kept with it up to their base. The last backup of a
+    chain, and the last backup of each lower level before it, are always
+    kept, as the next backups of the chain are taken against them.
+    """
+
+    def __init__(self, last=1, daily=0, weekly=0, monthly=0):
+        self.last = int(last)
+        self.periods = [
+            (int(daily), get_day),
+            (int(weekly), get_week),
+            (int(monthly), get_month),
+        ]
+
+    def select_chain(self, backups):
+        backups = sorted(backups, key=lambda backup: backup.created_at,
+                         reverse=True)
+        kept = set(backups[:self.last])
+        for count, get_period in self.periods:
+            periods = set()
+            for backup in backups:
+                if len(periods) >= count:
+                    break
+                period = get_period(backup.get_moment())
+                if period not in periods:
+                    periods.add(period)
+                    kept.add(backup)
+        level = None
+        for backup in backups:
+            if backup.kind == 'full' or backup.level is None:
+                continue
+            if level is None or backup.level < level:
+                level = backup.level
+                kept.add(backup)
+        return kept
+
+    def select(self, backups):
+        chains = {}
+        for backup in backups:
+            chains.setdefault(backup.chain, []).append(backup)
+        kept = set()
+        for chain_backups in chains.values():
+            kept.update(self.select_chain(chain_backups))
+        for backup in list(kept):
+            parent = backup.parent
+            while parent is not None and parent not in kept:
+                kept.add(parent)
+                parent = parent.parent
+        return kept
+
+
+class PruneResult:
+
+    def __init__(self):
+        self.kept = []
+        self.pruned = []
+        self.failures = []
+        self.bytes = 0
+
+
+def delete_backup(repository, backup):
+    # The checksums go first, an archive left by a failed deletion is still
+    # in the catalog and is pruned again by the next run.
+    try:
+        if backup.storage:
+            storage = get_storage(backup.storage)
+            try:
+                try:
+                    storage.delete(filesystem_utils.get_checksum_path(
+                        backup.archive_path))
+                except (IOError, OSError):
+                    pass
+                storage.delete(backup.archive_path)
+            finally:
+                storage.close()
+        else:
+            archive_path = os.path.join(repository, backup.archive_path)
+            filesystem_utils.delete_file_if_exists(
+                filesystem_utils.get_checksum_path(archive_path))
+            filesystem_utils.delete_file_if_exists(archive_path)
+            filesystem_utils.delete_empty_directories(
+                os.path.dirname(archive_path), repository)
+    except Exception as error:
+        return backup, error
+    return backup, None
+
+
+def delete_backups(repository, catalog, backups, threads, result):
+    pool = ThreadPool(max(1, int(threads)))
+    try:
+        for backup, error in pool.imap_unordered(
+                lambda backup: delete_backup(repository, backup), backups):
+            if error is not None:
+                result.failures.append((backup, error))
+                continue
+            if catalog is not None:
+                catalog.delete_backup(backup.id)
+            result.pruned.append(backup)
+            result.bytes += backup.size
+    finally:
+        pool.close()
+        pool.join()
+
+
+def prune_repository(repository, policy, chain=None, dry_run=False,
+                     threads=4, scan=False):
+    if scan:
+        catalog = None
+        backups = scan_repository(repository)
+    else:
+        catalog = Catalog(repository)
+    try:
+        if catalog is not None:
+            backups = load_catalog_backups(catalog, chain)
+        kept = policy.select(backups)
+        result = PruneResult()
+        result.kept = [backup for backup in backups if backup in kept]
+        pruned = [backup for backup in backups if backup not in kept]
+        if dry_run:
+            result.pruned = pruned
+            result.bytes = sum(backup.size for backup in pruned)
+        else:
+            delete_backups(repository, catalog, pruned, threads, result)
+    finally:
+        if catalog is not None:
+            catalog.close()
+    return result
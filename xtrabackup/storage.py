@@ -0,0 +1,616 @@
+import contextlib
+import hashlib
+import os
+import posixpath
+import threading
+import time
+from urllib.parse import parse_qs, urlparse, urlunparse
+from xtrabackup.compression import READ_SIZE
+from xtrabackup.exception import ProgramError
+import xtrabackup.filesystem_utils as filesystem_utils
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+
+
+PART_SIZE = 64 * 1024 * 1024
+MIN_PART_SIZE = 5 * 1024 * 1024
+UPLOAD_THREADS = 4
+RETRIES = 5
+RETRY_DELAY = 1.0
+TEMPORARY_EXTENSION = '.part'
+DOWNLOAD_THREADS = 4
+RANGE_SIZE = 8 * 1024 * 1024
+
+
+def retry(function):
+    for attempt in range(RETRIES):
+        try:
+            return function()
+        except Exception:
+            if attempt == RETRIES - 1:
+                raise
+            time.sleep(RETRY_DELAY * 2 ** attempt)
+
+
+def is_remote(location):
+    return urlparse(location).scheme not in ['', 'file']
+
+
+def get_location_path(location):
+    if not is_remote(location):
+        return location
+    return urlparse(location).path
+
+
+def split_location(location):
+    uri = urlparse(location)
+    if not uri.scheme:
+        directory, name = os.path.split(location)
+        return LocalStorage(directory), name
+    directory, name = posixpath.split(uri.path)
+    return get_storage(urlunparse(uri[:2] + (directory,) + uri[3:])), name
+
+
+@contextlib.contextmanager
+def open_location(location):
+    storage, name = split_location(location)
+    try:
+        yield storage, name
+    finally:
+        storage.close()
+
+
+def get_archive_size(location):
+    with open_location(location) as (storage, name):
+        return storage.get_size(name)
+
+
+def open_archive(location, threads=DOWNLOAD_THREADS):
+    if not is_remote(location):
+        return open(get_location_path(location), 'rb')
+    storage, name = split_location(location)
+    try:
+        return RangedReader(storage, name, threads, close_storage=True)
+    except Exception:
+        storage.close()
+        raise
+
+
+def get_storage(location, threads=UPLOAD_THREADS, part_size=PART_SIZE):
+    uri = urlparse(location)
+    options = dict((key, values[-1])
+                   for key, values in parse_qs(uri.query).items())
+    if uri.scheme in ['', 'file']:
+        return LocalStorage(uri.path if uri.scheme else location)
+    if uri.scheme == 's3':
+        return S3Storage(uri.netloc, uri.path.strip('/'),
+                         options.get('endpoint'), threads, part_size)
+    if uri.scheme == 'sftp':
+        return SFTPStorage(uri.hostname, uri.port or 22, uri.username,
+                           uri.password, uri.path or '/')
+    raise ProgramError("Unsupported storage: " + location)
+
+
+class LocalWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path + TEMPORARY_EXTENSION, 'wb')
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        os.rename(self.path + TEMPORARY_EXTENSION, self.path)
+
+    def abort(self):
+        self.file.close()
+        filesystem_utils.delete_file_if_exists(
+            self.path + TEMPORARY_EXTENSION)
+
+
+class LocalStorage:
+
+    def __init__(self, root):
+        self.root = root
+
+    def get_path(self, path):
+        return os.path.join(self.root, path)
+
+    def get_uri(self, path):
+        return self.get_path(path)
+
+    def open_writer(self, path):
+        filesystem_utils.mkdir_path(os.path.dirname(self.get_path(path)),
+                                    0o755)
+        return LocalWriter(self.get_path(path))
+
+    def upload(self, local_path, path, rate_limiter=None):
+        filesystem_utils.mkdir_path(os.path.dirname(self.get_path(path)),
+                                    0o755)
+        filesystem_utils.move_file(local_path, self.get_path(path),
+                                   rate_limiter)
+
+    def get_size(self, path):
+        return filesystem_utils.get_file_size(self.get_path(path))
+
+    def exists(self, path):
+        return os.path.exists(self.get_path(path))
+
+    def read_range(self, path, offset, size):
+        with open(self.get_path(path), 'rb') as archive:
+            archive.seek(offset)
+            return archive.read(size)
+
+    def delete(self, path):
+        filesystem_utils.delete_file_if_exists(self.get_path(path))
+
+    def close(self):
+        pass
+
+
+class MultipartUpload:
+    """Uploads a stream to S3 as parts sent by concurrent threads.
+
+    At most `max_parts` parts are buffered or in flight, the writer blocks
+    until a thread is done with one. Each part is retried on its own, and
+    the parts already stored by an interrupted upload of the same key are
+    reused when their MD5 matches. `on_part` is called with the number,
+    size and MD5 of each stored part, so that the caller can record them
+    and resume the upload in another run.
+    """
+
+    def __init__(self, client, bucket, key, part_size=PART_SIZE,
+                 threads=UPLOAD_THREADS, upload_id=None, stored_parts=None,
+                 on_part=None):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(MIN_PART_SIZE, part_size)
+        self.max_parts = 2 * threads
+        if upload_id is None:
+            upload_id = client.create_multipart_upload(
+                Bucket=bucket, Key=key)['UploadId']
+        self.upload_id = upload_id
+        self.stored_parts = stored_parts or {}
+        self.on_part = on_part
+        self.buffer = []
+        self.buffer_size = 0
+        self.part_number = 0
+        self.size = 0
+        self.parts = {}
+        self.pending = []
+        self.in_flight = 0
+        self.error = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.threads = []
+        for index in range(threads):
+            thread = threading.Thread(target=self.run)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffer_size += len(data)
+        self.size += len(data)
+        if self.buffer_size >= self.part_size:
+            data = b''.join(self.buffer)
+            while len(data) >= self.part_size:
+                self.submit_part(data[:self.part_size])
+                data = data[self.part_size:]
+            self.buffer = [data]
+            self.buffer_size = len(data)
+
+    def flush(self):
+        pass
+
+    def submit_part(self, data):
+        self.part_number += 1
+        with self.condition:
+            while self.in_flight >= self.max_parts and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise self.error
+            self.pending.append((self.part_number, data))
+            self.in_flight += 1
+            self.condition.notify_all()
+
+    def upload_part(self, number, data):
+        digest = hashlib.md5(data).hexdigest()
+        stored_part = self.stored_parts.get(number)
+        if stored_part == (len(data), digest):
+            return '"%s"' % digest
+        return retry(lambda: self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=number, Body=data)['ETag'])
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                number, data = self.pending.pop(0)
+            try:
+                etag = self.upload_part(number, data)
+            except Exception as error:
+                with self.condition:
+                    self.error = self.error or error
+                    self.in_flight -= 1
+                    self.condition.notify_all()
+                continue
+            with self.condition:
+                self.parts[number] = etag
+                self.in_flight -= 1
+                self.condition.notify_all()
+                if self.on_part is not None:
+                    self.on_part(number, len(data), etag.strip('"'))
+
+    def stop(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    def close(self):
+        try:
+            if self.buffer_size or not self.part_number:
+                self.submit_part(b''.join(self.buffer))
+                self.buffer = []
+                self.buffer_size = 0
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
+        retry(lambda: self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': number, 'ETag': self.parts[number]}
+                for number in sorted(self.parts)]}))
+
+    def abort(self):
+        with self.condition:
+            self.pending = []
+        self.stop()
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+class S3Storage:
+
+    def __init__(self, bucket, prefix, endpoint=None,
+                 threads=UPLOAD_THREADS, part_size=PART_SIZE):
+        if boto3 is None:
+            raise ProgramError("Missing Python module for S3 storage: boto3")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.threads = max(1, int(threads))
+        self.part_size = int(part_size)
+        self.endpoint = endpoint
+        self.client = boto3.client('s3', endpoint_url=endpoint)
+
+    def get_key(self, path):
+        return posixpath.join(self.prefix, path) if self.prefix else path
+
+    def get_uri(self, path):
+        uri = 's3://%s/%s' % (self.bucket, self.get_key(path))
+        if self.endpoint:
+            uri += '?endpoint=' + self.endpoint
+        return uri
+
+    def find_upload(self, key):
+        uploads = self.client.list_multipart_uploads(
+            Bucket=self.bucket, Prefix=key).get('Uploads', [])
+        upload = next((upload for upload in uploads
+                       if upload['Key'] == key), None)
+        if upload is None:
+            return None, {}
+        stored_parts = {}
+        paginator = self.client.get_paginator('list_parts')
+        for page in paginator.paginate(Bucket=self.bucket, Key=key,
+                                       UploadId=upload['UploadId']):
+            for part in page.get('Parts', []):
+                stored_parts[part['PartNumber']] = (
+                    part['Size'], part['ETag'].strip('"'))
+        return upload['UploadId'], stored_parts
+
+    def has_upload(self, key, upload_id):
+        try:
+            self.client.list_parts(Bucket=self.bucket, Key=key,
+                                   UploadId=upload_id, MaxParts=1)
+        except self.client.exceptions.ClientError as error:
+            if error.response['Error']['Code'] == 'NoSuchUpload':
+                return False
+            raise
+        return True
+
+    def open_writer(self, path, upload_id=None, stored_parts=None):
+        key = self.get_key(path)
+        if upload_id is not None and not self.has_upload(key, upload_id):
+            upload_id, stored_parts = None, None
+        return MultipartUpload(self.client, self.bucket, key,
+                               self.part_size, self.threads, upload_id,
+                               stored_parts)
+
+    def abort_upload(self, path, upload_id):
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.get_key(path), UploadId=upload_id)
+
+    def upload(self, local_path, path, rate_limiter=None):
+        upload_id, stored_parts = self.find_upload(self.get_key(path))
+        writer = self.open_writer(path, upload_id, stored_parts)
+        try:
+            with open(local_path, 'rb') as local_file:
+                while True:
+                    data = local_file.read(READ_SIZE)
+                    if not data:
+                        break
+                    if rate_limiter is not None:
+                        rate_limiter.consume(len(data))
+                    writer.write(data)
+        except Exception:
+            writer.stop()
+            raise
+        writer.close()
+        os.unlink(local_path)
+
+    def get_size(self, path):
+        return self.client.head_object(
+            Bucket=self.bucket, Key=self.get_key(path))['ContentLength']
+
+    def exists(self, path):
+        try:
+            self.client.head_object(Bucket=self.bucket,
+                                    Key=self.get_key(path))
+        except self.client.exceptions.ClientError as error:
+            if error.response['Error']['Code'] in ['404', 'NoSuchKey']:
+                return False
+            raise
+        return True
+
+    def read_range(self, path, offset, size):
+        return retry(lambda: self.client.get_object(
+            Bucket=self.bucket, Key=self.get_key(path),
+            Range='bytes=%d-%d' % (offset, offset + size - 1))['Body'].read())
+
+    def delete(self, path):
+        self.client.delete_object(Bucket=self.bucket, Key=self.get_key(path))
+
+    def close(self):
+        pass
+
+
+class SFTPWriter:
+
+    def __init__(self, sftp, path):
+        self.sftp = sftp
+        self.path = path
+        self.file = sftp.open(path + TEMPORARY_EXTENSION, 'wb')
+        self.file.set_pipelined(True)
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        self.sftp.posix_rename(self.path + TEMPORARY_EXTENSION, self.path)
+
+    def abort(self):
+        self.file.close()
+        self.sftp.remove(self.path + TEMPORARY_EXTENSION)
+
+
+class SFTPStorage:
+
+    def __init__(self, host, port, user, password, root):
+        if paramiko is None:
+            raise ProgramError("Missing Python module for SFTP storage: "
+                               "paramiko")
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.root = root
+        # Each thread opens its own connection, they are all closed by
+        # close().
+        self.local = threading.local()
+        self.clients = []
+        self.lock = threading.Lock()
+
+    def get_sftp(self):
+        sftp = getattr(self.local, 'sftp', None)
+        if sftp is None:
+            client = paramiko.SSHClient()
+            with self.lock:
+                self.clients.append(client)
+            client.load_system_host_keys()
+            client.connect(self.host, self.port, self.user, self.password)
+            sftp = self.local.sftp = client.open_sftp()
+        return sftp
+
+    def get_path(self, path):
+        return posixpath.join(self.root, path)
+
+    def get_uri(self, path):
+        return 'sftp://%s%s:%d%s' % (self.user + '@' if self.user else '',
+                                     self.host, self.port,
+                                     self.get_path(path))
+
+    def mkdir(self, directory):
+        sftp = self.get_sftp()
+        try:
+            sftp.stat(directory)
+        except IOError:
+            self.mkdir(posixpath.dirname(directory))
+            sftp.mkdir(directory, 0o755)
+
+    def open_writer(self, path):
+        self.mkdir(posixpath.dirname(self.get_path(path)))
+        return SFTPWriter(self.get_sftp(), self.get_path(path))
+
+    def upload(self, local_path, path, rate_limiter=None):
+        writer = self.open_writer(path)
+        try:
+            with open(local_path, 'rb') as local_file:
+                while True:
+                    data = local_file.read(READ_SIZE)
+                    if not data:
+                        break
+                    if rate_limiter is not None:
+                        rate_limiter.consume(len(data))
+                    writer.write(data)
+        except Exception:
+            writer.abort()
+            raise
+        writer.close()
+        os.unlink(local_path)
+
+    def get_size(self, path):
+        return self.get_sftp().stat(self.get_path(path)).st_size
+
+    def exists(self, path):
+        try:
+            self.get_sftp().stat(self.get_path(path))
+        except IOError:
+            return False
+        return True
+
+    def read_range(self, path, offset, size):
+        with self.get_sftp().open(self.get_path(path), 'rb') as remote_file:
+            remote_file.seek(offset)
+            return remote_file.read(size)
+
+    def delete(self, path):
+        self.get_sftp().remove(self.get_path(path))
+
+    def close(self):
+        with self.lock:
+            clients, self.clients = self.clients, []
+            self.local = threading.local()
+        for client in clients:
+            client.close()
+
+
+class RangedReader:
+    """Reads a stored archive with concurrent ranged requests.
+
+    The threads fetch the consecutive ranges of the archive into a ring of
+    `2 * threads` slots, the reader consumes them in order and frees their
+    slot, so the download runs ahead of the decompression and the
+    extraction without holding more than the ring in memory.
+    """
+
+    def __init__(self, storage, path, threads=DOWNLOAD_THREADS,
+                 range_size=RANGE_SIZE, close_storage=False):
+        self.storage = storage
+        self.close_storage = close_storage
+        self.path = path
+        self.range_size = range_size
+        self.size = storage.get_size(path)
+        self.range_count = (self.size + range_size - 1) // range_size
+        self.slots = 2 * max(1, threads)
+        self.ranges = {}
+        self.next_range = 0
+        self.read_range = 0
+        self.data = b''
+        self.offset = 0
+        self.error = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.threads = []
+        for index in range(max(1, threads)):
+            thread = threading.Thread(target=self.run)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while (not self.closed and
+                       self.next_range < self.range_count and
+                       self.next_range - self.read_range >= self.slots):
+                    self.condition.wait()
+                if self.closed or self.next_range >= self.range_count:
+                    return
+                index = self.next_range
+                self.next_range += 1
+            offset = index * self.range_size
+            try:
+                data = self.storage.read_range(
+                    self.path, offset,
+                    min(self.range_size, self.size - offset))
+            except Exception as error:
+                with self.condition:
+                    self.error = self.error or error
+                    self.condition.notify_all()
+                return
+            with self.condition:
+                self.ranges[index] = data
+                self.condition.notify_all()
+
+    def next_data(self):
+        with self.condition:
+            if self.read_range >= self.range_count:
+                return b''
+            while self.read_range not in self.ranges and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise self.error
+            data = self.ranges.pop(self.read_range)
+            self.read_range += 1
+            self.condition.notify_all()
+        return data
+
+    def read(self, size=-1):
+        chunks = []
+        while size != 0:
+            if self.offset >= len(self.data):
+                self.data, self.offset = self.next_data(), 0
+                if not self.data:
+                    break
+            end = len(self.data)
+            if size > 0:
+                end = min(end, self.offset + size)
+                size -= end - self.offset
+            chunks.append(self.data[self.offset:end])
+            self.offset = end
+        return b''.join(chunks)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        if self.close_storage:
+            self.storage.close()
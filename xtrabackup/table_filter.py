@@ -0,0 +1,151 @@
+import fnmatch
+import json
+import re
+from xtrabackup.exception import ProgramError
+
+
+PARTITION_PATTERN = re.compile(r'#[Pp]#')
+SYSTEM_DATABASES = ['mysql', 'performance_schema', 'sys']
+ENCODED_CHARACTER_PATTERN = re.compile(r'@([0-9a-fA-F]{4})')
+
+
+def decode_file_name(name):
+    # MySQL encodes the special characters of the database and table
+    # names as @XXXX in the file names.
+    return ENCODED_CHARACTER_PATTERN.sub(
+        lambda match: chr(int(match.group(1), 16)), name)
+
+
+def parse_table_patterns(value):
+    patterns = []
+    for pattern in value.split(','):
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        if '.' not in pattern:
+            raise ProgramError("Invalid table pattern, expected "
+                               "<database>.<table>: " + pattern)
+        patterns.append(pattern)
+    if not patterns:
+        raise ProgramError("No table pattern given.")
+    return patterns
+
+
+def read_tables_file(path):
+    try:
+        with open(path) as tables_file:
+            return [line.strip() for line in tables_file
+                    if line.strip() and not line.startswith('#')]
+    except (IOError, OSError) as error:
+        raise ProgramError("Unable to read the tables file: %s" % error)
+
+
+def compile_table_regex(value):
+    try:
+        return re.compile(value)
+    except re.error as error:
+        raise ProgramError("Invalid table regex %s: %s" % (value, error))
+
+
+def get_member_table(name):
+    if name.startswith('./'):
+        name = name[2:]
+    parts = name.split('/')
+    if len(parts) != 2:
+        return None
+    database, file_name = parts
+    table = PARTITION_PATTERN.split(file_name.split('.', 1)[0])[0]
+    return decode_file_name(database), decode_file_name(table)
+
+
+def is_partition(name):
+    return PARTITION_PATTERN.search(name) is not None
+
+
+class TableFilter:
+    """Selects tables with database.table patterns, such as shop.orders or
+    archive.*.
+
+    The files of the backup outside of the database directories, the
+    system tablespace, the redo log and the xtrabackup files, are always
+    selected.
+    """
+
+    def __init__(self, patterns, excluded_databases=()):
+        self.patterns = patterns
+        self.excluded_databases = excluded_databases
+
+    def matches(self, database, table):
+        if database in self.excluded_databases:
+            return False
+        name = '%s.%s' % (database, table)
+        return any(fnmatch.fnmatchcase(name, pattern)
+                   for pattern in self.patterns)
+
+    def matches_member(self, name):
+        table = get_member_table(name)
+        return table is None or self.matches(*table)
+
+
+class BackupFilter:
+    """Databases and tables copied by a partial backup.
+
+    The filters are given to innobackupex, which has no exclusion filter,
+    and recorded in the catalog and in the checksums or manifest of the
+    archive, so that a restoration knows the backup is partial.
+    """
+
+    def __init__(self, databases=None, tables=None, tables_file=None):
+        self.databases = databases.split() if databases else []
+        self.tables = tables
+        if tables:
+            compile_table_regex(tables)
+        self.tables_file = tables_file
+        self.table_names = []
+        if tables_file:
+            self.table_names = read_tables_file(tables_file)
+
+    def is_partial(self):
+        return bool(self.databases or self.tables or self.tables_file)
+
+    def get_options(self):
+        options = []
+        if self.databases:
+            options.append('--databases=' + ' '.join(self.databases))
+        if self.tables:
+            options.append('--include=' + self.tables)
+        if self.tables_file:
+            options.append('--tables-file=' + self.tables_file)
+        return options
+
+    def to_dict(self):
+        if not self.is_partial():
+            return None
+        return {
+            'databases': self.databases,
+            'tables': self.tables,
+            'table_names': self.table_names,
+        }
+
+
+def dump_filters(filters):
+    if filters is None:
+        return None
+    return json.dumps(filters, sort_keys=True)
+
+
+def load_filters(value):
+    if not value:
+        return None
+    return json.loads(value)
+
+
+def describe_filters(filters):
+    descriptions = []
+    for key in ['databases', 'tables', 'table_names']:
+        value = filters.get(key)
+        if value:
+            if isinstance(value, list):
+                value = ' '.join(value)
+            descriptions.append('%s: %s' % (key, value))
+    return ' - '.join(descriptions)
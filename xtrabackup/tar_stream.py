@@ -0,0 +1,101 @@
+import io
+from xtrabackup.compression import read_exactly
+from xtrabackup.exception import ProgramError
+
+
+RECORD_SIZE = 512
+LONG_NAME_TYPES = [b'L']
+PAX_HEADER_TYPES = [b'x']
+REGULAR_FILE_TYPES = [b'0', b'\x00', b'7']
+
+
+def parse_number(field):
+    if field and ord(field[0:1]) & 0x80:
+        value = 0
+        for byte in bytearray(field[1:]):
+            value = (value << 8) + byte
+        return value
+    field = field.rstrip(b'\x00 ').strip()
+    if not field:
+        return 0
+    try:
+        return int(field, 8)
+    except ValueError:
+        raise ProgramError("Invalid tar header number: %r" % field)
+
+
+def parse_string(field):
+    return field.split(b'\x00', 1)[0].decode('utf-8', 'surrogateescape')
+
+
+def parse_pax_path(data):
+    position = 0
+    while position < len(data):
+        space = data.index(b' ', position)
+        length = int(data[position:space])
+        keyword, value = data[space + 1:position + length - 1].split(b'=', 1)
+        if keyword == b'path':
+            return value.decode('utf-8', 'surrogateescape')
+        position += length
+    return None
+
+
+class TarMember:
+
+    def __init__(self, header, stream, offset, name):
+        self.header = header
+        self.stream = stream
+        self.offset = offset
+        self.type = header[156:157]
+        self.size = parse_number(header[124:136])
+        self.name = name or self.get_header_name()
+        self.padded_size = -(-self.size // RECORD_SIZE) * RECORD_SIZE
+        self.remaining = self.padded_size
+
+    def get_header_name(self):
+        name = parse_string(self.header[0:100])
+        if self.header[257:262] == b'ustar':
+            prefix = parse_string(self.header[345:500])
+            if prefix:
+                name = prefix + '/' + name
+        return name
+
+    def is_empty(self):
+        return self.header == b'\x00' * RECORD_SIZE
+
+    def is_file(self):
+        return self.type in REGULAR_FILE_TYPES and not self.is_empty()
+
+    def read(self, size):
+        data = read_exactly(self.stream, min(size, self.remaining))
+        if len(data) < min(size, self.remaining):
+            raise ProgramError("Truncated tar member: " + self.name)
+        self.remaining -= len(data)
+        return data
+
+    def skip(self):
+        while self.remaining:
+            self.read(1024 * 1024)
+
+
+def iter_members(stream):
+    offset = 0
+    next_name = None
+    while True:
+        header = read_exactly(stream, RECORD_SIZE)
+        if not header:
+            return
+        if len(header) < RECORD_SIZE:
+            raise ProgramError("Truncated tar header.")
+        member = TarMember(header, stream, offset, next_name)
+        next_name = None
+        if member.type in LONG_NAME_TYPES or member.type in PAX_HEADER_TYPES:
+            data = read_exactly(stream, member.padded_size)
+            member.stream = io.BytesIO(data)
+            if member.type in LONG_NAME_TYPES:
+                next_name = parse_string(data[:member.size])
+            else:
+                next_name = parse_pax_path(data[:member.size])
+        yield member
+        member.skip()
+        offset += RECORD_SIZE + member.padded_size
@@ -0,0 +1,195 @@
+import json
+import os
+import resource
+import socket
+import threading
+import time
+
+
+current = threading.local()
+
+
+def read_process_io():
+    counters = {}
+    try:
+        with open('/proc/self/io') as io_file:
+            for line in io_file:
+                key, value = line.split(':')
+                counters[key] = int(value)
+    except IOError:
+        pass
+    return counters.get('read_bytes', 0), counters.get('write_bytes', 0)
+
+
+def record_child_usage(usage):
+    stage = getattr(current, 'stage', None)
+    if stage is not None:
+        stage.add_child_usage(usage)
+
+
+class Stage:
+    """Duration and resource usage of a stage of a run.
+
+    The usage of the child processes is summed from their os.wait4 results
+    in the thread running the stage. The process-wide counters, which also
+    hold the work of the threads of the process, are only used when no
+    other stage ran at the same time, `overlapped` is set otherwise.
+    """
+
+    def __init__(self, name, background=False):
+        self.name = name
+        self.start_time = time.time()
+        self.start_clock = time.monotonic()
+        self.start_usage = self.read_usage()
+        self.duration = None
+        self.cpu_seconds = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.child_cpu_seconds = 0.0
+        self.child_bytes_read = 0
+        self.child_bytes_written = 0
+        self.peak_child_rss = 0
+        self.overlapped = False
+        self.attributes = {}
+        if not background:
+            current.stage = self
+
+    def read_usage(self):
+        own_usage = resource.getrusage(resource.RUSAGE_SELF)
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        bytes_read, bytes_written = read_process_io()
+        return (
+            own_usage.ru_utime + own_usage.ru_stime +
+            children_usage.ru_utime + children_usage.ru_stime,
+            bytes_read + children_usage.ru_inblock * 512,
+            bytes_written + children_usage.ru_oublock * 512)
+
+    def add_child_usage(self, usage):
+        self.child_cpu_seconds += usage.ru_utime + usage.ru_stime
+        self.child_bytes_read += usage.ru_inblock * 512
+        self.child_bytes_written += usage.ru_oublock * 512
+        self.peak_child_rss = max(self.peak_child_rss,
+                                  usage.ru_maxrss * 1024)
+
+    def stop(self, status='success', **attributes):
+        self.duration = time.monotonic() - self.start_clock
+        self.attributes['status'] = status
+        if self.overlapped:
+            self.cpu_seconds = self.child_cpu_seconds
+            self.bytes_read = self.child_bytes_read
+            self.bytes_written = self.child_bytes_written
+        else:
+            usage = self.read_usage()
+            self.cpu_seconds = usage[0] - self.start_usage[0]
+            self.bytes_read = usage[1] - self.start_usage[1]
+            self.bytes_written = usage[2] - self.start_usage[2]
+        self.attributes.update(attributes)
+        if getattr(current, 'stage', None) is self:
+            current.stage = None
+
+    def throughput(self, size):
+        if not self.duration:
+            return 0.0
+        return size / self.duration
+
+    def to_dict(self):
+        stage = {
+            'name': self.name,
+            'start_time': self.start_time,
+            'duration_seconds': self.duration,
+            'cpu_seconds': self.cpu_seconds,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'read_throughput': self.throughput(self.bytes_read),
+            'write_throughput': self.throughput(self.bytes_written),
+            'peak_child_rss_bytes': self.peak_child_rss,
+            'overlapped': self.overlapped,
+        }
+        stage.update(self.attributes)
+        return stage
+
+
+class RunReport:
+
+    def __init__(self, tool, report_file=None, prometheus_file=None):
+        self.tool = tool
+        self.report_file = report_file
+        self.prometheus_file = prometheus_file
+        self.start_time = time.time()
+        self.status = 'running'
+        self.stages = []
+        self.attributes = {}
+        self.lock = threading.Lock()
+
+    def start_stage(self, name, background=False):
+        stage = Stage(name, background)
+        with self.lock:
+            for running_stage in self.stages:
+                if running_stage.duration is None:
+                    running_stage.overlapped = True
+                    stage.overlapped = True
+            self.stages.append(stage)
+        return stage
+
+    def to_dict(self):
+        report = {
+            'tool': self.tool,
+            'host': socket.gethostname(),
+            'status': self.status,
+            'start_time': self.start_time,
+            'end_time': time.time(),
+            'stages': [stage.to_dict() for stage in self.stages
+                       if stage.duration is not None],
+        }
+        report.update(self.attributes)
+        return report
+
+    def write(self, status):
+        self.status = status
+        for stage in self.stages:
+            if stage.duration is None:
+                stage.stop('failed')
+        report = self.to_dict()
+        if self.report_file:
+            write_atomically(self.report_file,
+                             json.dumps(report, indent=2, sort_keys=True))
+        if self.prometheus_file:
+            write_atomically(self.prometheus_file,
+                             format_prometheus(report))
+
+
+def write_atomically(path, content):
+    temporary_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(temporary_path, 'w') as report_file:
+        report_file.write(content)
+    os.rename(temporary_path, path)
+
+
+def format_prometheus(report):
+    tool = report['tool']
+    lines = [
+        '# TYPE pyxtrabackup_last_run_timestamp_seconds gauge',
+        'pyxtrabackup_last_run_timestamp_seconds{tool="%s"} %f' % (
+            tool, report['end_time']),
+        '# TYPE pyxtrabackup_last_run_success gauge',
+        'pyxtrabackup_last_run_success{tool="%s"} %d' % (
+            tool, report['status'] == 'success'),
+        '# TYPE pyxtrabackup_last_run_duration_seconds gauge',
+        'pyxtrabackup_last_run_duration_seconds{tool="%s"} %f' % (
+            tool, report['end_time'] - report['start_time']),
+    ]
+    metrics = [
+        ('duration_seconds', 'duration_seconds'),
+        ('cpu_seconds', 'cpu_seconds'),
+        ('bytes_read', 'bytes_read'),
+        ('bytes_written', 'bytes_written'),
+        ('read_throughput_bytes', 'read_throughput'),
+        ('write_throughput_bytes', 'write_throughput'),
+        ('peak_child_rss_bytes', 'peak_child_rss_bytes'),
+    ]
+    for metric, key in metrics:
+        lines.append('# TYPE pyxtrabackup_stage_%s gauge' % metric)
+        for stage in report['stages']:
+            lines.append('pyxtrabackup_stage_%s{tool="%s",stage="%s"} %f' % (
+                metric, tool, stage['name'], stage[key] or 0))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,133 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from xtrabackup.exception import ProgramError
+
+
+MEGABYTE = 1024 * 1024
+INNOBACKUPEX_CHUNK_SIZE = 10 * MEGABYTE
+IONICE_CLASSES = {
+    'realtime': '1',
+    'best-effort': '2',
+    'idle': '3',
+}
+
+
+class RateLimiter:
+
+    def __init__(self, rate):
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.allowance = 0.0
+        self.last_check = time.time()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = min(self.max_rate, max(self.max_rate / 16, rate))
+
+    def consume(self, size):
+        with self.lock:
+            now = time.time()
+            self.allowance = min(
+                self.rate,
+                self.allowance + (now - self.last_check) * self.rate)
+            self.last_check = now
+            self.allowance -= size
+            delay = -self.allowance / self.rate if self.allowance < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+
+class ThrottledStream:
+
+    def __init__(self, stream, rate_limiter):
+        self.stream = stream
+        self.rate_limiter = rate_limiter
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.rate_limiter.consume(len(data))
+        return data
+
+    def write(self, data):
+        self.rate_limiter.consume(len(data))
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+def throttle_function(function, rate_limiter):
+    if rate_limiter is None:
+        return function
+
+    def throttled_function(input_stream, output_stream):
+        if input_stream is not None:
+            input_stream = ThrottledStream(input_stream, rate_limiter)
+        else:
+            output_stream = ThrottledStream(output_stream, rate_limiter)
+        function(input_stream, output_stream)
+
+    return throttled_function
+
+
+def get_innobackupex_throttle(rate):
+    # --throttle is a number of 10 MB chunks per second, the rate is
+    # rounded down to a multiple of 10 MB/s and to at least one chunk.
+    return max(1, int(rate // INNOBACKUPEX_CHUNK_SIZE))
+
+
+def set_process_priority(nice, ionice_class):
+    if nice:
+        os.nice(int(nice))
+    if ionice_class:
+        if ionice_class not in IONICE_CLASSES:
+            raise ProgramError("Unsupported ionice class: " + ionice_class)
+        subprocess.check_call(['ionice', '-c', IONICE_CLASSES[ionice_class],
+                               '-p', str(os.getpid())])
+
+
+class LatencyProbe:
+
+    def __init__(self, directory, threshold, rate_limiter, interval=1.0):
+        self.directory = directory
+        self.threshold = threshold
+        self.rate_limiter = rate_limiter
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+        self.max_latency = 0.0
+
+    def measure(self, probe_file):
+        start = time.time()
+        probe_file.seek(0)
+        probe_file.write(os.urandom(4096))
+        probe_file.flush()
+        os.fsync(probe_file.fileno())
+        return time.time() - start
+
+    def run(self):
+        with tempfile.TemporaryFile(dir=self.directory) as probe_file:
+            while not self.stopped.wait(self.interval):
+                latency = self.measure(probe_file)
+                self.max_latency = max(self.max_latency, latency)
+                if latency > self.threshold:
+                    self.rate_limiter.set_rate(self.rate_limiter.rate / 2)
+                else:
+                    self.rate_limiter.set_rate(self.rate_limiter.rate * 1.1)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
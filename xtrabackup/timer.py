@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import timedelta
+import time
 
 
 class Timer:
@@ -8,11 +9,11 @@ class Timer:
         self.end_time = None
 
     def start_timer(self):
-        self.start_time = datetime.now()
+        self.start_time = time.monotonic()
 
     def stop_timer(self):
-        self.end_time = datetime.now()
-        return (self.end_time - self.start_time)
+        self.end_time = time.monotonic()
+        return timedelta(seconds=self.end_time - self.start_time)
 
     def duration_in_seconds(self):
-        return (self.end_time - self.start_time).seconds
+        return round(self.end_time - self.start_time, 3)
@@ -0,0 +1,68 @@
+"""Xtrabackup script
+
+Usage:
+    pyxtrabackup-verify <path> [options]
+    pyxtrabackup-verify (-h | --help)
+    pyxtrabackup --version
+
+
+Options:
+    -h --help                   \
+    Show this screen.
+    -d --debug                  \
+    Enable verbose error
+    --version                   \
+    Show version.
+    --file=<name>               \
+    Only verify this file of the archive.
+    --threads=<count>           \
+    Verification processes count [default: 1].
+    --log-file=<log>            \
+    Log file [default: /var/log/mysql/pyxtrabackup-verify.log].
+
+"""
+from docopt import docopt
+import sys
+import logging
+from xtrabackup.checksum import verify_archives, verify_file
+import xtrabackup.log_manager as log_manager
+import xtrabackup.timer as timer
+
+
+def main():
+    arguments = docopt(__doc__, version='3.1.6')
+    logger = logging.getLogger(__name__)
+    stop_watch = timer.Timer()
+    try:
+        log_manager.LogManager().attach_file_handler(
+            logger, arguments['--log-file'])
+        stop_watch.start_timer()
+        if arguments['--file']:
+            valid = verify_file(arguments['<path>'], arguments['--file'])
+            logger.info("File: %s - Status: %s", arguments['--file'],
+                        'valid' if valid else 'corrupted')
+            exit(0 if valid else 1)
+        result = verify_archives(arguments['<path>'],
+                                 int(arguments['--threads']))
+        stop_watch.stop_timer()
+        duration = stop_watch.duration_in_seconds()
+        for archive_path, location in result.failures:
+            logger.error("Corrupted archive: %s - Location: %s",
+                         archive_path, location)
+        for archive_path in result.unverified:
+            logger.warning("Archive without checksums: %s", archive_path)
+        logger.info("Archives: %s - Blocks: %s - Verified: %s bytes\
+ - Duration: %s - Throughput: %.1f MB/s",
+                    result.archives, result.blocks, result.bytes, duration,
+                    result.bytes / 1048576.0 / duration if duration else 0)
+    except Exception:
+        logger.error("pyxtrabackup-verify failed.",
+                     exc_info=arguments['--debug'])
+        exit(1)
+    if result.failures:
+        exit(1)
+    exit(0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())